@@ -42,6 +42,9 @@ def create_app() -> Flask:
         db.session.add(admin_user)
         db.session.commit()
         click.echo("Successfully seeded admin user (admin/admin).")
+
+    from .cli import init_app as init_cli
+    init_cli(app)
     # --- END: Register CLI Commands ---
 
     # Register blueprints for web routes
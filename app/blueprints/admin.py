@@ -1,12 +1,15 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, current_app
 from sqlalchemy.exc import IntegrityError
 from ..extensions import db
 from ..services.mapping import create_mapper, latest_mapper_for
+from ..services import rule_engine, jobs, llm_cache
+from ..services.recategorize import recategorize
 from ..models import (
     Institution,
     Account,
     Category,
     Transaction,
+    TransactionRollup,
     Rule,
     TransferKeyword,
     RefundKeyword,
@@ -20,11 +23,20 @@ import json
 bp = Blueprint("admin", __name__)
 
 
+def _purge_llm_cache():
+    """Cached model answers were given for the old category list; drop them."""
+    llm_cache.purge_stale([name for (name,) in db.session.query(Category.name)])
+    db.session.commit()
+
+
 def _delete_account_with_dependencies(account):
     """Remove an account and clean up related records to avoid FK issues."""
     transactions_deleted = Transaction.query.filter(
         Transaction.account_id == account.id
     ).delete(synchronize_session=False)
+    TransactionRollup.query.filter(
+        TransactionRollup.account_id == account.id
+    ).delete(synchronize_session=False)
     imports_deleted = Import.query.filter(
         Import.account_id == account.id
     ).delete(synchronize_session=False)
@@ -261,6 +273,7 @@ def categories():
         new_cat = Category(group=form.group.data, name=form.name.data)
         db.session.add(new_cat)
         db.session.commit()
+        _purge_llm_cache()
         flash(f"Category '{new_cat.name}' created.", "success")
         return redirect(url_for(".categories"))
 
@@ -293,6 +306,7 @@ def category_edit(category_id):
         category.group = form.group.data
         category.name = form.name.data
         db.session.commit()
+        _purge_llm_cache()
         flash(f"Category '{category.name}' updated.", "success")
         return redirect(url_for(".categories"))
     return render_template("admin/category_edit.html", form=form, category=category)
@@ -309,6 +323,7 @@ def category_delete(category_id):
         else:
             db.session.delete(category)
             db.session.commit()
+            _purge_llm_cache()
             flash(f"Category '{category.name}' deleted.", "success")
     else:
         flash("CSRF validation failed.", "error")
@@ -328,6 +343,7 @@ def rules():
         db.session.add(new_rule)
         try:
             db.session.commit()
+            rule_engine.invalidate()
             flash(f"Rule for '{new_rule.keyword}' created.", "success")
             return redirect(url_for(".rules"))
         except IntegrityError:
@@ -352,9 +368,37 @@ def rules():
         form=form,
         rules=all_rules,
         csrf_form=csrf_form,
-        rules_json_string=rules_json_string  # Pass the string to the template
+        rules_json_string=rules_json_string,  # Pass the string to the template
+        recategorize_jobs=jobs.recent("recategorize"),
     )
 
+
+@bp.route("/rules/recategorize", methods=["POST"])
+def rules_recategorize():
+    """Starts a background job that re-applies the rules to existing transactions."""
+    form = CSRFOnlyForm()
+    if form.validate_on_submit():
+        job_id = jobs.start(
+            current_app._get_current_object(),
+            "recategorize",
+            recategorize,
+            only_uncategorized=bool(request.form.get("only_uncategorized")),
+            dry_run=bool(request.form.get("dry_run")),
+        )
+        flash(f"Re-categorization started (job {job_id}). Refresh this page to follow its progress.", "info")
+    else:
+        flash("CSRF validation failed.", "error")
+    return redirect(url_for(".rules"))
+
+
+@bp.route("/jobs/<job_id>")
+def job_status(job_id):
+    """JSON status of a background job started from the admin pages."""
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"status": "error", "message": "Unknown job."}), 404
+    return jsonify(job)
+
 @bp.route("/rule/<int:rule_id>/edit", methods=["GET", "POST"])
 def rule_edit(rule_id):
     """Route for editing a rule."""
@@ -369,6 +413,7 @@ def rule_edit(rule_id):
         rule.category_id = form.category_id.data
         try:
             db.session.commit()
+            rule_engine.invalidate()
             flash(f"Rule for '{rule.keyword}' updated.", "success")
             return redirect(url_for(".rules"))
         except IntegrityError:
@@ -386,6 +431,7 @@ def rule_delete(rule_id):
         rule = Rule.query.get_or_404(rule_id)
         db.session.delete(rule)
         db.session.commit()
+        rule_engine.invalidate()
         flash(f"Rule for '{rule.keyword}' deleted.", "success")
     else:
         flash("CSRF validation failed.", "error")
@@ -401,6 +447,7 @@ def transfer_keywords():
         db.session.add(new_keyword)
         try:
             db.session.commit()
+            rule_engine.invalidate()
             flash(f"Transfer keyword '{new_keyword.keyword}' created.", "success")
             return redirect(url_for(".transfer_keywords"))
         except IntegrityError:
@@ -424,6 +471,7 @@ def transfer_keyword_delete(keyword_id):
         keyword = TransferKeyword.query.get_or_404(keyword_id)
         db.session.delete(keyword)
         db.session.commit()
+        rule_engine.invalidate()
         flash(f"Transfer keyword '{keyword.keyword}' deleted.", "success")
     else:
         flash("CSRF validation failed.", "error")
@@ -439,6 +487,7 @@ def refund_keywords():
         db.session.add(new_keyword)
         try:
             db.session.commit()
+            rule_engine.invalidate()
             flash(f"Refund keyword '{new_keyword.keyword}' created.", "success")
             return redirect(url_for(".refund_keywords"))
         except IntegrityError:
@@ -462,6 +511,7 @@ def refund_keyword_delete(keyword_id):
         keyword = RefundKeyword.query.get_or_404(keyword_id)
         db.session.delete(keyword)
         db.session.commit()
+        rule_engine.invalidate()
         flash(f"Refund keyword '{keyword.keyword}' deleted.", "success")
     else:
         flash("CSRF validation failed.", "error")
@@ -1,13 +1,12 @@
 # srm9385/finance-tracker/finance-tracker-b6479a0b9b4b550a18703e80c76c724f6985583c/app/blueprints/ai.py
-from datetime import timedelta
-
-from flask import Blueprint, render_template, request, redirect, url_for, flash, session, jsonify
+from flask import Blueprint, render_template, request, redirect, url_for, flash, session, jsonify, current_app, abort
 from ..extensions import db
 from ..models import Transaction, Category, Rule, Institution, Account, TransferKeyword, \
     RefundKeyword  # <-- Import Rule
 from ..services.ai_categorizer import get_category_suggestions, is_ai_configured
+from ..services import bulk_apply, rule_engine, jobs, refunds, review_queue
+from ..services.ai_pipeline import categorize_backlog
 from ..forms import AICategorizeForm, RefundFinderForm,CSRFOnlyForm
-from sqlalchemy import or_
 
 bp = Blueprint("ai", __name__, url_prefix="/ai")
 
@@ -67,19 +66,16 @@ def categorize():
         suggestions = []
         llm_batch = []
 
-        rules = Rule.query.all()
+        engine = rule_engine.get_engine()
+        category_names = {c.id: c.name for c in all_categories}
 
         for t in transactions_to_review:
-            matched_rule = None
-            for rule in rules:
-                if rule.keyword.upper() in t.description_raw.upper():
-                    matched_rule = rule
-                    break
+            matched_rule = engine.match(t.description_raw)
 
             if matched_rule:
                 suggestions.append({
                     "id": t.id,
-                    "category_name": matched_rule.category.name,
+                    "category_name": category_names.get(matched_rule.category_id),
                     "reason": f"Rule: Matched '{matched_rule.keyword}'"
                 })
             else:
@@ -93,19 +89,63 @@ def categorize():
             suggestions.extend(llm_suggestions)
 
         suggestions.sort(key=lambda x: x['id'])
-        session['ai_suggestions'] = suggestions
-        return redirect(url_for(".review_suggestions"))
+        queue = review_queue.create(review_queue.SUGGESTIONS, suggestions)
+        db.session.commit()
+        session['ai_review_queue'] = queue.id
+        return redirect(url_for(".review_suggestions", queue=queue.id))
 
     # For GET requests or failed POST validation, render the form template
     return render_template("ai/categorize.html", form=form)
 
-# (The rest of the file remains unchanged)
+
+def _int_or_none(value):
+    try:
+        return int(value) if value else None
+    except (TypeError, ValueError):
+        return None
+
+
+@bp.route("/categorize/background", methods=["POST"])
+def categorize_background():
+    """Starts the concurrent LLM pipeline over the whole scope as a background job."""
+    if not is_ai_configured():
+        flash("AI features are not configured. Please set OPENAI variables in your .env file.", "warning")
+        return redirect(url_for(".categorize"))
+    form = CSRFOnlyForm()
+    if not form.validate_on_submit():
+        flash("CSRF validation failed.", "error")
+        return redirect(url_for(".categorize"))
+
+    job_id = jobs.start(
+        current_app._get_current_object(),
+        "ai-categorize",
+        categorize_backlog,
+        scope=request.form.get("scope", "uncategorized"),
+        institution_id=_int_or_none(request.form.get("institution_id")),
+        account_id=_int_or_none(request.form.get("account_id")),
+    )
+    return redirect(url_for(".categorize_job", job_id=job_id))
+
+
+@bp.route("/jobs/<job_id>")
+def categorize_job(job_id):
+    job = jobs.get(job_id)
+    if job is None or job["name"] != "ai-categorize":
+        abort(404)
+    return render_template("ai/job.html", job=job)
+
+
+def _suggestion_queue(queue_id):
+    """The suggestion batch under review: the given queue id, else the last interactive run's."""
+    return review_queue.load(queue_id or session.get('ai_review_queue'), review_queue.SUGGESTIONS)
+
 
 @bp.route("/review_suggestions")
 def review_suggestions():
-    suggestions = session.get('ai_suggestions', [])
-    if not suggestions:
+    queue = _suggestion_queue(request.args.get("queue"))
+    if queue is None:
         return redirect(url_for('.categorize'))
+    suggestions, page, page_count = review_queue.page(queue, request.args.get("page", 0, type=int))
 
     txn_ids = [s['id'] for s in suggestions]
     transactions = {t.id: t for t in Transaction.query.filter(Transaction.id.in_(txn_ids)).all()}
@@ -124,7 +164,11 @@ def review_suggestions():
         all_categories=all_categories,
         transfer_keywords=transfer_keywords,
         refund_keywords=refund_keywords,
-        form=form
+        form=form,
+        queue=queue,
+        page=page,
+        page_count=page_count,
+        page_rows=review_queue.PAGE_SIZE,
     )
 
 @bp.route("/accounts-for-institution/<int:institution_id>")
@@ -136,7 +180,13 @@ def accounts_for_institution(institution_id):
 @bp.route("/apply_suggestions", methods=["POST"])
 def apply_suggestions():
     approved_ids = set(request.form.getlist("approve"))
-    suggestions = session.get('ai_suggestions', [])
+    queue = _suggestion_queue(request.form.get("queue_id"))
+    if queue is None:
+        flash("This review has expired or was already applied.", "info")
+        return redirect(url_for('.categorize'))
+    # Only the page that was shown is decided; the rest of the queue stays for later pages
+    shown_ids = {int(i) for i in request.form.getlist("shown") if i.isdigit()}
+    suggestions = [s for s in queue.items if s['id'] in shown_ids]
     manual_overrides = {
         int(k.split('_')[-1]): int(v)
         for k, v in request.form.items()
@@ -147,57 +197,72 @@ def apply_suggestions():
 
     if not approved_ids and not manual_overrides and not transfer_ids and not refund_ids:
         flash("No suggestions were approved, manually set, marked as transfers, or marked as refunds.", "info")
-        return redirect(url_for('.categorize'))
-
-    suggestion_map = {s['id']: s['category_name'] for s in suggestions}
-    category_map = {c.id: c for c in Category.query.all()}
-    category_name_map = {c.name: c for c in category_map.values()}
-
-    count = 0
-    transfer_count = 0
-    refund_count = 0
-    all_txn_ids = [s['id'] for s in suggestions]
-    transactions_to_update = Transaction.query.filter(Transaction.id.in_(all_txn_ids)).all()
-
-    for transaction in transactions_to_update:
-        txn_id = transaction.id
+        return _next_suggestions_page(queue, shown_ids)
 
+    category_ids = {c.name: c.id for c in Category.query.all()}
+    changes = []
+    for s in suggestions:
+        txn_id = s['id']
+        change = {"id": txn_id}
         if str(txn_id) in transfer_ids:
-            if not transaction.is_transfer:
-                transaction.is_transfer = True
-                transfer_count += 1
-
+            change["is_transfer"] = True
         if str(txn_id) in refund_ids:
-            if not transaction.is_refund:
-                transaction.is_refund = True
-                refund_count += 1
-
+            change["is_refund"] = True
         if txn_id in manual_overrides:
-            cat_id = manual_overrides[txn_id]
-            if cat_id in category_map:
-                transaction.category_id = cat_id
-                count += 1
-        elif str(txn_id) in approved_ids:
-            suggested_cat_name = suggestion_map.get(txn_id)
-            if suggested_cat_name in category_name_map:
-                transaction.category_id = category_name_map[suggested_cat_name].id
-                count += 1
+            change["category_id"] = manual_overrides[txn_id]
+        elif str(txn_id) in approved_ids and s['category_name'] in category_ids:
+            change["category_id"] = category_ids[s['category_name']]
+        changes.append(change)
 
-    db.session.commit()
-    session.pop('ai_suggestions', None)
+    counts = bulk_apply.apply_changes(changes)
 
     flash_messages = []
-    if transfer_count > 0:
-        flash_messages.append(f"Marked {transfer_count} transactions as transfers.")
-    if refund_count > 0:
-        flash_messages.append(f"Marked {refund_count} transactions as refunds.")
+    if counts["category_id"] > 0:
+        flash_messages.append(f"Categorized {counts['category_id']} transactions.")
+    if counts["is_transfer"] > 0:
+        flash_messages.append(f"Marked {counts['is_transfer']} transactions as transfers.")
+    if counts["is_refund"] > 0:
+        flash_messages.append(f"Marked {counts['is_refund']} transactions as refunds.")
 
     if flash_messages:
         flash(" ".join(flash_messages), "success")
 
+    return _next_suggestions_page(queue, shown_ids)
+
+
+def _next_suggestions_page(queue, reviewed_ids):
+    """Drop the reviewed suggestions from the queue; show what is left, or finish."""
+    queue_id = queue.id
+    remaining = review_queue.remove(queue, reviewed_ids, key=lambda s: s['id'])
+    db.session.commit()
+    if remaining:
+        return redirect(url_for('.review_suggestions', queue=queue_id))
+    if session.get('ai_review_queue') == queue_id:
+        session.pop('ai_review_queue', None)
     return redirect(url_for('dashboard.index'))
 
 
+@bp.route("/apply", methods=["POST"])
+def apply_json():
+    """
+    Bulk apply from JSON: {"changes": [{"id": .., "category_id" | "category_name": ..,
+    "is_transfer" | "is_refund" | "is_joint": bool}, ...]}. Send the CSRF token as X-CSRFToken.
+    """
+    payload = request.get_json(silent=True) or {}
+    raw = payload.get("changes")
+    if not isinstance(raw, list):
+        return jsonify({"status": "error", "message": "Expected a JSON object with a 'changes' list."}), 400
+
+    category_ids = {c.name: c.id for c in Category.query.all()}
+    changes, errors = bulk_apply.parse_changes(raw, category_ids)
+    if not changes:
+        return jsonify({"status": "error", "message": "No valid changes.", "errors": errors}), 400
+
+    counts = bulk_apply.apply_changes(changes)
+    db.session.commit()
+    return jsonify({"status": "success", "updated": counts, "errors": errors})
+
+
 @bp.route("/refund-finder", methods=["GET", "POST"])
 def refund_finder():
     form = RefundFinderForm()
@@ -205,51 +270,38 @@ def refund_finder():
                                Account.query.order_by(Account.institution_id, Account.name).all()]
 
     if form.validate_on_submit():
-        account_id = form.account_id.data
-
-        # Find potential refund pairs
-        positive_txns = Transaction.query.filter(
-            Transaction.account_id == account_id,
-            Transaction.amount_cents > 0,
-            Transaction.is_refund == False,
-            Transaction.is_transfer == False
-        ).order_by(Transaction.txn_date.desc()).all()
-
-        refund_pairs = []
-        for pos_t in positive_txns:
-            # Look for a matching negative transaction within a 60-day window
-            time_window = pos_t.txn_date - timedelta(days=60)
-
-            neg_t = Transaction.query.filter(
-                Transaction.account_id == account_id,
-                Transaction.amount_cents == -pos_t.amount_cents,
-                Transaction.txn_date >= time_window,
-                Transaction.txn_date <= pos_t.txn_date,
-                Transaction.is_refund == False,
-                Transaction.is_transfer == False
-            ).first()
-
-            if neg_t:
-                refund_pairs.append({
-                    "refund_id": pos_t.id,
-                    "original_id": neg_t.id
-                })
+        account_id = None if form.all_accounts.data else form.account_id.data
+        refund_pairs = [
+            {"refund_id": p["refund_id"], "original_id": p["original_id"]}
+            for p in refunds.find_refund_pairs(account_id)
+        ]
 
         if not refund_pairs:
-            flash("No potential refund pairs found in this account.", "info")
+            flash("No potential refund pairs found.", "info")
             return redirect(url_for('.refund_finder'))
 
-        session['refund_pairs'] = refund_pairs
-        return redirect(url_for('.review_refunds'))
+        queue = review_queue.create(review_queue.REFUND_PAIRS, refund_pairs)
+        db.session.commit()
+        session['refund_review_queue'] = queue.id
+        return redirect(url_for('.review_refunds', queue=queue.id))
 
     return render_template("ai/refund_finder.html", form=form)
 
 
+def _refund_queue(queue_id):
+    return review_queue.load(queue_id or session.get('refund_review_queue'), review_queue.REFUND_PAIRS)
+
+
+def _pair_key(pair):
+    return f"{pair['original_id']}:{pair['refund_id']}"
+
+
 @bp.route("/review-refunds")
 def review_refunds():
-    pairs = session.get('refund_pairs', [])
-    if not pairs:
+    queue = _refund_queue(request.args.get("queue"))
+    if queue is None:
         return redirect(url_for('.refund_finder'))
+    pairs, page, page_count = review_queue.page(queue, request.args.get("page", 0, type=int))
 
     all_ids = [p['refund_id'] for p in pairs] + [p['original_id'] for p in pairs]
     transactions = {t.id: t for t in Transaction.query.filter(Transaction.id.in_(all_ids)).all()}
@@ -259,42 +311,54 @@ def review_refunds():
         "ai/review_refunds.html",
         pairs=pairs,
         transactions=transactions,
-        form=form
+        form=form,
+        queue=queue,
+        page=page,
+        page_count=page_count,
+        page_rows=review_queue.PAGE_SIZE,
     )
 
 
 @bp.route("/apply-refunds", methods=["POST"])
 def apply_refunds():
     approved_pairs = request.form.getlist("approve")  # List of "original_id:refund_id"
+    queue = _refund_queue(request.form.get("queue_id"))
+    shown = request.form.getlist("shown")
 
     if not approved_pairs:
         flash("No refunds were approved.", "info")
-        return redirect(url_for('.categorize'))
+        return _next_refunds_page(queue, shown) if queue else redirect(url_for('.categorize'))
 
-    refund_category = Category.query.filter_by(name="Refund").first()
+    refund_category = refunds.refund_category()
     if not refund_category:
         flash("A 'Refund' category must exist to apply this action. Please create one in the admin panel.", "error")
-        return redirect(url_for('.review_refunds'))
+        return redirect(url_for('.review_refunds', queue=queue.id if queue else None))
 
-    count = 0
+    pairs = []
     for pair_str in approved_pairs:
         try:
             original_id, refund_id = map(int, pair_str.split(':'))
-
-            # Update both transactions
-            Transaction.query.filter(
-                or_(Transaction.id == original_id, Transaction.id == refund_id)
-            ).update({
-                'is_refund': True,
-                'category_id': refund_category.id
-            })
-            count += 2  # two transactions updated per pair
         except (ValueError, IndexError):
             flash(f"Skipping invalid pair data: {pair_str}", "warning")
             continue
+        pairs.append((original_id, refund_id))
 
+    count = refunds.apply_refund_pairs(pairs, refund_category.id)
     db.session.commit()
-    session.pop('refund_pairs', None)
 
     flash(f"Successfully marked {count} transactions as refunds and updated their category.", "success")
+    if queue is None:
+        return redirect(url_for('dashboard.index'))
+    return _next_refunds_page(queue, shown)
+
+
+def _next_refunds_page(queue, reviewed_keys):
+    """Drop the reviewed pairs from the queue; show what is left, or finish."""
+    queue_id = queue.id
+    remaining = review_queue.remove(queue, reviewed_keys, key=_pair_key)
+    db.session.commit()
+    if remaining:
+        return redirect(url_for('.review_refunds', queue=queue_id))
+    if session.get('refund_review_queue') == queue_id:
+        session.pop('refund_review_queue', None)
     return redirect(url_for('dashboard.index'))
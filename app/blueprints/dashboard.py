@@ -3,7 +3,8 @@ from collections import defaultdict
 from flask import Blueprint, render_template, jsonify, request
 from sqlalchemy import func, desc, and_
 from ..extensions import db
-from ..models import Account, Transaction, Category
+from ..models import Account, AccountBalanceSnapshot, Transaction, Category
+from ..services.aggregates import compute_snapshots, rollup_source, rollup_window
 from datetime import date, datetime, timedelta
 from sqlalchemy.orm import joinedload
 
@@ -17,28 +18,23 @@ def _parse_bool(value):
 @bp.route("/")
 def index():
     # ... (existing index route)
-    balances = []
-    for acc in Account.query.all():
-        latest_with_balance = (
-            db.session.query(Transaction)
-            .filter_by(account_id=acc.id)
-            .filter(Transaction.running_balance_cents.isnot(None))
-            .filter(Transaction.is_deleted == False)
-            .order_by(Transaction.txn_date.desc(), Transaction.id.desc())
-            .first()
-        )
-
-        if latest_with_balance:
-            bal_cents = latest_with_balance.running_balance_cents or 0
-        else:
-            bal_cents = (
-                    db.session.query(func.coalesce(func.sum(Transaction.amount_cents), 0))
-                    .filter(Transaction.account_id == acc.id)
-                    .filter(Transaction.is_deleted == False)
-                    .scalar() or 0
-            )
-        bal_cents = int(bal_cents)
-        balances.append({"account": acc, "balance": bal_cents / 100.0})
+    rows = (
+        db.session.query(Account, AccountBalanceSnapshot)
+        .outerjoin(AccountBalanceSnapshot, AccountBalanceSnapshot.account_id == Account.id)
+        .order_by(Account.id)
+        .all()
+    )
+    missing = [acc.id for acc, snap in rows if snap is None]
+    if missing:
+        # Accounts without transactions yet, or before 'flask rebuild-balances'
+        # after an upgrade: computed for this response only, never stored here.
+        snaps = compute_snapshots(missing)
+        rows = [(acc, snap or snaps.get(acc.id)) for acc, snap in rows]
+
+    balances = [
+        {"account": acc, "balance": (snap.balance_cents if snap else 0) / 100.0}
+        for acc, snap in rows
+    ]
 
     today = date.today()
     month_start = today.replace(day=1)
@@ -96,25 +92,24 @@ def chart_data():
     except ValueError:
         return jsonify({"error": "Invalid date format. Use YYYY-MM-DD."}), 400
 
+    R = rollup_source()
     query = db.session.query(
-        func.sum(Transaction.amount_cents).label('total_spending')
+        func.sum(R.total_cents).label('total_spending')
     ).filter(
-        Transaction.txn_date >= start_date,
-        Transaction.txn_date <= end_date,
-        Transaction.is_deleted == False,
-        Transaction.is_transfer == False,
-        Transaction.amount_cents < 0
+        rollup_window(start_date, end_date, source=R),
+        R.is_transfer == False,
+        R.sign == -1
     )
 
     if joint_only:
-        query = query.filter(Transaction.is_joint == True)
+        query = query.filter(R.is_joint == True)
 
     if group_by == 'category':
-        query = query.join(Category).add_columns(Category.name.label('label')).group_by(Category.name)
+        query = query.join(Category, Category.id == R.category_key).add_columns(Category.name.label('label')).group_by(Category.name)
     elif group_by == 'group':
-        query = query.join(Category).add_columns(Category.group.label('label')).group_by(Category.group)
+        query = query.join(Category, Category.id == R.category_key).add_columns(Category.group.label('label')).group_by(Category.group)
     elif group_by == 'account':
-        query = query.join(Account).add_columns(Account.name.label('label')).group_by(Account.name)
+        query = query.join(Account, Account.id == R.account_id).add_columns(Account.name.label('label')).group_by(Account.name)
     else:
         return jsonify({"error": "Invalid group_by parameter."}), 400
 
@@ -142,20 +137,20 @@ def income_over_time():
         return jsonify({"error": "Invalid date format. Use YYYY-MM-DD."}), 400
 
     # Query for monthly income
+    R = rollup_source()
     query = db.session.query(
-        func.date_trunc('month', Transaction.txn_date).label('month'),
-        func.sum(Transaction.amount_cents).label('total_income')
-    ).join(Category).filter(
-        Transaction.is_deleted == False,
-        Transaction.amount_cents > 0,
+        func.date_trunc('month', R.bucket).label('month'),
+        func.sum(R.total_cents).label('total_income')
+    ).join(Category, Category.id == R.category_key).filter(
+        R.sign == 1,
         Category.group == 'Income'
     )
 
     if account_name:
-        query = query.join(Account).filter(Account.name == account_name)
+        query = query.join(Account, Account.id == R.account_id).filter(Account.name == account_name)
 
     # Use the adjustable date range from the request
-    query = query.filter(Transaction.txn_date >= start_date, Transaction.txn_date <= end_date)
+    query = query.filter(rollup_window(start_date, end_date, source=R))
 
     results = query.group_by('month').order_by('month').all()
 
@@ -185,45 +180,42 @@ def income_vs_spending():
         return jsonify({"error": "Invalid date format. Use YYYY-MM-DD."}), 400
 
     # Query for income
+    R = rollup_source()
     income_query = db.session.query(
-        func.date_trunc('month', Transaction.txn_date).label('month'),
-        func.sum(Transaction.amount_cents).label('total_income')
-    ).join(Category).filter(
-        Transaction.txn_date >= start_date,
-        Transaction.txn_date <= end_date,
-        Transaction.is_deleted == False,
-        Transaction.is_transfer == False,
-        Transaction.amount_cents > 0,
+        func.date_trunc('month', R.bucket).label('month'),
+        func.sum(R.total_cents).label('total_income')
+    ).join(Category, Category.id == R.category_key).filter(
+        rollup_window(start_date, end_date, source=R),
+        R.is_transfer == False,
+        R.sign == 1,
         Category.group == 'Income'
     )
 
     # Query for spending
     spending_query = db.session.query(
-        func.date_trunc('month', Transaction.txn_date).label('month'),
-        func.sum(Transaction.amount_cents).label('total_spending')
+        func.date_trunc('month', R.bucket).label('month'),
+        func.sum(R.total_cents).label('total_spending')
     ).filter(
-        Transaction.txn_date >= start_date,
-        Transaction.txn_date <= end_date,
-        Transaction.is_deleted == False,
-        Transaction.is_transfer == False,
-        Transaction.amount_cents < 0
+        rollup_window(start_date, end_date, source=R),
+        R.is_transfer == False,
+        R.sign == -1
     )
 
     # --- START MODIFICATION ---
     if account_names:
-        income_query = income_query.join(Account).filter(Account.name.in_(account_names))
-        spending_query = spending_query.join(Account).filter(Account.name.in_(account_names))
+        income_query = income_query.join(Account, Account.id == R.account_id).filter(Account.name.in_(account_names))
+        spending_query = spending_query.join(Account, Account.id == R.account_id).filter(Account.name.in_(account_names))
 
     if category_names:
         # Spending query needs the join to filter by category name
-        spending_query = spending_query.join(Category).filter(Category.name.in_(category_names))
+        spending_query = spending_query.join(Category, Category.id == R.category_key).filter(Category.name.in_(category_names))
         # Income is already joined, just add the filter
         income_query = income_query.filter(Category.name.in_(category_names))
     # --- END MODIFICATION ---
 
     if joint_only:
-        income_query = income_query.filter(Transaction.is_joint == True)
-        spending_query = spending_query.filter(Transaction.is_joint == True)
+        income_query = income_query.filter(R.is_joint == True)
+        spending_query = spending_query.filter(R.is_joint == True)
 
     # Combine results
     monthly_data = defaultdict(lambda: {'income': 0, 'spending': 0})
@@ -272,27 +264,28 @@ def spending_over_time():
     except ValueError:
         return jsonify({"error": "Invalid date format. Use YYYY-MM-DD."}), 400
 
+    # Monthly buckets only line up with month granularity; days and weeks
+    # are summed from the daily rollup.
+    R = rollup_source()
     query = db.session.query(
-        func.date_trunc(granularity, Transaction.txn_date).label('time_period'),
-        func.sum(Transaction.amount_cents).label('total_spending')
+        func.date_trunc(granularity, R.bucket).label('time_period'),
+        func.sum(R.total_cents).label('total_spending')
     ).filter(
-        Transaction.txn_date >= start_date,
-        Transaction.txn_date <= end_date,
-        Transaction.is_deleted == False,
-        Transaction.is_transfer == False,
-        Transaction.amount_cents < 0
+        rollup_window(start_date, end_date, months=(granularity == 'month'), source=R),
+        R.is_transfer == False,
+        R.sign == -1
     )
 
     if joint_only:
-        query = query.filter(Transaction.is_joint == True)
+        query = query.filter(R.is_joint == True)
 
     if filter_type and filter_value:
         if filter_type == 'category':
-            query = query.join(Category).filter(Category.name == filter_value)
+            query = query.join(Category, Category.id == R.category_key).filter(Category.name == filter_value)
         elif filter_type == 'group':
-            query = query.join(Category).filter(Category.group == filter_value)
+            query = query.join(Category, Category.id == R.category_key).filter(Category.group == filter_value)
         elif filter_type == 'account':
-            query = query.join(Account).filter(Account.name == filter_value)
+            query = query.join(Account, Account.id == R.account_id).filter(Account.name == filter_value)
 
     results = query.group_by('time_period').order_by('time_period').all()
 
@@ -6,18 +6,21 @@ from flask import (
     Blueprint, render_template, request, redirect,
     url_for, flash, current_app, abort, jsonify
 )
-from ..models import Institution, Account, Mapper, Import, Transaction
+from ..models import Institution, Account, Mapper, Import
 from ..forms import ImportUploadForm, ReviewDecisionForm, MappingWizardForm
-from ..services.importer import run_import, _normalize_frame
+from ..services.importer import run_import, _normalize_frame, staged_review, staged_counts, record_decision
 from ..services.review import commit_import
+from ..services import retraction
 from ..services.mapping import create_mapper, guess_mapping_from_headers
-from datetime import datetime
-from ..extensions import db
+from ..extensions import db, staging
 from ..forms import CSRFOnlyForm
 
 
 bp = Blueprint("imports", __name__)
 
+# Rows per review section on one page of the review screen.
+REVIEW_PAGE_ROWS = 500
+
 
 @bp.route("/upload", methods=["GET", "POST"])
 def upload():
@@ -65,8 +68,11 @@ def upload():
 
         if form.mapper_id.data != -1:
             mapper = Mapper.query.get(form.mapper_id.data)
-            imp, raw_bytes, review = run_import(None, f, institution, account, mapper, current_app.config)
-            current_app.config.setdefault("_IMPORT_CACHE", {})[imp.id] = raw_bytes
+            try:
+                imp, raw_bytes, review = run_import(None, f, institution, account, mapper, current_app.config)
+            except ValueError as e:
+                flash(str(e), "error")
+                return redirect(url_for(".upload"))
             flash("Parsed file. Review decisions below.", "info")
             return redirect(url_for(".review", import_id=imp.id))
 
@@ -83,22 +89,29 @@ def upload():
 
         guessed = guess_mapping_from_headers(list(df.columns))
         token = str(uuid.uuid4())
-        current_app.config.setdefault("_IMPORT_CACHE", {})[token] = {
-            "raw": raw,
+        try:
+            sha = staging.put(raw)
+        except ValueError as e:
+            flash(str(e), "error")
+            return redirect(url_for(".upload"))
+        staging.pin(sha, f"token-{token}")
+        staging.put_token(token, {
+            "sha256": sha,
             "institution_id": institution.id,
             "account_id": account.id,
             "original_filename": f.filename,
             "headers": list(df.columns),
             "guessed": guessed,
-        }
+        })
         return redirect(url_for(".wizard_from_upload", token=token))
 
     return render_template("imports/upload.html", form=form)
 
 @bp.route("/wizard/<token>", methods=["GET", "POST"])
 def wizard_from_upload(token):
-    cache = current_app.config.setdefault("_IMPORT_CACHE", {}).get(token)
-    if not cache:
+    cache = staging.get_token(token)
+    raw = staging.get(cache["sha256"]) if cache else None
+    if raw is None:
         flash("Upload session expired. Please re-upload your CSV.", "error")
         return redirect(url_for(".upload"))
 
@@ -127,15 +140,14 @@ def wizard_from_upload(token):
             # If the action is to save, we create the mapper and run the import.
             if action == "save_and_import":
                 mapper = create_mapper(institution.id, account.id, schema)
-                raw_bytes = cache["raw"]
 
                 class _FileStorageMock:
                     filename = cache["original_filename"]
-                    def read(self): return raw_bytes
+                    def read(self): return raw
 
                 imp, raw_bytes_out, review = run_import(None, _FileStorageMock(), institution, account, mapper, current_app.config)
-                current_app.config["_IMPORT_CACHE"].pop(token, None)
-                current_app.config["_IMPORT_CACHE"][imp.id] = raw_bytes_out
+                staging.discard(cache["sha256"], f"token-{token}")
+                staging.pop_token(token)
 
                 flash(f"Mapping v{mapper.version} created and applied. Review import below.", "success")
                 return redirect(url_for(".review", import_id=imp.id))
@@ -161,7 +173,7 @@ def wizard_from_upload(token):
             credit_col=form.credit_col.data,
             balance_col=form.balance_col.data
         )
-        df = pd.read_csv(io.BytesIO(cache['raw']), nrows=5)
+        df = pd.read_csv(io.BytesIO(raw), nrows=5)
         preview_rows = _normalize_frame(df, current_schema)
     except Exception as e:
         flash(f"Could not generate preview with current settings: {e}", "error")
@@ -194,6 +206,47 @@ def accounts_for_institution(institution_id):
     return jsonify(accounts_data)
 
 
+def _commit_from_staging(imp, decisions):
+    """
+    Commit an import, archiving the upload straight from the staging store.
+    Returns False (after flashing why) when it can't be committed.
+    """
+    # Lock the import so two requests can't commit it concurrently.
+    db.session.refresh(imp, with_for_update=True)
+    if imp.status != "partial":
+        db.session.rollback()
+        flash(f"Import #{imp.id} has already been committed.", "info")
+        return False
+
+    review = imp.log_json.get("review", {}) if imp.log_json else {}
+    if not review.get("staged"):
+        flash("This import was parsed by an older version. Please re-upload the CSV.", "error")
+        return False
+
+    upload = staging.open(imp.original_sha256)
+    if upload is None:
+        flash("Import cache expired or not found. Please re-upload the CSV.", "error")
+        return False
+
+    with upload:
+        commit_import(
+            imp,
+            upload,
+            current_app.config["ARCHIVE_DIR"],
+            imp.institution.name,
+            imp.account.name,
+            decisions,
+        )
+    staging.discard(imp.original_sha256, f"import-{imp.id}")
+    return True
+
+
+def _commit_failed(imp):
+    if imp.status != "partial":
+        return redirect(url_for(".log", import_id=imp.id))
+    return redirect(url_for(".upload"))
+
+
 @bp.route("/review/<int:import_id>", methods=["GET", "POST"])
 def review(import_id):
     imp = Import.query.get_or_404(import_id)
@@ -206,23 +259,60 @@ def review(import_id):
         except Exception:
             decisions = {}
 
-        raw_bytes = current_app.config.get("_IMPORT_CACHE", {}).pop(imp.id, None)
-        if raw_bytes is None:
-            flash("Import cache expired. Please re-upload.", "error")
-            return redirect(url_for(".upload"))
-
-        commit_import(
-            imp,
-            raw_bytes,
-            current_app.config["ARCHIVE_DIR"],
-            imp.institution.name,
-            imp.account.name,
-            decisions,
-        )
+        if not _commit_from_staging(imp, decisions):
+            return _commit_failed(imp)
         flash("Import committed", "success")
         return redirect(url_for("imports.log", import_id=imp.id))
 
-    return render_template("imports/review.html", form=form, review=review, imp=imp)
+    if imp.status != "partial":
+        return redirect(url_for(".log", import_id=imp.id))
+    if not review.get("staged"):
+        flash("This import was parsed by an older version. Please re-upload the CSV.", "error")
+        return redirect(url_for(".upload"))
+
+    page = max(request.args.get("page", 0, type=int), 0)
+    review = dict(review, **staged_review(imp.id, limit=REVIEW_PAGE_ROWS, offset=page * REVIEW_PAGE_ROWS))
+    # Live counts: the accepted ones change as decisions are saved.
+    review["counts"] = counts = staged_counts(imp.id)
+    largest = max(counts[k] for k in ("dup_exact", "dup_secondary", "transfer_candidates"))
+    page_count = max(1, -(-largest // REVIEW_PAGE_ROWS))
+    return render_template(
+        "imports/review.html", form=form, review=review, imp=imp,
+        page=page, page_count=page_count, page_rows=REVIEW_PAGE_ROWS,
+        csrf_form=CSRFOnlyForm(),
+    )
+
+
+@bp.route("/review/<int:import_id>/decide", methods=["POST"])
+def decide(import_id):
+    """
+    Save one review decision as it is made, so ticks on every page of the
+    review count at commit. JSON body: {"position": row position in the
+    file, "accepted": bool}. Send the CSRF token as X-CSRFToken.
+    """
+    imp = Import.query.get_or_404(import_id)
+    if imp.status != "partial":
+        return jsonify({"status": "error", "message": "This import has already been committed."}), 400
+    payload = request.get_json(silent=True) or {}
+    position, accepted = payload.get("position"), payload.get("accepted")
+    if not isinstance(position, int) or isinstance(position, bool) or not isinstance(accepted, bool):
+        return jsonify({"status": "error", "message": "Give an integer 'position' and a boolean 'accepted'."}), 400
+    if not record_decision(imp.id, position, accepted):
+        return jsonify({"status": "error", "message": f"Row {position} has no decision to make."}), 400
+    counts = staged_counts(imp.id)
+    db.session.commit()
+    return jsonify({
+        "status": "ok",
+        "accepted_transfers": counts["accepted_transfers"],
+        "accepted_duplicates": counts["accepted_duplicates"],
+        "skipped": counts["dup_exact"] + counts["dup_secondary"] - counts["accepted_duplicates"],
+    })
+
+
+@bp.route("/staging-stats")
+def staging_stats():
+    """Upload staging counters (hits/misses/evictions are per worker process)."""
+    return jsonify(staging.usage())
 
 
 @bp.route("/log/<int:import_id>")
@@ -238,37 +328,30 @@ def history():
     return render_template("imports/history.html", items=items)
 
 
-@bp.route("/commit/<int:import_id>", methods=["POST", "GET"])
+@bp.route("/commit/<int:import_id>", methods=["POST"])
 def commit(import_id):
+    """Commit with the decisions saved so far and no other options."""
     imp = Import.query.get_or_404(import_id)
-    raw_bytes = current_app.config.get("_IMPORT_CACHE", {}).pop(imp.id, None)
-    if raw_bytes is None:
-        flash("Import cache expired or not found. Please re-upload the CSV.", "error")
-        return redirect(url_for("imports.upload"))
-
-    decisions = {}
-    commit_import(
-        imp,
-        raw_bytes,
-        current_app.config["ARCHIVE_DIR"],
-        imp.institution.name,
-        imp.account.name,
-        decisions,
-    )
+    if not _commit_from_staging(imp, {}):
+        return _commit_failed(imp)
     flash("Import committed.", "success")
     return redirect(url_for("imports.log", import_id=imp.id))
 
 @bp.route("/delete_import_txns/<int:import_id>", methods=["POST"])
 def delete_import_txns(import_id):
     imp = Import.query.get_or_404(import_id)
-    q = Transaction.query.filter_by(import_id=imp.id, is_deleted=False)
-    count = 0
-    now = datetime.utcnow()
-    for t in q:
-        t.is_deleted = True
-        t.deleted_at = now
-        count += 1
-    imp.status = "retracted"
+    count = retraction.retract_import(imp)
     db.session.commit()
     flash(f"Deleted {count} transactions from import #{imp.id}.", "success")
     return redirect(url_for("imports.log", import_id=imp.id))
+
+@bp.route("/restore_import_txns/<int:import_id>", methods=["POST"])
+def restore_import_txns(import_id):
+    imp = Import.query.get_or_404(import_id)
+    if imp.status != "retracted":
+        flash("This import has not been retracted.", "info")
+        return redirect(url_for("imports.log", import_id=imp.id))
+    count = retraction.restore_import(imp)
+    db.session.commit()
+    flash(f"Restored {count} transactions from import #{imp.id}.", "success")
+    return redirect(url_for("imports.log", import_id=imp.id))
@@ -1,50 +1,75 @@
-import csv
-import io
-from datetime import datetime
+import base64
+import binascii
+import json
+from datetime import datetime, date
 
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, Response
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, Response, stream_with_context
+from sqlalchemy import tuple_
 from sqlalchemy.orm import joinedload
 
 from ..extensions import db
 from ..models import Account, Transaction, Category, Institution
 from ..forms import CSRFOnlyForm, ManualTransactionForm, TransactionExportForm
 from ..utils import to_cents
+from ..services import aggregates, bulk_edit, export, search
+from ..services.merchant import normalize_merchant
 
 bp = Blueprint("transactions", __name__, url_prefix="/transactions")
 
 
+# Sortable columns of the transaction list; each page is ordered by (column, id)
+# in the same direction so the last row of a page is an exact keyset cursor.
+LIST_SORTS = {
+    "txn_date": Transaction.txn_date,
+    "amount_cents": Transaction.amount_cents,
+    "description_raw": Transaction.description_raw,
+}
+LIST_PAGE_SIZE = 100
+MAX_LIST_PAGE_SIZE = 500
+
+
+def _encode_cursor(value, txn_id):
+    if isinstance(value, date):
+        value = value.isoformat()
+    return base64.urlsafe_b64encode(json.dumps([value, txn_id]).encode()).decode()
+
+
+def _decode_cursor(cursor, sort):
+    """(value, id) from an _encode_cursor() string; raises ValueError for anything malformed."""
+    try:
+        value, txn_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if sort == "txn_date":
+            value = date.fromisoformat(value)
+        elif sort == "amount_cents":
+            value = int(value)
+        elif not isinstance(value, str):
+            raise ValueError("description cursor must be text")
+        return value, int(txn_id)
+    except (ValueError, TypeError, ArithmeticError, binascii.Error) as e:
+        raise ValueError(f"Invalid page cursor: {e}") from None
+
+
+def _row_json(t):
+    return {
+        "id": t.id,
+        "txn_date": t.txn_date.isoformat(),
+        "description_raw": t.description_raw,
+        "amount_cents": t.amount_cents,
+        "category_id": t.category_id,
+        "import_id": t.import_id,
+        "is_transfer": t.is_transfer,
+        "is_refund": t.is_refund,
+        "is_joint": t.is_joint,
+    }
+
+
 @bp.route("/account/<int:account_id>")
 def list_for_account(account_id):
     account = Account.query.get_or_404(account_id)
     q = (request.args.get("q") or "").strip()
 
-    query = Transaction.query.filter(
-        Transaction.account_id == account.id,
-        Transaction.is_deleted == False,
-    )
-
-    if q:
-        query = query.filter(Transaction.description_raw.ilike(f"%{q}%"))
-
-    items = query.order_by(Transaction.txn_date.desc(), Transaction.id.desc()).all()
-
-    table_data = []
-    for t in items:
-        table_data.append({
-            "id": t.id,
-            "txn_date": t.txn_date.isoformat(),
-            "description_raw": t.description_raw,
-            "amount_cents": t.amount_cents,
-            "category_id": t.category_id,
-            "import_id": t.import_id,
-            "is_transfer": t.is_transfer,
-            "is_refund": t.is_refund,
-            "is_joint": t.is_joint,
-        })
-
     # Sort by name first, then group for a more intuitive dropdown
     all_categories = Category.query.order_by(Category.name, Category.group).all()
-    # --- END MODIFICATION ---
 
     categories_list = [
         {"id": c.id, "group": c.group, "name": c.name} for c in all_categories
@@ -52,16 +77,131 @@ def list_for_account(account_id):
 
     csrf_form = CSRFOnlyForm()
 
+    # Rows are fetched page by page from list_data as the table scrolls.
     return render_template(
         "transactions/list.html",
         account=account,
         q=q,
-        table_data=table_data,
         categories=categories_list,
-        csrf_form=csrf_form
+        csrf_form=csrf_form,
+        page_size=LIST_PAGE_SIZE,
     )
 
 
+@bp.route("/account/<int:account_id>/data")
+def list_data(account_id):
+    """
+    One keyset page of an account's live transactions as JSON:
+    ?sort=txn_date|amount_cents|description_raw&dir=desc|asc&size=&q=&after=<cursor>.
+    Returns {"data": [...], "next_cursor": str or null}.
+    """
+    sort = request.args.get("sort", "txn_date")
+    direction = request.args.get("dir", "desc")
+    if sort not in LIST_SORTS or direction not in ("asc", "desc"):
+        return jsonify({"status": "error", "message": "Unsupported sort."}), 400
+    try:
+        size = max(1, min(int(request.args.get("size", LIST_PAGE_SIZE)), MAX_LIST_PAGE_SIZE))
+        after = request.args.get("after")
+        cursor = _decode_cursor(after, sort) if after else None
+    except ValueError:
+        return jsonify({"status": "error", "message": "Invalid page cursor."}), 400
+
+    account = Account.query.get_or_404(account_id)
+    column = LIST_SORTS[sort]
+    query = Transaction.query.filter(
+        Transaction.account_id == account.id,
+        Transaction.is_deleted == False,
+    )
+    q = (request.args.get("q") or "").strip()
+    if q:
+        query = query.filter(search.text_filter(q))
+    if cursor is not None:
+        key = tuple_(column, Transaction.id)
+        query = query.filter(key < tuple_(*cursor) if direction == "desc" else key > tuple_(*cursor))
+    if direction == "desc":
+        query = query.order_by(column.desc(), Transaction.id.desc())
+    else:
+        query = query.order_by(column.asc(), Transaction.id.asc())
+
+    # One extra row tells whether another page follows.
+    items = query.limit(size + 1).all()
+    next_cursor = None
+    if len(items) > size:
+        items = items[:size]
+        last = items[-1]
+        next_cursor = _encode_cursor(getattr(last, sort), last.id)
+
+    return jsonify({"data": [_row_json(t) for t in items], "next_cursor": next_cursor})
+
+
+@bp.route("/bulk", methods=["POST"])
+def bulk_edit_json():
+    """
+    Batch edit in one request and one transaction. JSON body:
+    {"ids": [..]} or {"filter": {"account_id", "start", "end", "q", "min_amount", "max_amount", "uncategorized"}},
+    plus "set": {"category_id": id|null, "is_transfer"|"is_refund"|"is_joint": bool}, "delete": bool, "dry_run": bool.
+    Send the CSRF token as X-CSRFToken. Returns a summary of matched and changed rows.
+    """
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        return jsonify({"status": "error", "message": "Expected a JSON object."}), 400
+    try:
+        summary = bulk_edit.edit(
+            ids=payload.get("ids"),
+            filter_spec=payload.get("filter"),
+            operations=payload.get("set"),
+            delete=bool(payload.get("delete")),
+            dry_run=bool(payload.get("dry_run")),
+        )
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+    db.session.commit()
+    return jsonify({"status": "success", "summary": summary})
+
+
+@bp.route("/search")
+def search_json():
+    """
+    Ranked search across accounts: ?q=...&account_id=..(repeatable)&min_amount=&max_amount=
+    &start=YYYY-MM-DD&end=YYYY-MM-DD&mode=fuzzy|words&limit=&offset=
+    """
+    q = (request.args.get("q") or "").strip()
+    if not q:
+        return jsonify({"status": "error", "message": "Missing search text (q)."}), 400
+    mode = request.args.get("mode", "fuzzy")
+    if mode not in ("fuzzy", "words"):
+        return jsonify({"status": "error", "message": "mode must be 'fuzzy' or 'words'."}), 400
+    if mode == "words" and not search.has_tsvector():
+        return jsonify({"status": "error", "message": "Word search is not set up; run 'flask setup-search --tsvector'."}), 400
+
+    try:
+        account_ids = [int(a) for a in request.args.getlist("account_id") if a]
+        min_amount = request.args.get("min_amount")
+        max_amount = request.args.get("max_amount")
+        start = request.args.get("start")
+        end = request.args.get("end")
+        results = search.search_transactions(
+            q,
+            account_ids=account_ids or None,
+            min_cents=to_cents(min_amount) if min_amount else None,
+            max_cents=to_cents(max_amount) if max_amount else None,
+            start=date.fromisoformat(start) if start else None,
+            end=date.fromisoformat(end) if end else None,
+            mode=mode,
+            limit=int(request.args.get("limit", 50)),
+            offset=int(request.args.get("offset", 0)),
+        )
+    except (ValueError, ArithmeticError) as e:
+        # to_cents("inf") / to_cents("1e400") overflow rather than fail to parse
+        return jsonify({"status": "error", "message": f"Invalid filter: {e}"}), 400
+
+    # Fuzzy results are only ranked once 'flask setup-search' has installed pg_trgm.
+    ranked = mode == "words" or search.has_trgm()
+    return jsonify({"status": "success", "results": results, "ranked": ranked})
+
+
 @bp.route("/export", methods=["GET", "POST"])
 def export_transactions():
     form = TransactionExportForm()
@@ -80,54 +220,28 @@ def export_transactions():
     ]
 
     if form.validate_on_submit():
-        selected_account_ids = [int(a_id) for a_id in form.accounts.data]
-
-        txn_query = (
-            Transaction.query.options(
-                joinedload(Transaction.account).joinedload(Account.institution),
-                joinedload(Transaction.category),
-            )
-            .filter(
-                Transaction.account_id.in_(selected_account_ids),
-                Transaction.is_deleted == False,
-            )
+        if form.format.data != "csv" and not export.arrow_available():
+            flash("Parquet and Arrow exports need pyarrow installed on the server; choose CSV instead.", "error")
+            return render_template("transactions/export.html", form=form)
+
+        batches = export.export_batches(
+            [int(a_id) for a_id in form.accounts.data],
+            start=form.start_date.data,
+            end=form.end_date.data,
+            joint_only=form.joint_only.data,
         )
+        extension, mimetype = export.FORMATS[form.format.data]
+        if form.format.data == "csv":
+            chunks = export.csv_chunks(batches)
+            if form.compress.data:
+                chunks = export.gzip_chunks(chunks)
+                extension += ".gz"
+                mimetype = "application/gzip"
+        else:
+            chunks = export.arrow_chunks(batches, form.format.data)
+        filename = f"transactions-export-{datetime.utcnow().strftime('%Y%m%d%H%M%S')}.{extension}"
 
-        if form.start_date.data:
-            txn_query = txn_query.filter(Transaction.txn_date >= form.start_date.data)
-        if form.end_date.data:
-            txn_query = txn_query.filter(Transaction.txn_date <= form.end_date.data)
-        if form.joint_only.data:
-            txn_query = txn_query.filter(Transaction.is_joint == True)
-
-        transactions = txn_query.order_by(
-            Transaction.txn_date.asc(),
-            Transaction.id.asc(),
-        ).all()
-
-        output = io.StringIO()
-        writer = csv.writer(output)
-        writer.writerow(["date", "description", "amount", "category", "account", "institution"])
-
-        for txn in transactions:
-            account = txn.account
-            institution = account.institution if account else None
-            category_name = txn.category.name if txn.category else ""
-
-            writer.writerow([
-                txn.txn_date.isoformat(),
-                txn.description_raw,
-                f"{txn.amount_cents / 100:.2f}",
-                category_name,
-                account.name if account else "",
-                institution.name if institution else "",
-            ])
-
-        filename = f"transactions-export-{datetime.utcnow().strftime('%Y%m%d%H%M%S')}.csv"
-        response = Response(
-            output.getvalue(),
-            mimetype="text/csv",
-        )
+        response = Response(stream_with_context(chunks), mimetype=mimetype)
         response.headers["Content-Disposition"] = f"attachment; filename={filename}"
         return response
 
@@ -141,6 +255,7 @@ def delete_single(txn_id):
         return redirect(_back_to_account(t.account_id))
     t.is_deleted = True
     t.deleted_at = datetime.utcnow()
+    aggregates.retired([t.id])
     db.session.commit()
     flash("Transaction deleted (soft).", "success")
     return redirect(_back_to_account(t.account_id))
@@ -156,16 +271,17 @@ def set_category(txn_id):
     t = Transaction.query.get_or_404(txn_id)
     category_id = request.form.get("category_id")
 
-    if not category_id or category_id == "None":
-        t.category_id = None
-        flash("Transaction category cleared.", "info")
-    else:
-        cat = Category.query.get(category_id)
-        if cat:
-            t.category_id = cat.id
-            flash(f"Transaction category set to '{cat.name}'.", "success")
+    with aggregates.reclassifying([t.id]):
+        if not category_id or category_id == "None":
+            t.category_id = None
+            flash("Transaction category cleared.", "info")
         else:
-            flash("Invalid category selected.", "error")
+            cat = Category.query.get(category_id)
+            if cat:
+                t.category_id = cat.id
+                flash(f"Transaction category set to '{cat.name}'.", "success")
+            else:
+                flash("Invalid category selected.", "error")
 
     db.session.commit()
     return redirect(_back_to_account(t.account_id))
@@ -181,9 +297,12 @@ def add_manual(account_id):
             account_id=account.id,
             txn_date=form.txn_date.data,
             description_raw=form.description_raw.data,
+            merchant_normalized=normalize_merchant(form.description_raw.data),
             amount_cents=to_cents(form.amount.data),
         )
         db.session.add(t)
+        db.session.flush()
+        aggregates.published([t.id])
         db.session.commit()
         flash("Manual transaction added successfully.", "success")
         return redirect(url_for(".list_for_account", account_id=account.id))
@@ -196,7 +315,8 @@ def toggle_transfer(txn_id):
     form = CSRFOnlyForm()
     if form.validate_on_submit():
         t = Transaction.query.get_or_404(txn_id)
-        t.is_transfer = not t.is_transfer
+        with aggregates.reclassifying([t.id]):
+            t.is_transfer = not t.is_transfer
         db.session.commit()
         return jsonify({'is_transfer': t.is_transfer, 'status': 'success'})
     return jsonify({'status': 'error', 'message': 'CSRF validation failed.'}), 400
@@ -218,7 +338,8 @@ def toggle_joint(txn_id):
     form = CSRFOnlyForm()
     if form.validate_on_submit():
         t = Transaction.query.get_or_404(txn_id)
-        t.is_joint = not t.is_joint
+        with aggregates.reclassifying([t.id]):
+            t.is_joint = not t.is_joint
         db.session.commit()
         return jsonify({'is_joint': t.is_joint, 'status': 'success'})
     return jsonify({'status': 'error', 'message': 'CSRF validation failed.'}), 400
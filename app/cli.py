@@ -0,0 +1,186 @@
+# app/cli.py
+"""Maintenance commands for derived data and categorization rules (flask <command>)."""
+import json
+
+import click
+
+from .extensions import db
+from .models import Category
+from .services import aggregates, bulk_apply, rule_engine, llm_cache, merchant, refunds, search
+from .services.recategorize import recategorize, BATCH_SIZE
+
+
+def init_app(app):
+    @app.cli.command("rebuild-balances")
+    def rebuild_balances_command():
+        """Recomputes every account's balance snapshot from the ledger."""
+        count = aggregates.rebuild_balance_snapshots()
+        db.session.commit()
+        click.echo(f"Rebuilt balance snapshots for {count} accounts.")
+
+    @app.cli.command("check-balances")
+    def check_balances_command():
+        """Compares balance snapshots with a full recomputation; exits 1 on drift."""
+        drift = aggregates.check_balance_snapshots()
+        if not drift:
+            click.echo("Balance snapshots are consistent.")
+            return
+        for row in drift:
+            click.echo(
+                f"Account {row['account_id']}: "
+                f"sum {row['stored_sum']} != {row['actual_sum']}, "
+                f"count {row['stored_count']} != {row['actual_count']}, "
+                f"latest txn {row['stored_latest']} != {row['actual_latest']}"
+            )
+        click.echo(f"{len(drift)} account(s) out of date. Run 'flask rebuild-balances' to fix.")
+        raise SystemExit(1)
+
+    @app.cli.command("rebuild-rollups")
+    def rebuild_rollups_command():
+        """Recomputes the daily/monthly chart rollups from the ledger."""
+        count = aggregates.rebuild_rollups()
+        db.session.commit()
+        click.echo(f"Rebuilt {count} rollup buckets.")
+
+    @app.cli.command("check-rollups")
+    def check_rollups_command():
+        """Compares chart rollups with a full recomputation; exits 1 on drift."""
+        drift = aggregates.check_rollups()
+        if not drift:
+            click.echo("Rollups are consistent.")
+            return
+        for row in drift[:50]:
+            click.echo(
+                f"{row['grain']} {row['bucket']} account {row['account_id']} category {row['category_key']}: "
+                f"total {row['stored_total']} != {row['actual_total']}, "
+                f"count {row['stored_count']} != {row['actual_count']}"
+            )
+        click.echo(f"{len(drift)} bucket(s) out of date. Run 'flask rebuild-rollups' to fix.")
+        raise SystemExit(1)
+
+    @app.cli.command("match-rules")
+    @click.argument("descriptions", nargs=-1)
+    def match_rules_command(descriptions):
+        """Shows which rule would categorize each description (reads stdin if none given)."""
+        engine = rule_engine.get_engine()
+        if not descriptions:
+            descriptions = [line.rstrip("\n") for line in click.get_text_stream("stdin")]
+        for description in descriptions:
+            match = engine.match(description)
+            if match:
+                click.echo(f"{description}\t-> rule {match.rule_id} '{match.keyword}' (category {match.category_id})")
+            else:
+                click.echo(f"{description}\t-> no rule")
+
+    @app.cli.command("recategorize")
+    @click.option("--only-uncategorized", is_flag=True, help="Leave transactions that already have a category alone.")
+    @click.option("--account-id", type=int, help="Only this account.")
+    @click.option("--start", type=click.DateTime(formats=["%Y-%m-%d"]), help="Only transactions on or after this date.")
+    @click.option("--end", type=click.DateTime(formats=["%Y-%m-%d"]), help="Only transactions on or before this date.")
+    @click.option("--dry-run", is_flag=True, help="Report what would change without writing anything.")
+    @click.option("--batch-size", type=int, default=BATCH_SIZE, show_default=True)
+    def recategorize_command(only_uncategorized, account_id, start, end, dry_run, batch_size):
+        """Re-applies the categorization rules to existing transactions."""
+        def report(p):
+            click.echo(f"  scanned {p['scanned']}, matched {p['matched']}, changed {p['changed']} (up to id {p['last_id']})")
+
+        totals = recategorize(
+            only_uncategorized=only_uncategorized,
+            account_id=account_id,
+            start=start.date() if start else None,
+            end=end.date() if end else None,
+            dry_run=dry_run,
+            batch_size=batch_size,
+            progress=report,
+        )
+        verb = "Would change" if dry_run else "Changed"
+        click.echo(f"{verb} {totals['changed']} of {totals['scanned']} transactions ({totals['matched']} matched a rule).")
+
+    @app.cli.command("llm-cache-stats")
+    def llm_cache_stats_command():
+        """Shows how many LLM suggestions are cached and how often they were reused."""
+        stats = llm_cache.cache_stats()
+        click.echo(f"{stats['entries']} cached suggestions, {stats['hits']} cache hits in total.")
+        for model, s in sorted(stats["by_model"].items()):
+            click.echo(f"  {model}: {s['entries']} entries, {s['hits']} hits")
+
+    @app.cli.command("llm-cache-purge")
+    @click.option("--all", "purge_all", is_flag=True, help="Empty the cache instead of only dropping stale answers.")
+    def llm_cache_purge_command(purge_all):
+        """Drops cached LLM suggestions made for an older category list (or all of them)."""
+        if purge_all:
+            count = llm_cache.LlmSuggestionCache.query.delete(synchronize_session=False)
+        else:
+            count = llm_cache.purge_stale([name for (name,) in db.session.query(Category.name)])
+        db.session.commit()
+        click.echo(f"Removed {count} cached suggestions.")
+
+    @app.cli.command("backfill-merchants")
+    @click.option("--all", "recompute_all", is_flag=True, help="Recompute every row, not only those without a merchant.")
+    @click.option("--batch-size", type=int, default=10000, show_default=True)
+    def backfill_merchants_command(recompute_all, batch_size):
+        """Fills merchant_normalized for existing transactions."""
+        def report(p):
+            click.echo(f"  scanned {p['scanned']}, updated {p['changed']} (up to id {p['last_id']})")
+
+        totals = merchant.backfill(only_missing=not recompute_all, batch_size=batch_size, progress=report)
+        click.echo(f"Updated merchant_normalized on {totals['changed']} of {totals['scanned']} transactions.")
+
+    @app.cli.command("setup-search")
+    @click.option("--tsvector", is_flag=True, help="Also add the generated search_tsv column for word search.")
+    def setup_search_command(tsvector):
+        """Installs pg_trgm and the transaction search indexes (safe to re-run)."""
+        for statement in search.setup_search(with_tsvector=tsvector):
+            click.echo(f"  {statement}")
+        click.echo("Search indexes are in place.")
+
+    @app.cli.command("find-refunds")
+    @click.option("--account-id", type=int, help="Only this account (default: every account).")
+    @click.option("--window-days", type=int, default=refunds.REFUND_WINDOW_DAYS, show_default=True)
+    @click.option("--apply", "apply_pairs", is_flag=True, help="Mark every pair found as a refund in the 'Refund' category.")
+    def find_refunds_command(account_id, window_days, apply_pairs):
+        """Finds purchase/refund pairs (same amount, same account, refund within the window)."""
+        pairs = refunds.find_refund_pairs(account_id, window_days=window_days)
+        for p in pairs:
+            click.echo(f"  account {p['account_id']}: original {p['original_id']} -> refund {p['refund_id']} ({p['days']} days)")
+        click.echo(f"Found {len(pairs)} refund pairs.")
+        if apply_pairs and pairs:
+            category = refunds.refund_category()
+            if category is None:
+                raise click.ClickException("A 'Refund' category must exist; create one in the admin panel.")
+            count = refunds.apply_refund_pairs([(p["original_id"], p["refund_id"]) for p in pairs], category.id)
+            db.session.commit()
+            click.echo(f"Marked {count} transactions as refunds.")
+
+    @app.cli.command("apply-changes")
+    @click.argument("source", type=click.File("r"), default="-")
+    @click.option("--dry-run", is_flag=True, help="Report the counts and roll back.")
+    def apply_changes_command(source, dry_run):
+        """Applies reviewed changes from a JSON list, {"changes": [...]}, or JSON lines (default: stdin).
+
+        Each change is {"id": .., "category_id" or "category_name": .., "is_transfer"/"is_refund"/"is_joint": bool}.
+        """
+        content = source.read()
+        try:
+            data = json.loads(content)
+        except json.JSONDecodeError:
+            try:
+                data = [json.loads(line) for line in content.splitlines() if line.strip()]
+            except json.JSONDecodeError as e:
+                raise click.ClickException(f"Invalid JSON: {e}")
+        if isinstance(data, dict):
+            data = data.get("changes", [data])
+
+        changes, errors = bulk_apply.parse_changes(data, {c.name: c.id for c in Category.query.all()})
+        for error in errors:
+            click.echo(f"  skipped {error}", err=True)
+        counts = bulk_apply.apply_changes(changes)
+        if dry_run:
+            db.session.rollback()
+        else:
+            db.session.commit()
+        verb = "Would update" if dry_run else "Updated"
+        click.echo(
+            f"{verb} {counts['category_id']} categories, {counts['is_transfer']} transfer flags, "
+            f"{counts['is_refund']} refund flags and {counts['is_joint']} joint flags with {counts['statements']} statements."
+        )
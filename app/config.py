@@ -20,10 +20,32 @@ class Config:
         self.BACKUP_DIR = os.getenv("BACKUP_DIR", os.path.expanduser("~/.finance_tracker_backup"))
         # --- END MODIFICATION ---
 
+        # Uploads waiting for review/commit are staged here (shared by all workers)
+        self.IMPORT_STAGING_BACKEND = os.getenv("IMPORT_STAGING_BACKEND", "spool")
+        self.IMPORT_STAGING_DIR = os.getenv("IMPORT_STAGING_DIR", os.path.expanduser("~/.finance_tracker_staging"))
+        self.IMPORT_STAGING_TTL_SECONDS = int(os.getenv("IMPORT_STAGING_TTL_SECONDS", str(24 * 3600)))
+        self.IMPORT_STAGING_MAX_BYTES = int(os.getenv("IMPORT_STAGING_MAX_BYTES", str(2 * 1024 ** 3)))
+        self.IMPORT_STAGING_MEMORY_BYTES = int(os.getenv("IMPORT_STAGING_MEMORY_BYTES", str(64 * 1024 ** 2)))
+
+        # Uploads at least this large are parsed in chunks into import_staged_rows
+        self.IMPORT_STREAMING_THRESHOLD_BYTES = int(os.getenv("IMPORT_STREAMING_THRESHOLD_BYTES", str(20 * 1024 ** 2)))
+        self.IMPORT_CHUNK_ROWS = int(os.getenv("IMPORT_CHUNK_ROWS", "50000"))
+
         self.OPENAI_API_BASE = os.getenv("OPENAI_API_BASE")
         self.OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
         self.OPENAI_MODEL_NAME = os.getenv("OPENAI_MODEL_NAME")
 
+        # Background categorization (ai_pipeline): prompt-token budget per
+        # request, requests in flight at once, and retries on transient errors
+        self.AI_BATCH_TOKEN_BUDGET = int(os.getenv("AI_BATCH_TOKEN_BUDGET", "3000"))
+        self.AI_BATCH_MAX_TRANSACTIONS = int(os.getenv("AI_BATCH_MAX_TRANSACTIONS", "100"))
+        self.AI_CONCURRENCY = int(os.getenv("AI_CONCURRENCY", "4"))
+        self.AI_MAX_RETRIES = int(os.getenv("AI_MAX_RETRIES", "4"))
+        self.AI_REQUEST_TIMEOUT_SECONDS = float(os.getenv("AI_REQUEST_TIMEOUT_SECONDS", "120"))
+
+        # Suggestion and refund-pair batches awaiting review live in review_queues this long
+        self.REVIEW_QUEUE_TTL_SECONDS = int(os.getenv("REVIEW_QUEUE_TTL_SECONDS", str(7 * 24 * 3600)))
+
         if not self.SQLALCHEMY_DATABASE_URI:
             raise ValueError("DATABASE_URL is not set in your .env file or environment variables. "
                              "The application cannot start without it.")
@@ -6,11 +6,14 @@ from flask_migrate import Migrate
 from flask_login import LoginManager
 from flask_wtf.csrf import CSRFProtect
 
+from .services.staging import UploadStaging
+
 # Instantiate extensions (no app bound yet)
 db = SQLAlchemy()
 migrate = Migrate()
 login_manager = LoginManager()
 csrf = CSRFProtect()
+staging = UploadStaging()   # shared store for uploads awaiting review/commit
 
 # Optional: tweak login behaviour
 login_manager.login_view = "auth.login"           # where to redirect when auth is required
@@ -28,6 +31,7 @@ def init_app(app):
     migrate.init_app(app, db)
     login_manager.init_app(app)
     csrf.init_app(app)   # <-- enables CSRF on all POST/PUT/PATCH/DELETE routes
+    staging.init_app(app)
 
     # Defer user loader import to avoid circular imports
     from .models import User
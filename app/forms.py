@@ -92,7 +92,13 @@ class TransactionExportForm(FlaskForm):
     start_date = DateField("Start Date", format='%Y-%m-%d', validators=[Optional()])
     end_date = DateField("End Date", format='%Y-%m-%d', validators=[Optional()])
     joint_only = BooleanField("Joint transactions only")
-    submit = SubmitField("Export CSV")
+    format = SelectField("Format", choices=[
+        ("csv", "CSV"),
+        ("parquet", "Parquet"),
+        ("arrow", "Arrow IPC / Feather"),
+    ], default="csv")
+    compress = BooleanField("Compress CSV (.csv.gz)")
+    submit = SubmitField("Export")
 
     def validate(self, **kwargs):
         if not super().validate(**kwargs):
@@ -130,4 +136,5 @@ class RestoreForm(FlaskForm):
 class RefundFinderForm(FlaskForm):
     """Form for finding potential refunds in an account."""
     account_id = SelectField("Account", coerce=int, validators=[DataRequired()])
+    all_accounts = BooleanField("Scan all accounts")
     submit = SubmitField("Find Refunds")
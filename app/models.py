@@ -56,6 +56,41 @@ class Import(db.Model):
     account = db.relationship("Account", lazy="joined")
     mapper = db.relationship("Mapper", lazy="joined")
 
+class ImportStagedRow(db.Model):
+    """A parsed row of an import waiting for review/commit (scratch space, not the ledger)."""
+    __tablename__ = "import_staged_rows"
+    id = db.Column(db.BigInteger, primary_key=True)
+    import_id = db.Column(db.Integer, db.ForeignKey("imports.id", ondelete="CASCADE"), nullable=False)
+    # Order of the row among the parsed rows of the file (0-based)
+    position = db.Column(db.Integer, nullable=False)
+    txn_date = db.Column(db.Date, nullable=False)
+    description_raw = db.Column(db.Text, nullable=False)
+    merchant_normalized = db.Column(db.Text)
+    amount_cents = db.Column(db.BigInteger, nullable=False)
+    running_balance_cents = db.Column(db.BigInteger)
+    # "insert", "dup_exact" or "dup_secondary"
+    status = db.Column(db.Text, nullable=False)
+    # Ledger row this one duplicates (NULL for repeats within the file)
+    existing_id = db.Column(db.BigInteger)
+    # For repeats within the file: position of the first occurrence
+    dup_of_position = db.Column(db.Integer)
+    # Opposite-amount row in another account, if this looks like a transfer
+    transfer_existing_id = db.Column(db.BigInteger)
+    # Set from TransferKeyword at parse time, or when the user accepts a transfer candidate
+    is_transfer = db.Column(db.Boolean, default=False, nullable=False)
+    # Classification from Rule / RefundKeyword at parse time (see rule_engine.Classifier)
+    category_id = db.Column(db.Integer, db.ForeignKey("categories.id", ondelete="SET NULL"))
+    is_refund = db.Column(db.Boolean, default=False, nullable=False)
+    explain_json = db.Column(JSONB)
+    # Review decision, saved as it is made: accept the transfer candidate /
+    # import the secondary duplicate anyway
+    accepted = db.Column(db.Boolean, default=False, nullable=False)
+    # Set while committing: "insert" or "revived"
+    outcome = db.Column(db.Text)
+    __table_args__ = (
+        db.Index("ix_import_staged_rows_import_position", "import_id", "position"),
+    )
+
 class Transaction(db.Model):
     __tablename__ = "transactions"
     id = db.Column(db.BigInteger, primary_key=True)
@@ -77,6 +112,58 @@ class Transaction(db.Model):
     category_id = db.Column(db.Integer, db.ForeignKey("categories.id"), index=True, nullable=True)
     category = db.relationship("Category", lazy="joined")
     account = db.relationship("Account", backref="transactions")
+    __table_args__ = (
+        # Latest live row carrying a bank-reported balance, per account
+        db.Index(
+            "ix_transactions_account_latest_balance",
+            "account_id", "txn_date", "id",
+            postgresql_where=db.text("running_balance_cents IS NOT NULL AND NOT is_deleted"),
+        ),
+        # Keyset pagination of an account's transactions, newest first
+        db.Index("ix_transactions_account_date_id", "account_id", "txn_date", "id"),
+        # Grouping and lookups by merchant (see services/merchant.py)
+        db.Index("ix_transactions_merchant_normalized", "merchant_normalized"),
+    )
+
+class AccountBalanceSnapshot(db.Model):
+    """
+    Per-account balance inputs kept in step with the live (not soft-deleted)
+    transactions by services.aggregates, so the dashboard never scans the ledger.
+    """
+    __tablename__ = "account_balance_snapshots"
+    account_id = db.Column(db.Integer, db.ForeignKey("accounts.id", ondelete="CASCADE"), primary_key=True)
+    sum_cents = db.Column(db.BigInteger, nullable=False, default=0)
+    txn_count = db.Column(db.Integer, nullable=False, default=0)
+    # Latest live row (by txn_date, id) with a running balance, if any
+    latest_txn_id = db.Column(db.BigInteger)
+    latest_txn_date = db.Column(db.Date)
+    latest_balance_cents = db.Column(db.BigInteger)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    account = db.relationship("Account", lazy="joined")
+
+    @property
+    def balance_cents(self) -> int:
+        """The bank-reported balance when known, else the sum of all live amounts."""
+        if self.latest_txn_id is not None:
+            return int(self.latest_balance_cents or 0)
+        return int(self.sum_cents or 0)
+
+class TransactionRollup(db.Model):
+    """
+    Daily and monthly totals of live transactions, maintained by
+    services.aggregates for the dashboard charts. category_key is the
+    category id, or 0 for uncategorized rows; sign is the sign of the amount.
+    """
+    __tablename__ = "transaction_rollups"
+    grain = db.Column(db.Text, primary_key=True)  # "day" or "month"
+    bucket = db.Column(db.Date, primary_key=True)  # the day, or the first of the month
+    account_id = db.Column(db.Integer, primary_key=True)
+    category_key = db.Column(db.Integer, primary_key=True)
+    is_joint = db.Column(db.Boolean, primary_key=True)
+    is_transfer = db.Column(db.Boolean, primary_key=True)
+    sign = db.Column(db.SmallInteger, primary_key=True)
+    total_cents = db.Column(db.BigInteger, nullable=False, default=0)
+    txn_count = db.Column(db.Integer, nullable=False, default=0)
 
 class Category(db.Model):
     __tablename__ = "categories"
@@ -93,6 +180,8 @@ class Rule(db.Model):
     # The category to assign if the keyword is found
     category_id = db.Column(db.Integer, db.ForeignKey("categories.id"), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Part of the rule engine's version stamp, so edits recompile the matcher
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     # Establish a relationship to the Category model
     category = db.relationship("Category", lazy="joined")
 
@@ -107,3 +196,29 @@ class RefundKeyword(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     keyword = db.Column(db.Text, nullable=False, unique=True, index=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class LlmSuggestionCache(db.Model):
+    """A model answer remembered per merchant fingerprint, category list and model (see services/llm_cache.py)."""
+    __tablename__ = "llm_suggestion_cache"
+    id = db.Column(db.BigInteger, primary_key=True)
+    fingerprint = db.Column(db.Text, nullable=False)
+    # Hash of the category names offered in the prompt; a changed list never hits old answers
+    categories_hash = db.Column(db.Text, nullable=False)
+    model = db.Column(db.Text, nullable=False)
+    category_name = db.Column(db.Text, nullable=False)
+    reason = db.Column(db.Text)
+    hits = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_hit_at = db.Column(db.DateTime)
+    __table_args__ = (
+        db.UniqueConstraint("fingerprint", "categories_hash", "model", name="uq_llm_suggestion_cache_key"),
+    )
+
+class ReviewQueue(db.Model):
+    """A batch of AI suggestions or refund pairs waiting for review (see services/review_queue.py)."""
+    __tablename__ = "review_queues"
+    id = db.Column(db.BigInteger, primary_key=True)
+    kind = db.Column(db.Text, nullable=False)  # "suggestions" or "refund_pairs"
+    items = db.Column(JSONB, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
@@ -0,0 +1,483 @@
+# app/services/aggregates.py
+"""
+Derived aggregates over live (not soft-deleted) transactions.
+
+Tables here are never written directly by request handlers. Code that makes
+transactions live (import commit, manual add, revive/restore) calls
+published(); code that soft-deletes them calls retired(). Both take the
+affected transaction ids and must run after the change has been flushed, in
+the same database transaction. Changes to a live row's category, transfer
+or joint flag go inside `with reclassifying(ids):`. rebuild_*() recompute
+from scratch and check_*() report drift against a full recomputation.
+
+Currently maintained:
+  - account_balance_snapshots: per-account balance for the dashboard.
+  - transaction_rollups: daily and monthly totals for the dashboard charts.
+
+An account's aggregates are built in full the first time one of these hooks
+touches it (ensure_snapshots), so an account with a snapshot row also has
+complete rollups. Until every account with transactions has one (fresh
+upgrade, before `flask rebuild-rollups`), rollup_source() makes the charts
+read the same totals straight from the ledger; each process stops checking
+once it has seen none pending.
+"""
+from __future__ import annotations
+
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from typing import Iterable, List
+
+from sqlalchemy import text, and_, or_
+from sqlalchemy.orm import aliased
+
+from ..extensions import db
+from ..models import AccountBalanceSnapshot, TransactionRollup
+
+# Columns every "changed rows" query must return.
+CHANGED_COLUMNS = (
+    "id, account_id, txn_date, amount_cents, running_balance_cents, category_id, is_joint, is_transfer"
+)
+
+
+def changed_by_ids(live_only: bool = False) -> str:
+    """A changed-rows query selecting transactions by :ids."""
+    sql = f"SELECT {CHANGED_COLUMNS} FROM transactions WHERE id = ANY(CAST(:ids AS bigint[]))"
+    return sql + " AND NOT is_deleted" if live_only else sql
+
+
+def _statement(changed_sql: str, *ctes: str) -> str:
+    """WITH changed AS (changed_sql), <ctes> SELECT count(*) AS changed FROM changed."""
+    return f"WITH changed AS ({changed_sql}),\n" + ",\n".join(ctes) + "\nSELECT count(*) AS changed FROM changed"
+
+
+# ----- account balance snapshots ---------------------------------------------
+
+# Full recomputation of one snapshot row per account matching {where}.
+_SNAPSHOT_SELECT = """
+SELECT a.id AS account_id,
+       s.sum_cents,
+       s.txn_count,
+       l.id AS latest_txn_id,
+       l.txn_date AS latest_txn_date,
+       l.running_balance_cents AS latest_balance_cents
+FROM accounts a
+CROSS JOIN LATERAL (
+    SELECT coalesce(sum(t.amount_cents), 0) AS sum_cents, count(*) AS txn_count
+    FROM transactions t
+    WHERE t.account_id = a.id AND NOT t.is_deleted
+) s
+LEFT JOIN LATERAL (
+    SELECT t.id, t.txn_date, t.running_balance_cents
+    FROM transactions t
+    WHERE t.account_id = a.id AND NOT t.is_deleted AND t.running_balance_cents IS NOT NULL
+    ORDER BY t.txn_date DESC, t.id DESC
+    LIMIT 1
+) l ON true
+WHERE {where}
+"""
+
+_SNAPSHOT_COLUMNS = (
+    "account_id, sum_cents, txn_count, latest_txn_id, latest_txn_date, latest_balance_cents, updated_at"
+)
+
+# Accounts touched by a change that have no snapshot yet get a full one
+# (computed from the post-change state, so no delta is applied to them).
+_ENSURE_SNAPSHOTS_SQL = text(f"""
+INSERT INTO account_balance_snapshots ({_SNAPSHOT_COLUMNS})
+SELECT r.*, :now FROM ({_SNAPSHOT_SELECT.format(where='''
+    a.id = ANY(CAST(:account_ids AS int[]))
+    AND NOT EXISTS (SELECT 1 FROM account_balance_snapshots b WHERE b.account_id = a.id)
+''')}) r
+ON CONFLICT (account_id) DO NOTHING
+RETURNING account_id
+""")
+
+_COMPUTE_SNAPSHOTS_SQL = text(_SNAPSHOT_SELECT.format(where="a.id = ANY(CAST(:account_ids AS int[]))"))
+
+_REBUILD_SNAPSHOTS_SQL = text(f"""
+INSERT INTO account_balance_snapshots ({_SNAPSHOT_COLUMNS})
+SELECT r.*, :now FROM ({_SNAPSHOT_SELECT.format(where="true")}) r
+ON CONFLICT (account_id) DO UPDATE SET
+    sum_cents = EXCLUDED.sum_cents,
+    txn_count = EXCLUDED.txn_count,
+    latest_txn_id = EXCLUDED.latest_txn_id,
+    latest_txn_date = EXCLUDED.latest_txn_date,
+    latest_balance_cents = EXCLUDED.latest_balance_cents,
+    updated_at = EXCLUDED.updated_at
+""")
+
+_CHECK_SNAPSHOTS_SQL = text(f"""
+SELECT f.account_id,
+       b.sum_cents AS stored_sum, f.sum_cents AS actual_sum,
+       b.txn_count AS stored_count, f.txn_count AS actual_count,
+       b.latest_txn_id AS stored_latest, f.latest_txn_id AS actual_latest
+FROM ({_SNAPSHOT_SELECT.format(where="true")}) f
+LEFT JOIN account_balance_snapshots b ON b.account_id = f.account_id
+WHERE b.account_id IS NULL
+   OR b.sum_cents IS DISTINCT FROM f.sum_cents
+   OR b.txn_count IS DISTINCT FROM f.txn_count
+   OR b.latest_txn_id IS DISTINCT FROM f.latest_txn_id
+   OR b.latest_balance_cents IS DISTINCT FROM f.latest_balance_cents
+ORDER BY f.account_id
+""")
+
+# Snapshot deltas as CTEs over `changed`, for _statement(). Accounts in
+# :fresh were just created from the post-change state and are skipped.
+_PUBLISH_SNAPSHOTS = """
+balance_totals AS (
+    SELECT account_id, sum(amount_cents) AS cents, count(*) AS n
+    FROM changed
+    WHERE account_id <> ALL(CAST(:fresh AS int[]))
+    GROUP BY account_id
+),
+balance_latest AS (
+    SELECT DISTINCT ON (account_id) account_id, id, txn_date, running_balance_cents
+    FROM changed
+    WHERE running_balance_cents IS NOT NULL
+    ORDER BY account_id, txn_date DESC, id DESC
+),
+balance_candidates AS (
+    SELECT c.account_id, c.cents, c.n, l.id, l.txn_date, l.running_balance_cents
+    FROM balance_totals c
+    LEFT JOIN balance_latest l ON l.account_id = c.account_id
+),
+balance_snapshots AS (
+    UPDATE account_balance_snapshots AS s
+    SET sum_cents = s.sum_cents + c.cents,
+        txn_count = s.txn_count + c.n,
+        latest_txn_id = CASE WHEN {newer} THEN c.id ELSE s.latest_txn_id END,
+        latest_txn_date = CASE WHEN {newer} THEN c.txn_date ELSE s.latest_txn_date END,
+        latest_balance_cents = CASE WHEN {newer} THEN c.running_balance_cents ELSE s.latest_balance_cents END,
+        updated_at = :now
+    FROM balance_candidates c
+    WHERE s.account_id = c.account_id
+    RETURNING s.account_id
+)""".format(newer=(
+    "c.id IS NOT NULL AND (s.latest_txn_id IS NULL"
+    " OR (c.txn_date, c.id) > (s.latest_txn_date, s.latest_txn_id))"
+))
+
+# The latest-balance row is fixed up afterwards by _REFRESH_LATEST_SQL, which
+# has to see the post-change ledger.
+_RETIRE_SNAPSHOTS = """
+balance_totals AS (
+    SELECT account_id, sum(amount_cents) AS cents, count(*) AS n
+    FROM changed
+    WHERE account_id <> ALL(CAST(:fresh AS int[]))
+    GROUP BY account_id
+),
+balance_snapshots AS (
+    UPDATE account_balance_snapshots AS s
+    SET sum_cents = s.sum_cents - c.cents,
+        txn_count = s.txn_count - c.n,
+        updated_at = :now
+    FROM balance_totals c
+    WHERE s.account_id = c.account_id
+    RETURNING s.account_id
+)"""
+
+# Only needed when the row carrying an account's latest balance went away;
+# served by ix_transactions_account_latest_balance.
+_REFRESH_LATEST_SQL = text("""
+UPDATE account_balance_snapshots AS s
+SET (latest_txn_id, latest_txn_date, latest_balance_cents) = (
+        SELECT t.id, t.txn_date, t.running_balance_cents
+        FROM transactions t
+        WHERE t.account_id = s.account_id
+          AND NOT t.is_deleted
+          AND t.running_balance_cents IS NOT NULL
+        ORDER BY t.txn_date DESC, t.id DESC
+        LIMIT 1
+    ),
+    updated_at = :now
+WHERE s.latest_txn_id = ANY(CAST(:ids AS bigint[]))
+""")
+
+
+# ----- transaction rollups ---------------------------------------------------
+
+ROLLUP_KEY = "grain, bucket, account_id, category_key, is_joint, is_transfer, sign"
+
+# One row per (day|month, account, category, joint, transfer, sign of amount).
+_ROLLUP_SELECT = """
+SELECT g.grain,
+       CASE g.grain WHEN 'day' THEN c.txn_date
+            ELSE CAST(date_trunc('month', c.txn_date) AS date) END AS bucket,
+       coalesce(c.account_id, 0) AS account_id,
+       coalesce(c.category_id, 0) AS category_key,
+       coalesce(c.is_joint, false) AS is_joint,
+       coalesce(c.is_transfer, false) AS is_transfer,
+       CAST(sign(c.amount_cents) AS smallint) AS sign,
+       {direction} * sum(c.amount_cents) AS total_cents,
+       {direction} * count(*) AS txn_count
+FROM {source} c
+CROSS JOIN (VALUES ('day'), ('month')) AS g(grain)
+GROUP BY 1, 2, 3, 4, 5, 6, 7
+"""
+
+
+_CHANGED_NOT_FRESH = "(SELECT * FROM changed WHERE account_id <> ALL(CAST(:fresh AS int[])))"
+
+
+def _rollup_delta(direction: int) -> str:
+    """
+    CTEs adding (direction=1) or removing (-1) the `changed` rows to/from the
+    rollups, skipping the accounts in :fresh like the snapshot deltas.
+    """
+    return f"""
+rollup_delta AS ({_ROLLUP_SELECT.format(direction=int(direction), source=_CHANGED_NOT_FRESH)}),
+rollups AS (
+    INSERT INTO transaction_rollups ({ROLLUP_KEY}, total_cents, txn_count)
+    SELECT * FROM rollup_delta
+    ON CONFLICT ({ROLLUP_KEY}) DO UPDATE SET
+        total_cents = transaction_rollups.total_cents + EXCLUDED.total_cents,
+        txn_count = transaction_rollups.txn_count + EXCLUDED.txn_count
+    RETURNING 1
+)"""
+
+
+_LIVE_TRANSACTIONS = "(SELECT * FROM transactions WHERE NOT is_deleted)"
+
+_REBUILD_ROLLUPS_SQL = text(f"""
+INSERT INTO transaction_rollups ({ROLLUP_KEY}, total_cents, txn_count)
+{_ROLLUP_SELECT.format(direction=1, source=_LIVE_TRANSACTIONS)}
+""")
+
+# Buckets that went to zero may linger with total 0 / count 0; they are not drift.
+_CHECK_ROLLUPS_SQL = text(f"""
+WITH actual AS ({_ROLLUP_SELECT.format(direction=1, source=_LIVE_TRANSACTIONS)}),
+stored AS (SELECT * FROM transaction_rollups WHERE txn_count <> 0 OR total_cents <> 0)
+SELECT coalesce(a.grain, s.grain) AS grain,
+       coalesce(a.bucket, s.bucket) AS bucket,
+       coalesce(a.account_id, s.account_id) AS account_id,
+       coalesce(a.category_key, s.category_key) AS category_key,
+       s.total_cents AS stored_total, a.total_cents AS actual_total,
+       s.txn_count AS stored_count, a.txn_count AS actual_count
+FROM actual a
+FULL JOIN stored s USING ({ROLLUP_KEY})
+WHERE s.total_cents IS DISTINCT FROM a.total_cents
+   OR s.txn_count IS DISTINCT FROM a.txn_count
+ORDER BY 1, 2, 3, 4
+""")
+
+
+# Full rollups for accounts that just got their first snapshot; anything
+# left over from before is replaced.
+_CLEAR_ACCOUNT_ROLLUPS_SQL = text(
+    "DELETE FROM transaction_rollups WHERE account_id = ANY(CAST(:account_ids AS int[]))"
+)
+_ACCOUNT_LIVE_TRANSACTIONS = (
+    "(SELECT * FROM transactions WHERE NOT is_deleted AND account_id = ANY(CAST(:account_ids AS int[])))"
+)
+_BUILD_ACCOUNT_ROLLUPS_SQL = text(f"""
+INSERT INTO transaction_rollups ({ROLLUP_KEY}, total_cents, txn_count)
+{_ROLLUP_SELECT.format(direction=1, source=_ACCOUNT_LIVE_TRANSACTIONS)}
+""")
+
+_ROLLUPS_PENDING_SQL = text("""
+SELECT EXISTS (
+    SELECT 1 FROM accounts a
+    WHERE NOT EXISTS (SELECT 1 FROM account_balance_snapshots b WHERE b.account_id = a.id)
+      AND EXISTS (SELECT 1 FROM transactions t WHERE t.account_id = a.id AND NOT t.is_deleted)
+)
+""")
+
+# The rollup rows computed on the fly, with TransactionRollup's columns.
+_LEDGER_ROLLUPS = aliased(
+    TransactionRollup,
+    text(_ROLLUP_SELECT.format(direction=1, source=_LIVE_TRANSACTIONS))
+    .columns(*TransactionRollup.__table__.columns)
+    .subquery("ledger_rollups"),
+)
+
+
+# Set once no account is pending. Every hook builds an account's aggregates
+# before its first live transaction counts, so it never goes back to pending
+# and the charts stop paying for the check.
+_rollups_complete = False
+
+
+def rollup_source():
+    """
+    The entity chart queries should read rollups from: TransactionRollup, or
+    while some account with transactions has not had its aggregates built
+    yet, the same rows aggregated from the ledger on the fly (read-only).
+    """
+    global _rollups_complete
+    if not _rollups_complete:
+        _rollups_complete = not db.session.execute(_ROLLUPS_PENDING_SQL).scalar()
+    return TransactionRollup if _rollups_complete else _LEDGER_ROLLUPS
+
+
+def rollup_ranges(start: date, end: date, months: bool = True) -> List[tuple]:
+    """
+    Cover [start, end] with as few buckets as possible: (grain, first, last)
+    ranges of bucket dates. Whole calendar months come from the monthly
+    rollup when `months` is true; the partial months at either edge (or the
+    whole range otherwise) from the daily one.
+    """
+    if start > end:
+        return []
+    if not months:
+        return [("day", start, end)]
+
+    first_full = start if start.day == 1 else (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+    if end == date.max:
+        after_full = date.max
+    else:
+        after_full = (end + timedelta(days=1)).replace(day=1)
+    if first_full >= after_full:
+        return [("day", start, end)]
+
+    ranges = []
+    if start < first_full:
+        ranges.append(("day", start, first_full - timedelta(days=1)))
+    ranges.append(("month", first_full, (after_full - timedelta(days=1)).replace(day=1)))
+    if after_full <= end:
+        ranges.append(("day", after_full, end))
+    return ranges
+
+
+def rollup_window(start: date, end: date, months: bool = True, source=TransactionRollup):
+    """Filter on source (see rollup_source) selecting exactly the buckets covering [start, end]."""
+    return or_(*[
+        and_(
+            source.grain == grain,
+            source.bucket >= lo,
+            source.bucket <= hi,
+        )
+        for grain, lo, hi in rollup_ranges(start, end, months)
+    ] or [False])
+
+
+def ensure_snapshots(account_ids: Iterable[int]) -> List[int]:
+    """
+    Create full snapshots, and full rollups, for any of these accounts that
+    have no snapshot yet; returns the ones created.
+    """
+    account_ids = sorted({int(a) for a in account_ids if a is not None})
+    if not account_ids:
+        return []
+    rows = db.session.execute(
+        _ENSURE_SNAPSHOTS_SQL, {"account_ids": account_ids, "now": datetime.utcnow()}
+    )
+    fresh = [r.account_id for r in rows]
+    if fresh:
+        db.session.execute(_CLEAR_ACCOUNT_ROLLUPS_SQL, {"account_ids": fresh})
+        db.session.execute(_BUILD_ACCOUNT_ROLLUPS_SQL, {"account_ids": fresh})
+    return fresh
+
+
+def compute_snapshots(account_ids: Iterable[int]) -> dict:
+    """
+    Unsaved snapshots computed from the ledger, by account id, for accounts
+    that have none stored yet. Read-only: snapshots are only written by the
+    hooks above and rebuild_balance_snapshots().
+    """
+    account_ids = sorted({int(a) for a in account_ids if a is not None})
+    if not account_ids:
+        return {}
+    rows = db.session.execute(_COMPUTE_SNAPSHOTS_SQL, {"account_ids": account_ids}).mappings()
+    return {r["account_id"]: AccountBalanceSnapshot(**r) for r in rows}
+
+
+def publishing(changed_sql: str) -> str:
+    """
+    One statement that applies the rows returned by `changed_sql` (a SELECT,
+    or an INSERT/UPDATE ... RETURNING CHANGED_COLUMNS) to the aggregates and
+    returns their count as `changed`. Bind :fresh (accounts to skip, see
+    ensure_snapshots) and :now. Callers running DML this way must call
+    ensure_snapshots() for the affected accounts first.
+    """
+    return _statement(changed_sql, _PUBLISH_SNAPSHOTS, _rollup_delta(+1))
+
+
+def _account_ids_for(ids: List[int]) -> List[int]:
+    rows = db.session.execute(
+        text("SELECT DISTINCT account_id FROM transactions WHERE id = ANY(CAST(:ids AS bigint[]))"),
+        {"ids": ids},
+    )
+    return [r.account_id for r in rows]
+
+
+def published(ids: Iterable[int]) -> None:
+    """Transactions `ids` just became live (inserted, revived or restored)."""
+    ids = [int(i) for i in ids]
+    if not ids:
+        return
+    db.session.flush()
+    fresh = ensure_snapshots(_account_ids_for(ids))
+    db.session.execute(
+        text(publishing(changed_by_ids())),
+        {"ids": ids, "fresh": fresh, "now": datetime.utcnow()},
+    )
+
+
+_RETIRE_SQL = text(_statement(changed_by_ids(), _RETIRE_SNAPSHOTS, _rollup_delta(-1)))
+
+
+def retired(ids: Iterable[int]) -> None:
+    """Transactions `ids` were just soft-deleted."""
+    ids = [int(i) for i in ids]
+    if not ids:
+        return
+    db.session.flush()
+    now = datetime.utcnow()
+    fresh = ensure_snapshots(_account_ids_for(ids))
+    db.session.execute(_RETIRE_SQL, {"ids": ids, "fresh": fresh, "now": now})
+    db.session.execute(_REFRESH_LATEST_SQL, {"ids": ids, "now": now})
+
+
+# Balances don't depend on category/flags, so only the rollups move.
+_UNCLASSIFY_SQL = text(_statement(changed_by_ids(live_only=True), _rollup_delta(-1)))
+_CLASSIFY_SQL = text(_statement(changed_by_ids(live_only=True), _rollup_delta(+1)))
+
+
+@contextmanager
+def reclassifying(ids: Iterable[int]):
+    """
+    Wrap changes to the category_id / is_transfer / is_joint of transactions
+    `ids`: their rollup contribution is removed before and re-added after.
+    """
+    ids = [int(i) for i in ids]
+    if not ids:
+        yield
+        return
+    db.session.flush()
+    # Accounts seen for the first time get full rollups from the pre-change
+    # state, which the deltas below then adjust.
+    ensure_snapshots(_account_ids_for(ids))
+    db.session.execute(_UNCLASSIFY_SQL, {"ids": ids, "fresh": []})
+    yield
+    db.session.flush()
+    db.session.execute(_CLASSIFY_SQL, {"ids": ids, "fresh": []})
+
+
+def _ensure_all_snapshots() -> None:
+    ensure_snapshots(a for (a,) in db.session.execute(text("SELECT id FROM accounts")))
+
+
+def rebuild_balance_snapshots() -> int:
+    """Recompute every account's snapshot from the ledger. Returns the number of accounts."""
+    # Accounts that had none get their rollups built too (see ensure_snapshots).
+    _ensure_all_snapshots()
+    result = db.session.execute(_REBUILD_SNAPSHOTS_SQL, {"now": datetime.utcnow()})
+    return result.rowcount
+
+
+def check_balance_snapshots() -> List[dict]:
+    """Accounts whose stored snapshot differs from a full recomputation (empty when consistent)."""
+    return [dict(r) for r in db.session.execute(_CHECK_SNAPSHOTS_SQL).mappings()]
+
+
+def rebuild_rollups() -> int:
+    """Recompute all daily and monthly rollups from the ledger. Returns the number of buckets."""
+    # Every account gets a snapshot, so no later hook rebuilds its rollups on top.
+    _ensure_all_snapshots()
+    db.session.execute(text("DELETE FROM transaction_rollups"))
+    return db.session.execute(_REBUILD_ROLLUPS_SQL).rowcount
+
+
+def check_rollups() -> List[dict]:
+    """Rollup buckets that differ from a full recomputation (empty when consistent)."""
+    return [dict(r) for r in db.session.execute(_CHECK_ROLLUPS_SQL).mappings()]
@@ -2,7 +2,9 @@
 import os
 from openai import OpenAI, APIConnectionError
 from flask import current_app
+from ..extensions import db
 from ..models import Transaction, Category
+from .llm_cache import CachePlan
 import json
 
 
@@ -12,9 +14,50 @@ def is_ai_configured():
     return all([config.get("OPENAI_API_BASE"), config.get("OPENAI_API_KEY"), config.get("OPENAI_MODEL_NAME")])
 
 
+def build_system_prompt(category_names):
+    category_list_str = "\n".join([f'- "{name}"' for name in category_names])
+    return f"""
+You are an expert financial assistant. Your task is to categorize bank transactions based on their description.
+You must respond with ONLY a valid JSON object. Do not include any other text, explanations, or markdown.
+Your entire response must be a single JSON object.
+
+The JSON object should have a single key "suggestions", which is an array of objects.
+Each object in the array must have three keys: "id" (the integer transaction ID), "category_name" (the suggested category name), and "reason" (a brief, one-sentence explanation).
+
+For the "category_name", you must choose one of the following exact, case-sensitive category names. Do not add, modify, or infer any other category.
+
+Available Categories:
+{category_list_str}
+"""
+
+
+def build_user_prompt(items):
+    """items: (transaction id, description) pairs."""
+    transaction_list_str = "\n".join([f"ID {txn_id}: {description}" for txn_id, description in items])
+    return f"""
+Here are the transactions to categorize:
+{transaction_list_str}
+"""
+
+
+def parse_suggestions(raw_content):
+    """The "suggestions" list from a model reply, tolerating text around the JSON object."""
+    start_index = raw_content.find('{')
+    end_index = raw_content.rfind('}') + 1
+
+    if start_index == -1 or end_index == 0:
+        raise ValueError("No valid JSON object found in the LLM response.")
+
+    json_string = raw_content[start_index:end_index]
+    result = json.loads(json_string)
+    return result.get("suggestions", [])
+
+
 def get_category_suggestions(transactions, all_categories):
     """
     Given a list of transactions, get category suggestions from the LLM.
+    Descriptions the suggestion cache already knows are answered from it and
+    only the rest are sent.
     Returns a list of tuples: (transaction_id, suggested_category_name, reason)
     Returns an empty list and an error message if it fails.
     """
@@ -33,30 +76,20 @@ def get_category_suggestions(transactions, all_categories):
             api_key=current_app.config["OPENAI_API_KEY"],
         )
 
-        category_list_str = "\n".join([f'- "{c.name}"' for c in all_categories])
-        transaction_list_str = "\n".join(
-            [f"ID {t.id}: {t.description_raw}" for t in transactions]
+        category_names = [c.name for c in all_categories]
+        plan = CachePlan(
+            [(t.id, t.description_raw) for t in transactions],
+            category_names,
+            current_app.config["OPENAI_MODEL_NAME"],
         )
-
-        # --- START MODIFICATION ---
-        system_prompt = f"""
-You are an expert financial assistant. Your task is to categorize bank transactions based on their description.
-You must respond with ONLY a valid JSON object. Do not include any other text, explanations, or markdown.
-Your entire response must be a single JSON object.
-
-The JSON object should have a single key "suggestions", which is an array of objects.
-Each object in the array must have three keys: "id" (the integer transaction ID), "category_name" (the suggested category name), and "reason" (a brief, one-sentence explanation).
-
-For the "category_name", you must choose one of the following exact, case-sensitive category names. Do not add, modify, or infer any other category.
-
-Available Categories:
-{category_list_str}
-"""
-        # --- END MODIFICATION ---
-        user_prompt = f"""
-Here are the transactions to categorize:
-{transaction_list_str}
-"""
+        current_app.logger.info("LLM cache: %s", plan.stats)
+        if not plan.to_send:
+            suggestions = plan.merge([])
+            db.session.commit()
+            return suggestions, None
+
+        system_prompt = build_system_prompt(category_names)
+        user_prompt = build_user_prompt(plan.to_send)
         # --- Make the API Call ---
         response = client.chat.completions.create(
             model=current_app.config["OPENAI_MODEL_NAME"],
@@ -68,17 +101,9 @@ Here are the transactions to categorize:
             max_tokens=2048,
         )
 
-        raw_content = response.choices[0].message.content
-        start_index = raw_content.find('{')
-        end_index = raw_content.rfind('}') + 1
-
-        if start_index == -1 or end_index == 0:
-            raise ValueError("No valid JSON object found in the LLM response.")
-
-        json_string = raw_content[start_index:end_index]
-        result = json.loads(json_string)
-
-        return result.get("suggestions", []), None
+        suggestions = plan.merge(parse_suggestions(response.choices[0].message.content))
+        db.session.commit()
+        return suggestions, None
 
     except APIConnectionError:
         return [], "Could not connect to the AI endpoint. Please check the URL and ensure the service is running."
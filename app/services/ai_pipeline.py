@@ -0,0 +1,224 @@
+# app/services/ai_pipeline.py
+"""
+Background LLM categorization for large backlogs.
+
+Transactions are split into batches that fit a prompt-token budget, sent to
+the OpenAI-compatible endpoint concurrently (at most AI_CONCURRENCY requests
+in flight), retried with exponential backoff on transient errors, and the
+replies merged into one suggestion list in the shape get_category_suggestions
+returns. A batch that still fails after its retries is reported and skipped;
+it never sinks the whole run.
+
+run_pipeline() needs no app context (the benchmark drives it against a stub
+server); categorize_backlog() is the job wrapper that reads the ledger.
+"""
+import asyncio
+import random
+import time
+from typing import Callable, Optional
+
+from flask import current_app
+from openai import AsyncOpenAI, APIConnectionError, APITimeoutError, RateLimitError, InternalServerError
+
+from ..extensions import db
+from ..models import Account, Category, Transaction
+from . import review_queue, rule_engine
+from .ai_categorizer import build_system_prompt, build_user_prompt, parse_suggestions
+from .llm_cache import CachePlan
+
+# Errors worth another attempt. ValueError covers replies that were cut off or
+# not valid JSON, which a retry usually fixes.
+TRANSIENT_ERRORS = (APIConnectionError, APITimeoutError, RateLimitError, InternalServerError, ValueError)
+
+# Reply budget per request: a fixed overhead plus room for one suggestion per transaction
+COMPLETION_TOKENS_BASE = 64
+COMPLETION_TOKENS_PER_TXN = 48
+BACKOFF_BASE_SECONDS = 0.5
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about 4 characters per token) used for batch planning."""
+    return len(text) // 4 + 1
+
+
+def plan_batches(items: list[tuple[int, str]], system_prompt: str, token_budget: int, max_items: int) -> list[list]:
+    """Split (id, description) pairs into batches whose prompt fits token_budget."""
+    base = estimate_tokens(system_prompt) + estimate_tokens(build_user_prompt([]))
+    batches, current, used = [], [], base
+    for txn_id, description in items:
+        cost = estimate_tokens(f"ID {txn_id}: {description}\n")
+        if current and (used + cost > token_budget or len(current) >= max_items):
+            batches.append(current)
+            current, used = [], base
+        current.append((txn_id, description))
+        used += cost
+    if current:
+        batches.append(current)
+    return batches
+
+
+async def _run_batch(client, semaphore, model, system_prompt, batch, max_retries, stats):
+    delay = BACKOFF_BASE_SECONDS
+    for attempt in range(max_retries + 1):
+        try:
+            async with semaphore:
+                response = await client.chat.completions.create(
+                    model=model,
+                    messages=[
+                        {"role": "system", "content": system_prompt},
+                        {"role": "user", "content": build_user_prompt(batch)},
+                    ],
+                    temperature=0.0,
+                    max_tokens=COMPLETION_TOKENS_BASE + COMPLETION_TOKENS_PER_TXN * len(batch),
+                )
+                if response.usage:
+                    stats["prompt_tokens"] += response.usage.prompt_tokens or 0
+                    stats["completion_tokens"] += response.usage.completion_tokens or 0
+            return parse_suggestions(response.choices[0].message.content or "")
+        except TRANSIENT_ERRORS:
+            if attempt == max_retries:
+                raise
+            stats["retries"] += 1
+            await asyncio.sleep(delay * (1 + random.random()))
+            delay *= 2
+
+
+async def _run_all(items, category_names, *, base_url, api_key, model, token_budget, max_items,
+                   concurrency, max_retries, timeout, progress):
+    system_prompt = build_system_prompt(category_names)
+    batches = plan_batches(items, system_prompt, token_budget, max_items)
+    stats = {
+        "transactions": len(items), "batches": len(batches), "batches_done": 0, "failed_batches": 0,
+        "retries": 0, "prompt_tokens": 0, "completion_tokens": 0,
+    }
+    allowed = set(category_names)
+    merged: dict[int, dict] = {}
+    errors = []
+
+    # The SDK's own retries are disabled so every attempt goes through the semaphore and is counted.
+    client = AsyncOpenAI(base_url=base_url, api_key=api_key, max_retries=0, timeout=timeout)
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def one(batch):
+        try:
+            suggestions = await _run_batch(client, semaphore, model, system_prompt, batch, max_retries, stats)
+        except Exception as e:
+            stats["failed_batches"] += 1
+            errors.append(f"Batch of {len(batch)} (ids {batch[0][0]}-{batch[-1][0]}) failed: {e}")
+        else:
+            ids = {txn_id for txn_id, _ in batch}
+            for s in suggestions:
+                try:
+                    txn_id = int(s.get("id"))
+                except (TypeError, ValueError, AttributeError):
+                    continue
+                if txn_id in ids and s.get("category_name") in allowed and txn_id not in merged:
+                    merged[txn_id] = {"id": txn_id, "category_name": s["category_name"], "reason": s.get("reason", "")}
+        stats["batches_done"] += 1
+        if progress:
+            progress(stats)
+
+    try:
+        await asyncio.gather(*(one(b) for b in batches))
+    finally:
+        await client.close()
+    return [merged[k] for k in sorted(merged)], errors, stats
+
+
+def run_pipeline(
+    items: list[tuple[int, str]],
+    category_names: list[str],
+    *,
+    base_url: str,
+    api_key: str,
+    model: str,
+    token_budget: int = 3000,
+    max_items: int = 100,
+    concurrency: int = 4,
+    max_retries: int = 4,
+    timeout: float = 120,
+    progress: Optional[Callable[[dict], None]] = None,
+) -> dict:
+    """
+    Categorize (id, description) pairs with the LLM. Returns {"suggestions",
+    "errors", "stats"}; stats include throughput (transactions_per_sec) and the
+    token usage the server reported.
+    """
+    started = time.perf_counter()
+    suggestions, errors, stats = asyncio.run(_run_all(
+        items, category_names, base_url=base_url, api_key=api_key, model=model,
+        token_budget=token_budget, max_items=max_items, concurrency=concurrency,
+        max_retries=max_retries, timeout=timeout, progress=progress,
+    ))
+    stats["seconds"] = round(time.perf_counter() - started, 3)
+    stats["suggested"] = len(suggestions)
+    stats["transactions_per_sec"] = round(len(items) / stats["seconds"], 1) if stats["seconds"] else None
+    return {"suggestions": suggestions, "errors": errors, "stats": stats}
+
+
+def categorize_backlog(
+    scope: str = "uncategorized",
+    institution_id: Optional[int] = None,
+    account_id: Optional[int] = None,
+    progress: Optional[Callable[[dict], None]] = None,
+) -> dict:
+    """
+    Job body for jobs.start(): suggestions for every live transaction in
+    scope. Rule matches and cached answers are resolved locally; only
+    descriptions the cache has not seen go to the LLM. The suggestions are
+    stored as a review queue (result["queue_id"]), not kept in the job.
+    """
+    config = current_app.config
+    query = Transaction.query.filter(Transaction.is_deleted == False)
+    if institution_id:
+        query = query.join(Account).filter(Account.institution_id == institution_id)
+    if account_id:
+        query = query.filter(Transaction.account_id == account_id)
+    if scope == "uncategorized":
+        query = query.filter(Transaction.category_id.is_(None))
+    rows = query.with_entities(Transaction.id, Transaction.description_raw).order_by(Transaction.id).all()
+
+    categories = Category.query.all()
+    category_names = {c.id: c.name for c in categories}
+    engine = rule_engine.get_engine()
+
+    suggestions, llm_items = [], []
+    for txn_id, description in rows:
+        match = engine.match(description)
+        if match:
+            suggestions.append({
+                "id": txn_id,
+                "category_name": category_names.get(match.category_id),
+                "reason": f"Rule: Matched '{match.keyword}'",
+            })
+        else:
+            llm_items.append((txn_id, description))
+
+    result = {"suggestions": [], "errors": [], "stats": {"transactions": 0}}
+    if llm_items:
+        if not categories:
+            raise ValueError("No categories exist in the database. Please create some first.")
+        plan = CachePlan(llm_items, [c.name for c in categories], config["OPENAI_MODEL_NAME"])
+        db.session.commit()
+        result = run_pipeline(
+            plan.to_send,
+            [c.name for c in categories],
+            base_url=config["OPENAI_API_BASE"],
+            api_key=config["OPENAI_API_KEY"],
+            model=config["OPENAI_MODEL_NAME"],
+            token_budget=config["AI_BATCH_TOKEN_BUDGET"],
+            max_items=config["AI_BATCH_MAX_TRANSACTIONS"],
+            concurrency=config["AI_CONCURRENCY"],
+            max_retries=config["AI_MAX_RETRIES"],
+            timeout=config["AI_REQUEST_TIMEOUT_SECONDS"],
+            progress=progress,
+        )
+        result["suggestions"] = plan.merge(result["suggestions"])
+        result["stats"].update(plan.stats)
+        db.session.commit()
+    result["stats"]["rule_matches"] = len(suggestions)
+    suggestions = sorted(suggestions + result.pop("suggestions"), key=lambda s: s["id"])
+    result["stats"]["suggestions"] = len(suggestions)
+    result["queue_id"] = review_queue.create(review_queue.SUGGESTIONS, suggestions).id if suggestions else None
+    db.session.commit()
+    return result
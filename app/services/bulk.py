@@ -0,0 +1,89 @@
+# app/services/bulk.py
+"""
+Set-based write helpers (COPY FROM STDIN).
+
+Every import's parsed rows reach the database through copy_rows, into
+import_staged_rows; committing an import then moves them into transactions
+server-side with one INSERT ... SELECT (services.review), so no row goes
+through the ORM or a per-row INSERT on either step.
+
+Everything here runs on the SQLAlchemy session's own connection, so the rows
+written become part of whatever transaction the caller later commits or
+rolls back.
+"""
+from __future__ import annotations
+
+import json
+from datetime import date, datetime
+from typing import Any, Dict, Iterable
+
+from ..extensions import db
+
+
+def _copy_field(value: Any) -> str:
+    """Render one value in PostgreSQL's COPY text format."""
+    if value is None:
+        return r"\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (dict, list)):
+        value = json.dumps(value)
+    text = str(value)
+    return (
+        text.replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+class _CopyStream:
+    """File-like reader that renders rows lazily, so COPY never needs the whole payload in memory."""
+
+    def __init__(self, rows: Iterable[Dict[str, Any]], columns):
+        self._lines = (
+            "\t".join(_copy_field(row.get(c)) for c in columns) + "\n"
+            for row in rows
+        )
+        self._buf = ""
+        self.count = 0
+
+    def _fill(self, size: int) -> None:
+        parts = [self._buf]
+        have = len(self._buf)
+        for line in self._lines:
+            parts.append(line)
+            have += len(line)
+            self.count += 1
+            if size >= 0 and have >= size:
+                break
+        self._buf = "".join(parts)
+
+    def read(self, size: int = -1) -> str:
+        if size < 0 or len(self._buf) < size:
+            self._fill(size)
+        if size < 0:
+            out, self._buf = self._buf, ""
+        else:
+            out, self._buf = self._buf[:size], self._buf[size:]
+        return out
+
+
+def copy_rows(table: str, columns, rows: Iterable[Dict[str, Any]]) -> int:
+    """
+    Stream rows into `table` with COPY FROM STDIN on the session's
+    connection. Returns the number of rows written. The session is flushed
+    first so pending ORM changes land before the copied rows.
+    """
+    db.session.flush()
+    stream = _CopyStream(rows, columns)
+    dbapi_conn = db.session.connection().connection
+    with dbapi_conn.cursor() as cur:
+        cur.copy_expert(
+            f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT text)",
+            stream,
+        )
+    return stream.count
+
@@ -0,0 +1,117 @@
+# app/services/bulk_apply.py
+"""
+Apply reviewed changes (AI suggestions, refund pairs, bulk edits) with
+set-based UPDATEs.
+
+A change is a dict {"id": txn id, plus any of "category_id", "is_transfer",
+"is_refund", "is_joint"}. Changes are grouped by (field, new value) and each group is one
+`UPDATE ... WHERE id = ANY(:ids)`, so 10k approvals spread over a dozen
+categories are a dozen statements instead of 10k ORM writes. Rows that
+already hold the value and soft-deleted rows are left alone.
+
+apply_changes() and apply_to_ids() flush but do not commit; the caller commits.
+"""
+from collections import defaultdict
+from typing import Iterable, Optional
+
+from sqlalchemy import text
+
+from ..extensions import db
+from ..models import Category
+from . import aggregates
+
+FIELDS = ("category_id", "is_transfer", "is_refund", "is_joint")
+
+# One statement per field; the column name is never taken from input.
+_UPDATE_SQL = {
+    field: text(f"""
+        UPDATE transactions
+        SET {field} = :value
+        WHERE id = ANY(CAST(:ids AS bigint[]))
+          AND NOT is_deleted
+          AND {field} IS DISTINCT FROM :value
+    """)
+    for field in FIELDS
+}
+
+
+def parse_changes(raw: Iterable[dict], category_names: Optional[dict[str, int]] = None) -> tuple[list[dict], list[str]]:
+    """
+    Validate loosely-typed changes (JSON API, CLI). A "category_name" is
+    resolved through category_names (name -> id) when given. Returns
+    (changes, errors); invalid entries are reported and skipped.
+    """
+    changes, errors = [], []
+    for n, item in enumerate(raw):
+        if not isinstance(item, dict):
+            errors.append(f"#{n}: expected an object")
+            continue
+        try:
+            change = {"id": int(item["id"])}
+        except (KeyError, TypeError, ValueError):
+            errors.append(f"#{n}: missing or invalid id")
+            continue
+        if "category_name" in item and category_names is not None:
+            if item["category_name"] not in category_names:
+                errors.append(f"#{n}: unknown category {item['category_name']!r}")
+                continue
+            change["category_id"] = category_names[item["category_name"]]
+        if "category_id" in item:
+            try:
+                change["category_id"] = None if item["category_id"] is None else int(item["category_id"])
+            except (TypeError, ValueError):
+                errors.append(f"#{n}: invalid category_id")
+                continue
+        for flag in ("is_transfer", "is_refund", "is_joint"):
+            if flag in item:
+                if not isinstance(item[flag], bool):
+                    errors.append(f"#{n}: {flag} must be true or false")
+                    break
+                change[flag] = item[flag]
+        else:
+            if len(change) == 1:
+                errors.append(f"#{n}: nothing to change")
+            else:
+                changes.append(change)
+    return changes, errors
+
+
+def apply_changes(changes: Iterable[dict]) -> dict:
+    """
+    Apply changes grouped by (field, value), one UPDATE per group. Category
+    ids that do not exist are ignored. Returns rows changed per field and the
+    number of UPDATE statements issued.
+    """
+    groups: dict[tuple, list[int]] = defaultdict(list)
+    for change in changes:
+        for field in FIELDS:
+            if field in change:
+                groups[(field, change[field])].append(int(change["id"]))
+    return _apply_groups(groups)
+
+
+def apply_to_ids(ids: Iterable[int], values: dict) -> dict:
+    """Set the same values (field -> value, fields from FIELDS) on every transaction in ids."""
+    ids = [int(i) for i in ids]
+    return _apply_groups({(field, values[field]): ids for field in FIELDS if field in values} if ids else {})
+
+
+def _apply_groups(groups: dict[tuple, list[int]]) -> dict:
+    counts = {field: 0 for field in FIELDS}
+    counts["statements"] = 0
+    if not groups:
+        return counts
+
+    wanted = {value for field, value in groups if field == "category_id" and value is not None}
+    known = {c for (c,) in db.session.query(Category.id).filter(Category.id.in_(wanted))} if wanted else set()
+    groups = {
+        (field, value): ids for (field, value), ids in groups.items()
+        if field != "category_id" or value is None or value in known
+    }
+
+    with aggregates.reclassifying(sorted({i for ids in groups.values() for i in ids})):
+        for (field, value), ids in groups.items():
+            result = db.session.execute(_UPDATE_SQL[field], {"ids": ids, "value": value})
+            counts[field] += result.rowcount
+            counts["statements"] += 1
+    return counts
@@ -0,0 +1,147 @@
+# app/services/bulk_edit.py
+"""
+Batch edits of transactions: one selection, one set of operations, one
+database transaction.
+
+The selection is either explicit ids or a filter (account, date range,
+description/merchant text, amount range, uncategorized only). It is resolved
+to ids with a single SELECT; field changes then go through
+bulk_apply.apply_to_ids (one UPDATE per field) and a delete is one
+UPDATE ... RETURNING id handed to aggregates.retired(). Only live
+transactions are ever selected.
+
+edit() raises ValueError with a message fit to show for a bad selection or
+operation set. It flushes but does not commit; the caller commits.
+"""
+from datetime import date, datetime
+from typing import Optional
+
+from sqlalchemy import text, any_, bindparam, BigInteger
+from sqlalchemy.dialects.postgresql import ARRAY
+
+from ..extensions import db
+from ..models import Transaction
+from ..utils import to_cents
+from . import aggregates, bulk_apply, search
+
+# Refuse selections larger than this in one request.
+MAX_SELECTION = 200000
+
+_SOFT_DELETE_SQL = text("""
+UPDATE transactions
+SET is_deleted = true, deleted_at = :now
+WHERE id = ANY(CAST(:ids AS bigint[]))
+  AND NOT is_deleted
+RETURNING id
+""")
+
+
+def _filter_query(spec: dict):
+    query = db.session.query(Transaction.id).filter(Transaction.is_deleted == False)
+    criteria = 0
+    try:
+        if spec.get("account_id"):
+            query = query.filter(Transaction.account_id == int(spec["account_id"]))
+            criteria += 1
+        if spec.get("start"):
+            query = query.filter(Transaction.txn_date >= date.fromisoformat(spec["start"]))
+            criteria += 1
+        if spec.get("end"):
+            query = query.filter(Transaction.txn_date <= date.fromisoformat(spec["end"]))
+            criteria += 1
+        if spec.get("min_amount") not in (None, ""):
+            query = query.filter(Transaction.amount_cents >= to_cents(spec["min_amount"]))
+            criteria += 1
+        if spec.get("max_amount") not in (None, ""):
+            query = query.filter(Transaction.amount_cents <= to_cents(spec["max_amount"]))
+            criteria += 1
+    except (TypeError, ValueError, ArithmeticError) as e:
+        # ArithmeticError: to_cents("inf") / to_cents("1e400") overflow
+        raise ValueError(f"Invalid filter: {e}")
+    q = (spec.get("q") or "").strip()
+    if q:
+        query = query.filter(search.text_filter(q))
+        criteria += 1
+    if spec.get("uncategorized"):
+        query = query.filter(Transaction.category_id.is_(None))
+    if not criteria:
+        raise ValueError("A filter needs at least an account, a date, an amount or search text.")
+    return query
+
+
+def select_ids(ids: Optional[list] = None, filter_spec: Optional[dict] = None) -> list[int]:
+    """Live transaction ids for explicit ids or a filter (exactly one of them)."""
+    if (ids is None) == (filter_spec is None):
+        raise ValueError("Give either 'ids' or 'filter'.")
+    if ids is not None:
+        try:
+            wanted = sorted({int(i) for i in ids})
+        except (TypeError, ValueError, ArithmeticError):
+            raise ValueError("ids must be a list of transaction ids.")
+        if len(wanted) > MAX_SELECTION:
+            raise ValueError(f"The selection is larger than {MAX_SELECTION} transactions; narrow it down.")
+        # One array parameter, not one bind parameter per id.
+        query = db.session.query(Transaction.id).filter(
+            Transaction.id == any_(bindparam("ids", wanted, type_=ARRAY(BigInteger))),
+            Transaction.is_deleted == False,
+        )
+    else:
+        if not isinstance(filter_spec, dict):
+            raise ValueError("filter must be an object.")
+        query = _filter_query(filter_spec)
+    selected = [i for (i,) in query.order_by(Transaction.id).limit(MAX_SELECTION + 1)]
+    if len(selected) > MAX_SELECTION:
+        raise ValueError(f"The selection is larger than {MAX_SELECTION} transactions; narrow it down.")
+    return selected
+
+
+def _parse_operations(ops: dict) -> dict:
+    if not isinstance(ops, dict):
+        raise ValueError("'set' must be an object.")
+    values = {}
+    for field, value in ops.items():
+        if field == "category_id":
+            try:
+                values[field] = None if value in (None, "") else int(value)
+            except (TypeError, ValueError):
+                raise ValueError("category_id must be an id or null.")
+        elif field in bulk_apply.FIELDS:
+            if not isinstance(value, bool):
+                raise ValueError(f"{field} must be true or false.")
+            values[field] = value
+        else:
+            raise ValueError(f"Cannot set {field!r}.")
+    return values
+
+
+def edit(
+    ids: Optional[list] = None,
+    filter_spec: Optional[dict] = None,
+    operations: Optional[dict] = None,
+    delete: bool = False,
+    dry_run: bool = False,
+) -> dict:
+    """
+    Apply operations (field -> value for category_id, is_transfer, is_refund,
+    is_joint) and/or a soft delete to the selection. Returns a summary:
+    matched, updated (rows changed per field), deleted, statements. With
+    dry_run only the selection is resolved.
+    """
+    values = _parse_operations(operations or {})
+    if not values and not delete:
+        raise ValueError("Nothing to do: give 'set' and/or 'delete'.")
+    selected = select_ids(ids, filter_spec)
+    summary = {"matched": len(selected), "updated": {}, "deleted": 0, "statements": 0, "dry_run": dry_run}
+    if dry_run or not selected:
+        return summary
+
+    if values:
+        counts = bulk_apply.apply_to_ids(selected, values)
+        summary["statements"] += counts.pop("statements")
+        summary["updated"] = {field: n for field, n in counts.items() if field in values}
+    if delete:
+        deleted = [row.id for row in db.session.execute(_SOFT_DELETE_SQL, {"ids": selected, "now": datetime.utcnow()})]
+        aggregates.retired(deleted)
+        summary["deleted"] = len(deleted)
+        summary["statements"] += 1
+    return summary
@@ -1,220 +1,511 @@
 # app/services/importer.py
 import io
 import pandas as pd
+from bisect import bisect_left, bisect_right
 from datetime import timedelta, date
-from copy import deepcopy
-import re # Import the regular expression module
 
-from ..extensions import db
-from ..models import Import, Transaction
-from ..utils import parse_date, to_cents
+from sqlalchemy import text, func, any_, bindparam, BigInteger
+from sqlalchemy.dialects.postgresql import ARRAY
+
+from ..extensions import db, staging
+from ..models import Import, Transaction, ImportStagedRow
 from .archive import sha256_of_bytes
+from .bulk import copy_rows
+from .normalize import normalize_frame
+from . import rule_engine
 
 SECONDARY_DUP_WINDOW_DAYS = 10
 TRANSFER_WINDOW_DAYS = 2
 
+# Rows per pd.read_csv chunk for streaming imports, and how many parse errors
+# are kept in log_json (all of them are counted).
+STREAMING_CHUNK_ROWS = 50_000
+MAX_REPORTED_PARSE_ERRORS = 1000
 
-def _json_safe_review(r):
-    """Convert any date objects to ISO strings so JSONB can store them; keep new_index on transfers."""
-    def fix_txn(d):
-        d = dict(d)
-        if isinstance(d.get("txn_date"), (date,)):
-            d["txn_date"] = d["txn_date"].isoformat()
-        return d
-
-    out = deepcopy(r)
-    out["to_insert"] = [fix_txn(x) for x in r.get("to_insert", [])]
-    out["dup_exact"] = [
-        {"new": fix_txn(p["new"]), "existing_id": p["existing_id"]}
-        for p in r.get("dup_exact", [])
-    ]
-    out["dup_secondary"] = [
-        {"new": fix_txn(p["new"]), "existing_id": p["existing_id"]}
-        for p in r.get("dup_secondary", [])
-    ]
-    # Preserve new_index here
-    out["transfer_candidates"] = [
-        {"new_index": p["new_index"], "new": fix_txn(p["new"]), "existing_id": p["existing_id"]}
-        for p in r.get("transfer_candidates", [])
-    ]
-    return out
-
-# --- START MODIFICATION ---
-def _clean_amount(value):
-    """Helper function to remove currency symbols, commas, and handle NaN."""
-    if pd.isna(value):
-        return 0.0
-    if isinstance(value, str):
-        # Remove any character that is not a digit, a decimal point, or a minus sign
-        cleaned_value = re.sub(r'[^\d.-]', '', value)
-        return cleaned_value if cleaned_value else 0.0
-    return value
-# --- END MODIFICATION ---
 
 def _normalize_frame(df: pd.DataFrame, schema: dict):
-    date_col = schema["date_col"]
-    date_fmt = schema.get("date_fmt")
-    desc_col = schema["desc_col"]
-
-    indicator_col = schema.get("indicator_col")
-    amount_col = schema.get("amount_col")
-    debit_col = schema.get("debit_col")
-    credit_col = schema.get("credit_col")
-    balance_col = schema.get("balance_col")
-    exclude_pending = schema.get("exclude_pending", False)
-
-    rows = []
-    for _, row in df.iterrows():
-        raw_date = str(row[date_col])
-        raw_desc = str(row[desc_col])
-
-        # --- START MODIFICATION ---
-        try:
-            if amount_col:
-                amount = float(_clean_amount(row.get(amount_col)))
-                if indicator_col and row.get(indicator_col) not in (None, ""):
-                    ind = str(row[indicator_col]).strip().lower()
-                    if ind.startswith("credit") or ind in {"cr", "c", "credit memo"}:
-                        amount = +abs(amount)
-                    elif ind.startswith("debit") or ind in {"dr", "d", "debit memo"}:
-                        amount = -abs(amount)
-            else:
-                debit = float(_clean_amount(row.get(debit_col)))
-                credit = float(_clean_amount(row.get(credit_col)))
-                amount = credit - debit
-
-            run_bal = float(_clean_amount(row.get(balance_col))) if balance_col else None
-        except (ValueError, TypeError) as e:
-            # Skip rows that have unparsable amount fields
-            print(f"Skipping row due to amount parsing error: {e}, row: {row}")
-            continue
-        # --- END MODIFICATION ---
-
-        rows.append({
-            "txn_date": parse_date(raw_date, date_fmt),
-            "description_raw": raw_desc,
-            "merchant_normalized": None,
-            "amount_cents": to_cents(amount),
-            "running_balance_cents": None if run_bal is None else to_cents(run_bal),
-        })
+    """Normalized rows only; unparsable rows are dropped (used for the mapping preview)."""
+    rows, _errors = normalize_frame(df, schema)
     return rows
 
 
-def _find_exact_dupe(account_id, txn):
-    return (
-        db.session.query(Transaction.id)
-        .filter(
-            Transaction.account_id == account_id,
-            Transaction.is_deleted == False,
-            Transaction.txn_date == txn["txn_date"],
-            Transaction.description_raw == txn["description_raw"],
-            Transaction.amount_cents == txn["amount_cents"],
-        )
-        .first()
-    )
+# Classify every incoming row against the account's live transactions in one
+# round-trip: rows are shipped as parallel arrays and unnested server-side, then
+# joined to candidates with the same amount inside the secondary window. An
+# exact match (same date and description) is a subset of that join, so both
+# verdicts come out of a single GROUP BY.
+_DEDUP_SQL = text("""
+WITH incoming AS (
+    SELECT i.txn_date, i.description_raw, i.amount_cents, i.ord
+    FROM unnest(
+        CAST(:dates AS date[]),
+        CAST(:descs AS text[]),
+        CAST(:amounts AS bigint[])
+    ) WITH ORDINALITY AS i(txn_date, description_raw, amount_cents, ord)
+),
+existing AS (
+    SELECT t.id, t.txn_date, t.description_raw, t.amount_cents
+    FROM transactions t
+    WHERE t.account_id = :account_id
+      AND t.is_deleted = false
+      AND t.txn_date BETWEEN :lo AND :hi
+      AND t.amount_cents = ANY(CAST(:amounts AS bigint[]))
+)
+SELECT
+    i.ord,
+    min(e.id) FILTER (
+        WHERE e.txn_date = i.txn_date AND e.description_raw = i.description_raw
+    ) AS exact_id,
+    min(e.id) AS secondary_id
+FROM incoming i
+JOIN existing e
+  ON e.amount_cents = i.amount_cents
+ AND e.txn_date BETWEEN i.txn_date - :window AND i.txn_date + :window
+GROUP BY i.ord
+""")
 
 
 def detect_duplicates(account_id: int, normalized_rows: list[dict]):
-    # (This function remains the same)
+    """
+    Split normalized rows into (to_insert, dup_exact, dup_secondary) by
+    comparing them with the account's live transactions; dup_exact /
+    dup_secondary hold (row, existing_id) pairs. Repeats within the file are
+    flagged later, over the whole staged import (_MARK_IN_FILE_DUPS_SQL).
+    """
     dup_exact = []
     dup_secondary = []
     to_insert = []
 
-    for row in normalized_rows:
-        ex = _find_exact_dupe(account_id, row)
-        if ex:
-            dup_exact.append((row, ex))
-            continue
+    if not normalized_rows:
+        return to_insert, dup_exact, dup_secondary
 
-        q = (
-            db.session.query(Transaction.id)
-            .filter(
-                Transaction.account_id == account_id,
-                Transaction.is_deleted == False,
-                Transaction.amount_cents == row["amount_cents"],
-                Transaction.txn_date >= row["txn_date"] - timedelta(days=SECONDARY_DUP_WINDOW_DAYS),
-                Transaction.txn_date <= row["txn_date"] + timedelta(days=SECONDARY_DUP_WINDOW_DAYS),
-            )
-        )
-        sec = q.first()
-        if sec:
-            dup_secondary.append((row, sec))
-            continue
+    dates = [r["txn_date"] for r in normalized_rows]
+    window = timedelta(days=SECONDARY_DUP_WINDOW_DAYS)
+    result = db.session.execute(_DEDUP_SQL, {
+        "dates": dates,
+        "descs": [r["description_raw"] for r in normalized_rows],
+        "amounts": [r["amount_cents"] for r in normalized_rows],
+        "account_id": account_id,
+        "lo": min(dates) - window,
+        "hi": max(dates) + window,
+        "window": SECONDARY_DUP_WINDOW_DAYS,
+    })
+    # ordinality is 1-based
+    matches = {m.ord - 1: (m.exact_id, m.secondary_id) for m in result}
 
-        to_insert.append(row)
+    for idx, row in enumerate(normalized_rows):
+        exact_id, secondary_id = matches.get(idx, (None, None))
+        if exact_id is not None:
+            dup_exact.append((row, exact_id))
+        elif secondary_id is not None:
+            dup_secondary.append((row, secondary_id))
+        else:
+            to_insert.append(row)
 
     return to_insert, dup_exact, dup_secondary
 
 
-def detect_transfers(candidate_rows: list[dict], account_id: int):
-    # (This function remains the same)
-    transfers = []
-    for idx, it in enumerate(candidate_rows):
-        amt = it["amount_cents"]
-        if amt >= 0:
+def _transfer_index(account_id: int, lo: date, hi: date, amounts: list[int]):
+    """
+    One query for every live, positive transaction in *other* accounts between
+    lo and hi whose amount could offset an incoming debit. Returns
+    {amount_cents: (sorted dates, ids in the same order)} for bisecting.
+    """
+    rows = (
+        db.session.query(Transaction.id, Transaction.txn_date, Transaction.amount_cents)
+        .filter(
+            Transaction.account_id != account_id,
+            Transaction.is_deleted == False,
+            Transaction.amount_cents > 0,
+            Transaction.txn_date >= lo,
+            Transaction.txn_date <= hi,
+            Transaction.amount_cents == any_(bindparam("amounts", amounts, type_=ARRAY(BigInteger))),
+        )
+        .order_by(Transaction.amount_cents, Transaction.txn_date, Transaction.id)
+        .all()
+    )
+    index = {}
+    for r in rows:
+        dates, ids = index.setdefault(r.amount_cents, ([], []))
+        dates.append(r.txn_date)
+        ids.append(r.id)
+    return index
+
+
+def _pair_transfers(debits, index, window_days: int, taken_ids: set):
+    """
+    Greedy closest-date pairing of (idx, txn_date, amount_cents) debits with
+    the counterparts in a _transfer_index. Each debit and each counterpart is
+    used at most once; ties go to the earlier debit, then the lower id.
+    Counterparts already in taken_ids are skipped and new ones are added to
+    it. Returns [(idx, existing_id)] ordered by idx.
+    """
+    window = timedelta(days=window_days)
+    pairs = []
+    for idx, d, amount in debits:
+        found = index.get(-amount)
+        if not found:
+            continue
+        cand_dates, cand_ids = found
+        lo = bisect_left(cand_dates, d - window)
+        hi = bisect_right(cand_dates, d + window)
+        for pos in range(lo, hi):
+            pairs.append((abs((cand_dates[pos] - d).days), idx, cand_ids[pos]))
+
+    pairs.sort()
+    taken_rows = set()
+    matched = []
+    for _, idx, existing_id in pairs:
+        if idx in taken_rows or existing_id in taken_ids:
             continue
-        lo = it["txn_date"] - timedelta(days=TRANSFER_WINDOW_DAYS)
-        hi = it["txn_date"] + timedelta(days=TRANSFER_WINDOW_DAYS)
-        match = (
-            Transaction.query
-            .filter(
-                Transaction.account_id != account_id,
-                Transaction.is_deleted == False,
-                Transaction.txn_date >= lo,
-                Transaction.txn_date <= hi,
-                Transaction.amount_cents == -amt,
-            )
-            .first()
+        taken_rows.add(idx)
+        taken_ids.add(existing_id)
+        matched.append((idx, existing_id))
+
+    matched.sort()
+    return matched
+
+
+def detect_transfers(candidate_rows: list[dict], account_id: int, taken_ids: set | None = None):
+    """
+    Pair each outgoing row with an opposite-amount transaction in another
+    account within +/-TRANSFER_WINDOW_DAYS. Counterparts are fetched in a
+    single query and matched in memory by _pair_transfers; each counterpart
+    is used at most once, the closest date wins and ties go to the earlier
+    row / lower id.
+
+    taken_ids, if given, holds counterparts already claimed (e.g. by earlier
+    chunks of a streaming import) and is updated in place.
+    """
+    debits = [
+        (idx, it["txn_date"], it["amount_cents"])
+        for idx, it in enumerate(candidate_rows) if it["amount_cents"] < 0
+    ]
+    if not debits:
+        return []
+
+    window = timedelta(days=TRANSFER_WINDOW_DAYS)
+    dates = [d for _, d, _ in debits]
+    index = _transfer_index(
+        account_id,
+        min(dates) - window,
+        max(dates) + window,
+        sorted({-amount for _, _, amount in debits}),
+    )
+    taken_ids = taken_ids if taken_ids is not None else set()
+    return [
+        {"new_index": idx, "new": candidate_rows[idx], "existing_id": existing_id}
+        for idx, existing_id in _pair_transfers(debits, index, TRANSFER_WINDOW_DAYS, taken_ids)
+    ]
+
+
+STAGED_ROW_COLUMNS = (
+    "import_id",
+    "position",
+    "txn_date",
+    "description_raw",
+    "merchant_normalized",
+    "amount_cents",
+    "running_balance_cents",
+    "status",
+    "existing_id",
+    "dup_of_position",
+    "transfer_existing_id",
+    "is_transfer",
+    "category_id",
+    "is_refund",
+    "explain_json",
+    "accepted",
+)
+
+# Repeats within the file (across chunk boundaries too): every non-exact row
+# after the first with the same (date, description, amount) becomes a
+# secondary duplicate of that first row. Identical rows are usually genuine
+# (two coffees on one day), so a repeat is accepted -- inserted unless the
+# user unticks it -- unless it also looks like a ledger row already.
+_MARK_IN_FILE_DUPS_SQL = text("""
+UPDATE import_staged_rows AS s
+SET status = 'dup_secondary',
+    dup_of_position = r.first_position,
+    transfer_existing_id = NULL,
+    accepted = (s.status = 'insert')
+FROM (
+    SELECT id,
+           first_value(position) OVER w AS first_position,
+           row_number() OVER w AS rn
+    FROM import_staged_rows
+    WHERE import_id = :import_id AND status <> 'dup_exact'
+    WINDOW w AS (PARTITION BY txn_date, description_raw, amount_cents ORDER BY position)
+) r
+WHERE s.id = r.id AND r.rn > 1
+""")
+
+
+def _staged(import_id, row, status, classifier, existing_id=None, transfer_existing_id=None):
+    return {
+        "import_id": import_id,
+        "position": row["position"],
+        "txn_date": row["txn_date"],
+        "description_raw": row["description_raw"],
+        "merchant_normalized": row.get("merchant_normalized"),
+        "amount_cents": row["amount_cents"],
+        "running_balance_cents": row.get("running_balance_cents"),
+        "status": status,
+        "existing_id": existing_id,
+        "dup_of_position": None,
+        "transfer_existing_id": transfer_existing_id,
+        "accepted": False,
+        **classifier.classify(row["description_raw"]),
+    }
+
+
+def _stage_chunk(import_id: int, account_id: int, rows: list[dict], taken_ids: set) -> None:
+    """
+    Dedup/transfer-check one chunk of normalized rows, classify each row with
+    the keyword tables (category, transfer and refund flags) and COPY the
+    chunk into import_staged_rows.
+    """
+    classifier = rule_engine.get_classifier()
+    to_insert, dup_exact, dup_secondary = detect_duplicates(account_id, rows)
+    transfers = {
+        t["new_index"]: t["existing_id"]
+        for t in detect_transfers(to_insert, account_id, taken_ids=taken_ids)
+    }
+
+    staged = [
+        _staged(import_id, row, "insert", classifier, transfer_existing_id=transfers.get(i))
+        for i, row in enumerate(to_insert)
+    ]
+    staged += [_staged(import_id, row, "dup_exact", classifier, existing_id=e) for row, e in dup_exact]
+    staged += [_staged(import_id, row, "dup_secondary", classifier, existing_id=e) for row, e in dup_secondary]
+    copy_rows(ImportStagedRow.__tablename__, STAGED_ROW_COLUMNS, staged)
+
+
+def staged_counts(import_id: int) -> dict:
+    """
+    Row counts per status for a staged import, plus how many new rows are
+    transfer candidates or were categorized / flagged by the keyword tables,
+    how many transfer candidates / secondary duplicates are accepted and how
+    many secondary duplicates repeat an earlier row of the file.
+    """
+    counts = {
+        "insert": 0, "dup_exact": 0, "dup_secondary": 0, "transfer_candidates": 0,
+        "categorized": 0, "transfer_keywords": 0, "refunds": 0,
+        "accepted_transfers": 0, "accepted_duplicates": 0, "in_file_repeats": 0,
+    }
+    q = (
+        db.session.query(
+            ImportStagedRow.status,
+            func.count(ImportStagedRow.id),
+            func.count(ImportStagedRow.transfer_existing_id),
+            func.count(ImportStagedRow.category_id),
+            func.count(ImportStagedRow.id).filter(ImportStagedRow.is_transfer),
+            func.count(ImportStagedRow.id).filter(ImportStagedRow.is_refund),
+            func.count(ImportStagedRow.id).filter(ImportStagedRow.accepted),
+            func.count(ImportStagedRow.dup_of_position),
         )
-        if match:
-            transfers.append({"new_index": idx, "new": it, "existing_id": match.id})
-    return transfers
+        .filter(ImportStagedRow.import_id == import_id)
+        .group_by(ImportStagedRow.status)
+    )
+    for status, n, n_transfers, n_categorized, n_transfer_kw, n_refunds, n_accepted, n_repeats in q:
+        counts[status] = n
+        if status == "insert":
+            counts["transfer_candidates"] = n_transfers
+            counts["categorized"] = n_categorized
+            counts["transfer_keywords"] = n_transfer_kw
+            counts["refunds"] = n_refunds
+            counts["accepted_transfers"] = n_accepted
+        elif status == "dup_secondary":
+            counts["accepted_duplicates"] = n_accepted
+            counts["in_file_repeats"] = n_repeats
+    return counts
 
 
-def run_import(user, file_storage, institution, account, mapper, app_config):
-    # (This function remains the same)
-    raw = file_storage.read()
-    sha = sha256_of_bytes(raw)
-    data = pd.read_csv(io.BytesIO(raw))
-    normalized = _normalize_frame(data, mapper.schema_json)
+# section_idx numbers the rows of each review section in file order, for
+# paging. Review decisions are saved per row by position (see
+# record_decision).
+_STAGED_REVIEW_SQL = text("""
+SELECT * FROM (
+    SELECT s.*,
+           row_number() OVER (PARTITION BY s.status ORDER BY s.position) - 1 AS section_idx
+    FROM import_staged_rows s
+    WHERE s.import_id = :import_id
+      AND (s.status IN ('dup_exact', 'dup_secondary') OR s.transfer_existing_id IS NOT NULL)
+) x
+WHERE x.section_idx >= :offset AND x.section_idx < :offset + :limit
+ORDER BY x.position
+""")
+
+
+def staged_review(import_id: int, limit: int = 500, offset: int = 0) -> dict:
+    """
+    One page of review lists for an import (dup_exact / dup_secondary /
+    transfer_candidates): rows offset to offset + limit of each section, in
+    file order, each with its position and saved decision.
+    """
+    out = {"dup_exact": [], "dup_secondary": [], "transfer_candidates": []}
+    params = {"import_id": import_id, "limit": limit, "offset": offset}
+    for r in db.session.execute(_STAGED_REVIEW_SQL, params).mappings():
+        new = {
+            "txn_date": r["txn_date"],
+            "description_raw": r["description_raw"],
+            "merchant_normalized": r["merchant_normalized"],
+            "amount_cents": r["amount_cents"],
+            "running_balance_cents": r["running_balance_cents"],
+        }
+        if r["dup_of_position"] is not None:
+            new["dup_of_index"] = r["dup_of_position"]
+        section = "transfer_candidates" if r["status"] == "insert" else r["status"]
+        existing_id = r["transfer_existing_id"] if r["status"] == "insert" else r["existing_id"]
+        out[section].append({
+            "position": r["position"], "new": new, "existing_id": existing_id, "accepted": r["accepted"],
+        })
+    return out
+
+
+# A decision only applies to rows that are up for one: transfer candidates
+# among the new rows, and secondary duplicates.
+_RECORD_DECISION_SQL = text("""
+UPDATE import_staged_rows
+SET accepted = :accepted
+WHERE import_id = :import_id
+  AND position = :position
+  AND (status = 'dup_secondary' OR (status = 'insert' AND transfer_existing_id IS NOT NULL))
+""")
+
+
+def record_decision(import_id: int, position: int, accepted: bool) -> bool:
+    """
+    Save the review decision for one staged row (accept a transfer candidate,
+    or import a secondary duplicate anyway). Returns False if the row does
+    not exist or has no decision to make. Does not commit.
+    """
+    result = db.session.execute(
+        _RECORD_DECISION_SQL, {"import_id": import_id, "position": position, "accepted": accepted}
+    )
+    return result.rowcount == 1
+
 
-    to_insert, dup_exact, dup_secondary = detect_duplicates(account.id, normalized)
-    transfer_candidates = detect_transfers(to_insert, account.id)
+def _stream_size(stream):
+    try:
+        pos = stream.tell()
+        stream.seek(0, io.SEEK_END)
+        size = stream.tell()
+        stream.seek(pos)
+        return size
+    except (AttributeError, OSError, ValueError):
+        return None
+
+
+def _prepare_import(institution, account, mapper, sha, filename):
+    """Find or create the partial Import for this upload and clear any rows staged by an earlier parse."""
+    imp = Import.query.filter_by(original_sha256=sha, account_id=account.id).first()
+    if imp is None:
+        imp = Import(
+            institution_id=institution.id,
+            account_id=account.id,
+            original_filename=filename,
+            original_sha256=sha,
+            status="partial",
+        )
+        db.session.add(imp)
+    imp.mapper_id = mapper.id
+    db.session.flush()
+    ImportStagedRow.query.filter_by(import_id=imp.id).delete(synchronize_session=False)
+    return imp
+
+
+def _finish_import(imp, row_count, parse_errors, error_count):
+    """
+    Flag in-file repeats, store the compact review summary on the Import,
+    pin its staged upload until commit and commit.
+    """
+    db.session.execute(_MARK_IN_FILE_DUPS_SQL, {"import_id": imp.id})
+    counts = staged_counts(imp.id)
 
     review = {
-            "to_insert": to_insert,
-            "dup_exact": [{"new": n, "existing_id": e.id} for (n, e) in dup_exact],
-            "dup_secondary": [{"new": n, "existing_id": e.id} for (n, e) in dup_secondary],
-            "transfer_candidates": transfer_candidates,
-            "row_count": len(normalized),
-            "parse_errors": [],
+        "staged": True,
+        "row_count": row_count,
+        "counts": counts,
+        "parse_errors": parse_errors[:MAX_REPORTED_PARSE_ERRORS],
+        "parse_error_count": error_count,
     }
-
-    existing = Import.query.filter_by(original_sha256=sha, account_id=account.id).first()
-    if existing:
-        existing.mapper_id = mapper.id
-        existing.log_json = {"review": _json_safe_review(review)}
-        existing.row_count = len(normalized)
-        existing.added_count = 0
-        existing.duplicate_count = len(dup_exact) + len(dup_secondary)
-        existing.error_count = 0
-        existing.status = "partial"
+    imp.log_json = {"review": review}
+    imp.row_count = row_count
+    imp.added_count = 0
+    # In-file repeats are accepted by default and so are not counted here.
+    imp.duplicate_count = counts["dup_exact"] + counts["dup_secondary"] - counts["accepted_duplicates"]
+    imp.error_count = error_count
+    imp.status = "partial"
+    holder = f"import-{imp.id}"
+    staging.pin(imp.original_sha256, holder)
+    try:
         db.session.commit()
-        return existing, raw, review
-
-    imp = Import(
-        institution_id=institution.id,
-        account_id=account.id,
-        mapper_id=mapper.id,
-        original_filename=file_storage.filename,
-        original_sha256=sha,
-        status="partial",
-        log_json={"review": _json_safe_review(review)},
-        row_count=len(normalized),
-        added_count=0,
-        duplicate_count=len(dup_exact) + len(dup_secondary),
-        error_count=0,
-    )
-    db.session.add(imp)
-    db.session.commit()
-    return imp, raw, review
\ No newline at end of file
+    except Exception:
+        staging.discard(imp.original_sha256, holder)
+        raise
+    return review
+
+
+def _run_import_streaming(file_storage, institution, account, mapper, app_config):
+    """
+    Import a large upload without holding it in memory: the upload is copied
+    into the staging store while being hashed, then read back in
+    IMPORT_CHUNK_ROWS-sized chunks that are normalized, deduplicated and
+    written to import_staged_rows one at a time. Peak memory is bounded by
+    the chunk size, not the file size.
+    """
+    file_storage.stream.seek(0)
+    sha, _size = staging.put_stream(file_storage.stream)
+    imp = _prepare_import(institution, account, mapper, sha, file_storage.filename)
+
+    chunk_rows = int(app_config.get("IMPORT_CHUNK_ROWS") or STREAMING_CHUNK_ROWS)
+    parse_errors = []
+    error_count = 0
+    row_count = 0
+    taken_ids = set()
+
+    f = staging.open(sha)
+    if f is None:
+        raise RuntimeError("Staged upload disappeared before it could be parsed.")
+    with f:
+        for chunk in pd.read_csv(f, chunksize=chunk_rows):
+            rows, errors = normalize_frame(chunk, mapper.schema_json)
+            error_count += len(errors)
+            parse_errors.extend(errors[: max(0, MAX_REPORTED_PARSE_ERRORS - len(parse_errors))])
+            for i, row in enumerate(rows):
+                row["position"] = row_count + i
+            _stage_chunk(imp.id, account.id, rows, taken_ids)
+            row_count += len(rows)
+
+    review = _finish_import(imp, row_count, parse_errors, error_count)
+    return imp, None, review
+
+
+def run_import(user, file_storage, institution, account, mapper, app_config):
+    """
+    Stage the upload, then parse, dedup and transfer-check it into
+    import_staged_rows and record it as a partial Import whose log_json only
+    holds a summary. The upload is staged before anything is written to the
+    database, so a refused upload (ValueError) leaves no Import behind.
+    Returns (imp, raw_bytes, review); raw_bytes is None for streaming imports.
+    """
+    stream = getattr(file_storage, "stream", None)
+    threshold = app_config.get("IMPORT_STREAMING_THRESHOLD_BYTES")
+    if stream is not None and threshold is not None:
+        size = _stream_size(stream)
+        if size is not None and size >= threshold:
+            return _run_import_streaming(file_storage, institution, account, mapper, app_config)
+
+    raw = file_storage.read()
+    sha = sha256_of_bytes(raw)
+    staging.put(raw, sha=sha)
+    data = pd.read_csv(io.BytesIO(raw))
+    normalized, parse_errors = normalize_frame(data, mapper.schema_json)
+    for i, row in enumerate(normalized):
+        row["position"] = i
+
+    imp = _prepare_import(institution, account, mapper, sha, file_storage.filename)
+    _stage_chunk(imp.id, account.id, normalized, set())
+    review = _finish_import(imp, len(normalized), parse_errors, len(parse_errors))
+    return imp, raw, review
@@ -0,0 +1,79 @@
+# app/services/jobs.py
+"""
+Minimal background jobs for long admin actions (e.g. re-applying rules).
+
+Each job runs in a daemon thread with its own app context and DB session, and
+reports progress into an in-memory registry. The registry is per process, so
+job status is only visible from the worker that started it, and is lost on
+restart; anything a job writes is committed by the job itself as it goes.
+"""
+import threading
+import traceback
+import uuid
+from datetime import datetime
+from typing import Callable, Optional
+
+from ..extensions import db
+
+MAX_KEPT_JOBS = 20
+
+_lock = threading.Lock()
+_jobs: dict[str, dict] = {}
+
+
+def _update(job_id: str, **fields) -> None:
+    with _lock:
+        _jobs[job_id].update(fields)
+
+
+def _run(app, job_id: str, fn: Callable, kwargs: dict) -> None:
+    with app.app_context():
+        try:
+            result = fn(progress=lambda p: _update(job_id, progress=dict(p)), **kwargs)
+            _update(job_id, status="done", result=result, finished_at=datetime.utcnow())
+        except Exception as e:
+            db.session.rollback()
+            app.logger.error("Job %s (%s) failed:\n%s", job_id, _jobs[job_id]["name"], traceback.format_exc())
+            _update(job_id, status="failed", error=str(e), finished_at=datetime.utcnow())
+        finally:
+            db.session.remove()
+
+
+def start(app, name: str, fn: Callable, **kwargs) -> str:
+    """
+    Run fn(progress=callback, **kwargs) in a background thread and return the
+    job id. fn reports progress by calling callback with a dict; its return
+    value becomes the job's result.
+    """
+    job_id = uuid.uuid4().hex[:12]
+    with _lock:
+        _jobs[job_id] = {
+            "id": job_id,
+            "name": name,
+            "status": "running",
+            "params": kwargs,
+            "progress": {},
+            "result": None,
+            "error": None,
+            "started_at": datetime.utcnow(),
+            "finished_at": None,
+        }
+        for old in sorted(_jobs.values(), key=lambda j: j["started_at"])[:-MAX_KEPT_JOBS]:
+            if old["status"] != "running":
+                del _jobs[old["id"]]
+    threading.Thread(target=_run, args=(app, job_id, fn, kwargs), name=f"job-{name}-{job_id}", daemon=True).start()
+    return job_id
+
+
+def get(job_id: str) -> Optional[dict]:
+    with _lock:
+        job = _jobs.get(job_id)
+        return dict(job) if job else None
+
+
+def recent(name: Optional[str] = None, limit: int = 10) -> list[dict]:
+    """Most recent jobs first, optionally only those called `name`."""
+    with _lock:
+        jobs = [dict(j) for j in _jobs.values() if name is None or j["name"] == name]
+    jobs.sort(key=lambda j: j["started_at"], reverse=True)
+    return jobs[:limit]
@@ -0,0 +1,144 @@
+# app/services/llm_cache.py
+"""
+Persistent cache of LLM category suggestions.
+
+Descriptions of the same merchant ("SPOTIFY USA 1234", "SPOTIFY USA 5678")
+share a fingerprint, the merchant_normalized key. Answers are stored per
+(fingerprint, hash of the category names offered, model), so renaming,
+adding or removing a category, or switching models, can never serve a stale
+answer; purge_stale() then drops the rows that can no longer hit.
+
+Usage: plan = CachePlan(items, category_names, model); send plan.to_send to
+the model; suggestions = plan.merge(answers). Within one plan every
+fingerprint is sent at most once and the answer is copied to its repeats.
+"""
+import hashlib
+from datetime import datetime
+from typing import Iterable
+
+from sqlalchemy import text, func
+
+from ..extensions import db
+from ..models import LlmSuggestionCache
+from .merchant import normalize_merchant
+
+
+
+def fingerprint(description: str) -> str:
+    """The normalized merchant, or the upper-cased description when nothing survives normalization."""
+    return normalize_merchant(description) or (description or "").strip().upper()
+
+
+def categories_hash(category_names: Iterable[str]) -> str:
+    return hashlib.sha256("\n".join(sorted(category_names)).encode()).hexdigest()[:32]
+
+
+_LOOKUP_SQL = text("""
+UPDATE llm_suggestion_cache
+SET hits = hits + 1, last_hit_at = :now
+WHERE categories_hash = :categories_hash
+  AND model = :model
+  AND fingerprint = ANY(CAST(:fingerprints AS text[]))
+RETURNING fingerprint, category_name, reason
+""")
+
+_STORE_SQL = text("""
+INSERT INTO llm_suggestion_cache (fingerprint, categories_hash, model, category_name, reason, hits, created_at)
+SELECT f, :categories_hash, :model, c, r, 0, :now
+FROM unnest(CAST(:fingerprints AS text[]), CAST(:category_names AS text[]), CAST(:reasons AS text[])) AS v(f, c, r)
+ON CONFLICT ON CONSTRAINT uq_llm_suggestion_cache_key
+DO UPDATE SET category_name = EXCLUDED.category_name, reason = EXCLUDED.reason, created_at = EXCLUDED.created_at
+""")
+
+
+class CachePlan:
+    """Splits (id, description) pairs into cached answers and the descriptions still to send."""
+
+    def __init__(self, items: list[tuple[int, str]], category_names: Iterable[str], model: str):
+        self.category_names = set(category_names)
+        self.categories_hash = categories_hash(self.category_names)
+        self.model = model or ""
+
+        by_fingerprint: dict[str, list[int]] = {}
+        first_item: dict[str, tuple[int, str]] = {}
+        for txn_id, description in items:
+            fp = fingerprint(description)
+            by_fingerprint.setdefault(fp, []).append(txn_id)
+            first_item.setdefault(fp, (txn_id, description))
+
+        cached = {}
+        if by_fingerprint:
+            rows = db.session.execute(_LOOKUP_SQL, {
+                "categories_hash": self.categories_hash,
+                "model": self.model,
+                "fingerprints": list(by_fingerprint),
+                "now": datetime.utcnow(),
+            })
+            cached = {r.fingerprint: r for r in rows if r.category_name in self.category_names}
+
+        self.hits = []
+        for fp, row in cached.items():
+            for txn_id in by_fingerprint[fp]:
+                self.hits.append({"id": txn_id, "category_name": row.category_name, "reason": f"Cached: {row.reason or ''}".strip()})
+
+        self._ids_by_fingerprint = {fp: ids for fp, ids in by_fingerprint.items() if fp not in cached}
+        self._fingerprint_of = {first_item[fp][0]: fp for fp in self._ids_by_fingerprint}
+        self.to_send = [first_item[fp] for fp in self._ids_by_fingerprint]
+        self.stats = {
+            "cache_hits": len(self.hits),
+            "cache_misses": len(items) - len(self.hits),
+            "sent": len(self.to_send),
+            "hit_rate": round(len(self.hits) / len(items), 3) if items else None,
+        }
+
+    def merge(self, answers: list[dict]) -> list[dict]:
+        """
+        Store the model's answers for to_send and return every suggestion
+        (cached ones, the answers, and copies for repeated fingerprints) by id.
+        The caller commits.
+        """
+        suggestions = list(self.hits)
+        store = {}
+        for s in answers:
+            try:
+                fp = self._fingerprint_of.get(int(s.get("id")))
+            except (TypeError, ValueError, AttributeError):
+                continue
+            if fp is None or fp in store or s.get("category_name") not in self.category_names:
+                continue
+            store[fp] = s
+            for txn_id in self._ids_by_fingerprint[fp]:
+                suggestions.append({"id": txn_id, "category_name": s["category_name"], "reason": s.get("reason", "")})
+
+        if store:
+            db.session.execute(_STORE_SQL, {
+                "categories_hash": self.categories_hash,
+                "model": self.model,
+                "fingerprints": list(store),
+                "category_names": [s["category_name"] for s in store.values()],
+                "reasons": [s.get("reason") or "" for s in store.values()],
+                "now": datetime.utcnow(),
+            })
+        suggestions.sort(key=lambda s: s["id"])
+        return suggestions
+
+
+def purge_stale(category_names: Iterable[str]) -> int:
+    """Delete answers given for a category list other than the current one. Returns rows removed."""
+    return LlmSuggestionCache.query.filter(
+        LlmSuggestionCache.categories_hash != categories_hash(category_names)
+    ).delete(synchronize_session=False)
+
+
+def cache_stats() -> dict:
+    """Entries, total hits and per-model totals for the whole cache."""
+    rows = db.session.query(
+        LlmSuggestionCache.model,
+        func.count(LlmSuggestionCache.id),
+        func.coalesce(func.sum(LlmSuggestionCache.hits), 0),
+    ).group_by(LlmSuggestionCache.model).all()
+    return {
+        "entries": sum(r[1] for r in rows),
+        "hits": int(sum(r[2] for r in rows)),
+        "by_model": {model: {"entries": n, "hits": int(hits)} for model, n, hits in rows},
+    }
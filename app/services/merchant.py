@@ -0,0 +1,139 @@
+# app/services/merchant.py
+"""
+Merchant normalization: description_raw -> merchant_normalized.
+
+"SQ *BLUE BOTTLE COFFEE 0412 OAKLAND CA" and "SQ *BLUE BOTTLE COFFEE 0977"
+both become "BLUE BOTTLE COFFEE", so rules, caches and reports can group on
+one indexed key instead of scanning descriptions with ILIKE.
+
+The rule set is a fixed list of compiled regexes applied in order to the
+upper-cased description. It strips processor prefixes, reference numbers,
+store ids, domains and the trailing location (the city after a store number
+or before a state, and the state). normalize_series() runs the same list column-wise
+with pandas (imports); normalize_merchant() runs it on one string with an
+LRU cache (manual entry, backfill). Both give identical results.
+"""
+import re
+from functools import lru_cache
+from typing import Callable, Optional
+
+import pandas as pd
+from sqlalchemy import text
+
+from ..extensions import db
+from ..models import Transaction
+
+# Payment processors / wallets that prefix the real merchant ("SQ *", "TST*", "PAYPAL *").
+_PROCESSORS = "SQ|SQU|TST|PAYPAL|PP|SP|PY|IC|FSP|SMK|ZSK|WPY|CKO|LS|DD|BT|EB|GOOGLE|APL|APPLE PAY|CLOVER"
+# The ones that are unambiguous enough to strip without the "*" ("SQ BLUE BOTTLE").
+_BARE_PROCESSORS = "SQ|SQU|TST"
+# How some banks introduce a card purchase.
+_ENTRY_PREFIXES = (
+    r"POS(?: PURCHASE| DEBIT)?|DEBIT CARD PURCHASE|DEBIT PURCHASE|CHECKCARD|CHECK CARD|CARD PURCHASE"
+    r"|PURCHASE AUTHORIZED ON \d{1,2}/\d{1,2}|PURCHASE|RECURRING PAYMENT|RECURRING"
+)
+_STATES = (
+    "AL|AK|AZ|AR|CA|CO|CT|DE|DC|FL|GA|HI|ID|IL|IN|IA|KS|KY|LA|ME|MD|MA|MI|MN|MS|MO|MT|NE|NV|NH|NJ"
+    "|NM|NY|NC|ND|OH|OK|OR|PA|RI|SC|SD|TN|TX|UT|VT|VA|WA|WV|WI|WY"
+)
+# A city is one word, or two when the first is a common city prefix ("SAN JOSE").
+_CITY = (
+    r"(?:(?:SAN|SANTA|LOS|LAS|NEW|FORT|FT|ST|SAINT|NORTH|SOUTH|EAST|WEST|PALM|PALO|EL|SALT|LONG|GRAND|MOUNT|MT)\s+)?"
+    r"[A-Z]+"
+)
+_DOMAIN = r"(?:WWW\.)?(?:[A-Z0-9-]+\.)*([A-Z0-9-]+)\.(?:COM|NET|ORG)\b(?:/\S*)?"
+# Stripped store numbers leave this marker so a city after them can go too;
+# the punctuation rule keeps it and it is blanked once the city rule ran.
+_MARK = "~"
+
+# (pattern, replacement), applied in this order to the upper-cased description.
+RULES: list[tuple[re.Pattern, str]] = [(re.compile(p), r) for p, r in [
+    (rf"^(?:{_ENTRY_PREFIXES})\s+", ""),
+    (rf"^(?:{_PROCESSORS})\s*\*\s*|^(?:{_BARE_PROCESSORS})\s+", ""),
+    (r"\bHTTPS?://", ""),
+    (rf"^{_DOMAIN}", r"\1 "),                            # "NETFLIX.COM" is the merchant ...
+    (rf"\s{_DOMAIN}", " "),                              # ... "HELP.UBER.COM" after it is not
+    (r"\*\S*", " "),                                     # "AMZN MKTP US*2K3AB1" reference tails
+    (r"(?:X{2,}|\*{2,})\s?\d{2,}|\bCARD\s?#?\s?\d{4}\b", " "),  # masked card numbers
+    (r"\b\d{1,2}/\d{1,2}(?:/\d{2,4})?\b|\b\d{4}-\d{2}-\d{2}\b", " "),  # dates
+    (r"\b\d{3}[-.]\d{3}[-.]\d{4}\b", " "),               # phone numbers
+    # store ids ("#123", "STORE 12", "T-1234"), refs, long numbers
+    (r"#\s?\d+|\bSTORE\s?\d+|\b[A-Z]{1,3}-\d{2,}\b|\b(?=[A-Z]*\d)[A-Z\d]{5,}\b|\b\d{3,}\b", f" {_MARK} "),
+    (rf"[^A-Z0-9&'{_MARK} ]+", " "),                     # punctuation
+    # city (and state) right after a store number
+    (rf"(?:\s*{_MARK})+(?:\s+{_CITY}(?:\s+(?:{_STATES}))?(?:\s+(?:USA|US))?)?\s*$", ""),
+    (_MARK, " "),
+    (r"\s+", " "),
+    (r"^ | $", ""),
+    # location suffix: city + state, a bare state, or US/USA
+    (rf"\s{_CITY}\s(?:{_STATES})(?:\s(?:USA|US))?$|(?:\s(?:{_STATES}))?\s(?:USA|US)$|\s(?:{_STATES})$", ""),
+]]
+
+
+def _clean(text_value: str) -> Optional[str]:
+    out = text_value.upper()
+    for pattern, repl in RULES:
+        out = pattern.sub(repl, out)
+    out = out.strip()
+    return out or None
+
+
+@lru_cache(maxsize=65536)
+def normalize_merchant(description: Optional[str]) -> Optional[str]:
+    """Normalized merchant for one description (None when nothing is left)."""
+    if not description:
+        return None
+    return _clean(description)
+
+
+def normalize_series(descriptions: pd.Series) -> pd.Series:
+    """Vectorized normalize_merchant over a column of descriptions."""
+    out = descriptions.fillna("").astype(str).str.upper()
+    for pattern, repl in RULES:
+        out = out.str.replace(pattern, repl, regex=True)
+    out = out.str.strip()
+    return out.where(out != "", None)
+
+
+_BACKFILL_SQL = text("""
+UPDATE transactions AS t
+SET merchant_normalized = v.merchant
+FROM unnest(CAST(:ids AS bigint[]), CAST(:merchants AS text[])) AS v(id, merchant)
+WHERE t.id = v.id
+  AND t.merchant_normalized IS DISTINCT FROM v.merchant
+""")
+
+
+def backfill(
+    only_missing: bool = True,
+    batch_size: int = 10000,
+    progress: Optional[Callable[[dict], None]] = None,
+) -> dict:
+    """
+    Recompute merchant_normalized for existing transactions in keyset batches
+    (id order), committing after each batch. only_missing skips rows that
+    already have a value.
+    """
+    totals = {"scanned": 0, "changed": 0, "last_id": 0}
+    base = db.session.query(Transaction.id, Transaction.description_raw, Transaction.merchant_normalized)
+    if only_missing:
+        base = base.filter(Transaction.merchant_normalized.is_(None))
+
+    while True:
+        batch = base.filter(Transaction.id > totals["last_id"]).order_by(Transaction.id).limit(batch_size).all()
+        if not batch:
+            break
+        merchants = normalize_series(pd.Series([t.description_raw for t in batch])).tolist()
+        changed = [(t.id, m) for t, m in zip(batch, merchants) if m != t.merchant_normalized]
+        if changed:
+            db.session.execute(_BACKFILL_SQL, {
+                "ids": [i for i, _ in changed],
+                "merchants": [m for _, m in changed],
+            })
+        db.session.commit()
+        totals["scanned"] += len(batch)
+        totals["changed"] += len(changed)
+        totals["last_id"] = batch[-1].id
+        if progress:
+            progress(totals)
+    return totals
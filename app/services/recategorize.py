@@ -0,0 +1,108 @@
+# app/services/recategorize.py
+"""
+Re-apply the Rule table to transactions already in the ledger.
+
+The ledger is scanned in keyset-paginated batches (id > last id seen), each
+batch is matched in memory with the compiled rule engine, and the rows whose
+category changes are written with one set-based UPDATE. Every batch is its
+own transaction, so a full run never holds locks for long and can be stopped
+at any point without losing the batches already done.
+
+Rows no rule matches are left alone; a rule never clears a category.
+"""
+from datetime import date
+from typing import Callable, Optional
+
+from sqlalchemy import text
+
+from ..extensions import db
+from ..models import Transaction
+from . import aggregates, rule_engine
+
+BATCH_SIZE = 5000
+
+_APPLY_SQL = text("""
+UPDATE transactions AS t
+SET category_id = v.category_id,
+    explain_json = coalesce(t.explain_json, '{}'::jsonb) || jsonb_build_object(
+        'rule', jsonb_build_object('id', v.rule_id, 'keyword', v.keyword, 'category_id', v.category_id)
+    )
+FROM unnest(
+    CAST(:ids AS bigint[]),
+    CAST(:category_ids AS int[]),
+    CAST(:rule_ids AS int[]),
+    CAST(:keywords AS text[])
+) AS v(id, category_id, rule_id, keyword)
+WHERE t.id = v.id
+  AND t.category_id IS DISTINCT FROM v.category_id
+""")
+
+
+def recategorize(
+    only_uncategorized: bool = False,
+    account_id: Optional[int] = None,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    dry_run: bool = False,
+    batch_size: int = BATCH_SIZE,
+    progress: Optional[Callable[[dict], None]] = None,
+) -> dict:
+    """
+    Apply the current rules to every live transaction in scope, committing
+    after each batch (nothing is written with dry_run). progress, if given,
+    is called after every batch with the running totals, which are also
+    returned: scanned, matched (a rule fired), changed (category differs).
+    """
+    engine = rule_engine.get_engine()
+    totals = {"scanned": 0, "matched": 0, "changed": 0, "batches": 0, "last_id": 0, "dry_run": dry_run}
+    if not len(engine):
+        return totals
+
+    base = db.session.query(Transaction.id, Transaction.description_raw, Transaction.category_id).filter(
+        Transaction.is_deleted == False,
+    )
+    if only_uncategorized:
+        base = base.filter(Transaction.category_id.is_(None))
+    if account_id is not None:
+        base = base.filter(Transaction.account_id == account_id)
+    if start is not None:
+        base = base.filter(Transaction.txn_date >= start)
+    if end is not None:
+        base = base.filter(Transaction.txn_date <= end)
+
+    while True:
+        batch = base.filter(Transaction.id > totals["last_id"]).order_by(Transaction.id).limit(batch_size).all()
+        if not batch:
+            break
+
+        changes = []
+        for t in batch:
+            match = engine.match(t.description_raw)
+            if match is None:
+                continue
+            totals["matched"] += 1
+            if match.category_id != t.category_id:
+                changes.append((t.id, match))
+
+        if changes and not dry_run:
+            ids = [i for i, _ in changes]
+            with aggregates.reclassifying(ids):
+                db.session.execute(_APPLY_SQL, {
+                    "ids": ids,
+                    "category_ids": [m.category_id for _, m in changes],
+                    "rule_ids": [m.rule_id for _, m in changes],
+                    "keywords": [m.keyword for _, m in changes],
+                })
+        if dry_run:
+            db.session.rollback()
+        else:
+            db.session.commit()
+
+        totals["scanned"] += len(batch)
+        totals["changed"] += len(changes)
+        totals["batches"] += 1
+        totals["last_id"] = batch[-1].id
+        if progress:
+            progress(totals)
+
+    return totals
@@ -0,0 +1,98 @@
+# app/services/refunds.py
+"""
+Refund pair finder.
+
+A refund is a credit that mirrors an earlier debit of the same amount in the
+same account within REFUND_WINDOW_DAYS. All candidates (live, not yet a
+refund or transfer) are read in one query ordered by (account, |amount|,
+date), and each (account, |amount|) group is matched in a single sweep: a
+credit takes the most recent unused debit on or before its date that is
+still inside the window, so every debit is paired at most once and the
+closest one wins.
+"""
+from datetime import timedelta
+from itertools import groupby
+from typing import Iterable, Optional
+
+from sqlalchemy import func, select
+
+from ..extensions import db
+from ..models import Category, Transaction
+from . import bulk_apply
+
+REFUND_WINDOW_DAYS = 60
+
+
+def find_refund_pairs(account_id: Optional[int] = None, window_days: int = REFUND_WINDOW_DAYS) -> list[dict]:
+    """
+    Candidate (original debit, refund credit) pairs for one account, or every
+    account when account_id is None, newest refund first.
+    """
+    stmt = (
+        select(Transaction.id, Transaction.account_id, Transaction.txn_date, Transaction.amount_cents)
+        .where(
+            Transaction.is_deleted == False,
+            Transaction.is_refund == False,
+            Transaction.is_transfer == False,
+            Transaction.amount_cents != 0,
+        )
+        # Within a group debits sort before credits on the same day, so a
+        # same-day refund can pair with its purchase.
+        .order_by(
+            Transaction.account_id,
+            func.abs(Transaction.amount_cents),
+            Transaction.txn_date,
+            Transaction.amount_cents,
+            Transaction.id,
+        )
+    )
+    if account_id is not None:
+        stmt = stmt.where(Transaction.account_id == account_id)
+
+    rows = db.session.execute(stmt.execution_options(yield_per=50000))
+    pairs = _sweep_refund_pairs(rows, window_days)
+    pairs.sort(key=lambda p: (p["refund_date"], p["refund_id"]), reverse=True)
+    return pairs
+
+
+def _sweep_refund_pairs(rows: Iterable[tuple], window_days: int = REFUND_WINDOW_DAYS) -> list[dict]:
+    """
+    The in-memory half of find_refund_pairs: (id, account_id, txn_date,
+    amount_cents) rows ordered by (account, |amount|, date, amount, id) in,
+    pairs out in the order their refunds were seen. Each credit takes the
+    newest unused debit at most window_days older; each debit is used once.
+    """
+    window = timedelta(days=window_days)
+    pairs = []
+    for (acct_id, _), group in groupby(rows, key=lambda r: (r[1], abs(r[3]))):
+        open_debits = []  # (txn_date, id), oldest at the bottom
+        for txn_id, _, txn_date, amount_cents in group:
+            if amount_cents < 0:
+                open_debits.append((txn_date, txn_id))
+                continue
+            if open_debits and txn_date - open_debits[-1][0] > window:
+                open_debits.clear()  # the newest one is out of the window, so all are
+            if open_debits:
+                original_date, original_id = open_debits.pop()
+                pairs.append({
+                    "original_id": original_id,
+                    "refund_id": txn_id,
+                    "account_id": acct_id,
+                    "days": (txn_date - original_date).days,
+                    "refund_date": txn_date.isoformat(),
+                })
+    return pairs
+
+
+def refund_category() -> Optional[Category]:
+    return Category.query.filter_by(name="Refund").first()
+
+
+def apply_refund_pairs(pairs: Iterable[tuple[int, int]], category_id: int) -> int:
+    """
+    Mark both sides of each (original_id, refund_id) pair as refunds in the
+    given category (see bulk_apply). Returns transactions changed; the caller commits.
+    """
+    ids = sorted({i for pair in pairs for i in pair})
+    counts = bulk_apply.apply_changes({"id": i, "is_refund": True, "category_id": category_id} for i in ids)
+    return max(counts["is_refund"], counts["category_id"])
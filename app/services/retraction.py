@@ -0,0 +1,69 @@
+# app/services/retraction.py
+"""
+Retract (soft-delete) every transaction an import added, and undo it.
+
+Both directions are one UPDATE ... RETURNING id keyed on import_id, with the
+returned ids handed to aggregates.retired() / published(); nothing is loaded
+into the session. The search indexes (trigram GIN, generated search_tsv)
+follow the rows on their own.
+
+A retraction stamps all its rows with the same deleted_at and records it in
+the import's log_json, so un-retracting restores exactly those rows and not
+ones deleted individually before. Rows a later import revived belong to that
+import by then and are left alone.
+
+Functions do not commit; the caller commits.
+"""
+from datetime import datetime
+
+from sqlalchemy import text
+
+from ..extensions import db
+from ..models import Import
+from . import aggregates
+
+_RETRACT_SQL = text("""
+UPDATE transactions
+SET is_deleted = true, deleted_at = :now
+WHERE import_id = :import_id AND NOT is_deleted
+RETURNING id
+""")
+
+# Imports retracted before the stamp was recorded restore every deleted row.
+_RESTORE_SQL = text("""
+UPDATE transactions
+SET is_deleted = false, deleted_at = NULL
+WHERE import_id = :import_id
+  AND is_deleted
+  AND (CAST(:retracted_at AS timestamp) IS NULL OR deleted_at = :retracted_at)
+RETURNING id
+""")
+
+
+def retract_import(imp: Import) -> int:
+    """Soft-delete the import's live transactions. Returns how many."""
+    now = datetime.utcnow()
+    ids = [row.id for row in db.session.execute(_RETRACT_SQL, {"import_id": imp.id, "now": now})]
+    aggregates.retired(ids)
+    log = dict(imp.log_json or {})
+    if imp.status != "retracted":
+        log["status_before_retraction"] = imp.status
+    log["retracted_at"] = now.isoformat()
+    imp.log_json = log
+    imp.status = "retracted"
+    return len(ids)
+
+
+def restore_import(imp: Import) -> int:
+    """Undo retract_import(): bring the retracted transactions back. Returns how many."""
+    log = dict(imp.log_json or {})
+    retracted_at = log.pop("retracted_at", None)
+    ids = [row.id for row in db.session.execute(_RESTORE_SQL, {
+        "import_id": imp.id,
+        "retracted_at": datetime.fromisoformat(retracted_at) if retracted_at else None,
+    })]
+    aggregates.published(ids)
+    imp.status = log.pop("status_before_retraction", None) or "success"
+    log["restored_at"] = datetime.utcnow().isoformat()
+    imp.log_json = log
+    return len(ids)
@@ -4,45 +4,37 @@ from __future__ import annotations
 import os
 import gzip
 import hashlib
-from datetime import date, datetime
-from typing import Any, Dict, List
+import shutil
+from datetime import datetime
+from typing import Any, BinaryIO, Dict
 
-from dateutil import parser as dtp
+from sqlalchemy import text
 
 from ..extensions import db
-from ..models import Import, Transaction
+from ..models import Import, ImportStagedRow
+from . import aggregates
 
 
 # ----- helpers ---------------------------------------------------------------
 
-def _ensure_date(d: Any) -> date:
-    """Accept datetime.date already, or parse ISO/string to date."""
-    if isinstance(d, date):
-        return d
-    return dtp.parse(str(d)).date()
-
-
-def _safe_int(x: Any, default: int = 0) -> int:
-    try:
-        return int(x)
-    except Exception:
-        return default
-
-
 def _archive_csv(
-    raw_bytes: bytes,
+    raw_bytes: bytes | BinaryIO,
     archive_dir: str,
     institution_name: str,
     account_name: str,
     original_filename: str,
+    sha256: str | None = None,
 ) -> str:
     """
     Gzip the raw CSV into archive_dir/<institution>/<account>/YYYY/MM/<timestamp>_<sha8>_<filename>.gz
     Returns the *relative* archive path (useful to store in DB and to move roots later).
+    raw_bytes may also be an open binary file (streaming imports); it is
+    copied in chunks and sha256 must then be given.
     """
     now = datetime.utcnow()
     y, m = now.strftime("%Y"), now.strftime("%m")
-    sha8 = hashlib.sha256(raw_bytes).hexdigest()[:8]
+    is_file = hasattr(raw_bytes, "read")
+    sha8 = (sha256 if is_file else hashlib.sha256(raw_bytes).hexdigest())[:8]
 
     # Build dirs and filename
     rel_dir = os.path.join(institution_name, account_name, y, m)
@@ -55,113 +47,155 @@ def _archive_csv(
 
     # Write gzip
     with gzip.open(abs_path, "wb") as f:
-        f.write(raw_bytes)
+        if is_file:
+            shutil.copyfileobj(raw_bytes, f, 1024 * 1024)
+        else:
+            f.write(raw_bytes)
 
     return rel_path
 
 
-def _revive_if_deleted(imp: Import, rows: List[Dict[str, Any]]) -> int:
+# ----- promotion from import_staged_rows -------------------------------------
+
+# Pick the rows to commit: every new row, plus the secondary duplicates the
+# review accepted. Accepted transfer candidates and rows already flagged by a
+# TransferKeyword at parse time become transfers.
+_CHOOSE_STAGED_SQL = text("""
+WITH chosen AS (
+    UPDATE import_staged_rows
+    SET outcome = 'insert',
+        is_transfer = is_transfer OR (status = 'insert' AND accepted)
+    WHERE import_id = :import_id
+      AND (status = 'insert' OR (status = 'dup_secondary' AND accepted))
+    RETURNING status, accepted
+)
+SELECT count(*) FILTER (WHERE status = 'insert' AND accepted) AS transfers,
+       count(*) FILTER (WHERE status = 'dup_secondary') AS duplicates
+FROM chosen
+""")
+
+# Un-delete soft-deleted rows that exactly match chosen staged rows. Both
+# sides are numbered within each (date, description, amount) key so N
+# identical incoming rows revive at most N deleted ones; revived staged rows
+# are flagged so they are not inserted again.
+_REVIVE_STAGED_SQL = text("""
+WITH incoming AS (
+    SELECT id AS staged_id, txn_date, description_raw, amount_cents,
+           row_number() OVER (
+               PARTITION BY txn_date, description_raw, amount_cents ORDER BY position
+           ) AS rn
+    FROM import_staged_rows
+    WHERE import_id = :import_id AND outcome = 'insert'
+),
+deleted AS (
+    SELECT t.id, t.txn_date, t.description_raw, t.amount_cents,
+           row_number() OVER (
+               PARTITION BY t.txn_date, t.description_raw, t.amount_cents ORDER BY t.id
+           ) AS rn
+    FROM transactions t
+    WHERE t.account_id = :account_id
+      AND t.is_deleted = true
+      AND (t.txn_date, t.description_raw, t.amount_cents) IN (
+          SELECT txn_date, description_raw, amount_cents FROM incoming
+      )
+),
+revived AS (
+    UPDATE transactions AS t
+    SET is_deleted = false,
+        deleted_at = NULL,
+        import_id = :import_id
+    FROM deleted d
+    JOIN incoming i
+      ON i.txn_date = d.txn_date
+     AND i.description_raw = d.description_raw
+     AND i.amount_cents = d.amount_cents
+     AND i.rn = d.rn
+    WHERE t.id = d.id
+    RETURNING i.staged_id, t.id AS transaction_id
+)
+UPDATE import_staged_rows AS s
+SET outcome = 'revived'
+FROM revived r
+WHERE s.id = r.staged_id
+RETURNING r.transaction_id
+""")
+
+# The staged rows were COPYed in at parse time (bulk.copy_rows); promoting
+# them is a single INSERT ... SELECT. Inserted rows are fed straight into the
+# derived aggregates in the same statement (see aggregates.publishing), so
+# nothing is read back into Python.
+_PROMOTE_STAGED_SQL = text(aggregates.publishing(f"""
+INSERT INTO transactions (
+    account_id, import_id, txn_date, description_raw, merchant_normalized,
+    amount_cents, running_balance_cents, is_transfer, transfer_group,
+    category_id, explain_json, created_at, is_deleted, is_refund, is_joint
+)
+SELECT :account_id, s.import_id, s.txn_date, s.description_raw, s.merchant_normalized,
+       s.amount_cents, s.running_balance_cents, s.is_transfer,
+       CASE WHEN s.is_transfer
+            THEN 'imp' || s.import_id || '-' || s.amount_cents || '-' || to_char(s.txn_date, 'YYYY-MM-DD')
+       END,
+       s.category_id, s.explain_json, :now, false, s.is_refund, false
+FROM import_staged_rows s
+WHERE s.import_id = :import_id AND s.outcome = 'insert'
+ORDER BY s.position
+RETURNING {aggregates.CHANGED_COLUMNS}
+"""))
+
+
+def _promote_staged_rows(imp: Import, decisions: Dict[str, Any]) -> tuple[int, int, dict]:
     """
-    For each row in rows, if a *soft-deleted* exact match exists, un-delete it and
-    drop that row from the list so we don't insert a duplicate. Returns count revived.
-    Matching rule: same account_id, txn_date, description_raw, amount_cents.
+    Promote an import's chosen staged rows into transactions server-side.
+    Returns (inserted, revived, {"transfers": n, "secondary_duplicates": n}
+    accepted in review).
     """
+    params = {"import_id": imp.id, "account_id": imp.account_id}
+    chosen = db.session.execute(_CHOOSE_STAGED_SQL, params).one()
+    accepted = {"transfers": chosen.transfers, "secondary_duplicates": chosen.duplicates}
+
     revived = 0
-    # iterate a copy so we can remove from original list
-    for row in list(rows):
-        t = (
-            db.session.query(Transaction)
-            .filter(
-                Transaction.account_id == imp.account_id,
-                Transaction.is_deleted == True,  # previously soft-deleted
-                Transaction.txn_date == _ensure_date(row["txn_date"]),
-                Transaction.description_raw == row["description_raw"],
-                Transaction.amount_cents == _safe_int(row["amount_cents"]),
-            )
-            .first()
-        )
-        if t:
-            t.is_deleted = False
-            t.deleted_at = None
-            # provenance: link revived row to this import
-            t.import_id = imp.id
-            db.session.add(t)
-            rows.remove(row)
-            revived += 1
-    return revived
+    if decisions.get("revive_deleted"):
+        revived_ids = db.session.execute(_REVIVE_STAGED_SQL, params).scalars().all()
+        aggregates.published(revived_ids)
+        revived = len(revived_ids)
 
+    aggregates.ensure_snapshots([imp.account_id])
+    inserted = db.session.execute(
+        _PROMOTE_STAGED_SQL, dict(params, now=datetime.utcnow(), fresh=[])
+    ).scalar()
+
+    # The staged rows were scratch space for the review; they are in the ledger now.
+    ImportStagedRow.query.filter_by(import_id=imp.id).delete(synchronize_session=False)
+    return inserted, revived, accepted
 
-# ----- main entrypoint -------------------------------------------------------
 
 # ----- main entrypoint -------------------------------------------------------
 
 def commit_import(
     imp: Import,
-    raw_bytes: bytes,
+    raw_bytes: bytes | BinaryIO,
     archive_dir: str,
     institution_name: str,
     account_name: str,
     decisions: Dict[str, Any],
 ) -> None:
     """
-    Finalize an import:
-      - handle user decisions on secondary duplicates.
-      - optionally revive soft-deleted matches.
+    Finalize an import from its rows in import_staged_rows:
+      - insert the secondary duplicates accepted in review (the decisions
+        are saved on the staged rows as they are made).
       - mark accepted transfers as is_transfer=True.
-      - insert remaining rows.
+      - keep the category / transfer / refund flags the keyword tables
+        assigned at parse time (recorded in explain_json).
+      - if decisions["revive_deleted"], revive soft-deleted matches (one
+        UPDATE for all rows).
+      - insert the remaining rows with a single INSERT ... SELECT.
       - gzip/archive the original CSV.
       - update Import counters/status/log.
     """
     review = imp.log_json.get("review", {}) if imp.log_json else {}
-    to_insert: List[Dict[str, Any]] = list(review.get("to_insert", []))
-    row_count = int(review.get("row_count") or len(to_insert) or 0)
-
-
-    # --- MODIFICATION START ---
-    # Handle user-approved secondary duplicates
-    approved_dup_indices = set(decisions.get("accepted_secondary_duplicates") or [])
-    if approved_dup_indices:
-        secondary_duplicates = list(review.get("dup_secondary", []))
-        for idx in approved_dup_indices:
-            # Check index is valid
-            if 0 <= idx < len(secondary_duplicates):
-                # Add the 'new' transaction from the duplicate pair to our insert list
-                to_insert.append(secondary_duplicates[idx]["new"])
-    # Optional: revive previously soft-deleted duplicates instead of inserting
-    revived = 0
-    if decisions.get("revive_deleted"):
-        revived = _revive_if_deleted(imp, to_insert)
-
-    # Mark accepted transfers by index (indices refer to positions in to_insert)
-    accepted = set(decisions.get("accepted_transfers") or [])
-    for i, row in enumerate(to_insert):
-        if i in accepted:
-            row["is_transfer"] = True
-            # Optional grouping token to correlate both sides of the transfer
-            row["transfer_group"] = f"imp{imp.id}-{_safe_int(row.get('amount_cents'),0)}-{str(_ensure_date(row['txn_date']))}"
-
-    # Insert remaining rows
-    inserted = 0
-    for row in to_insert:
-        t = Transaction(
-            account_id=imp.account_id,
-            import_id=imp.id,
-            txn_date=_ensure_date(row["txn_date"]),
-            description_raw=row["description_raw"],
-            merchant_normalized=row.get("merchant_normalized"),
-            amount_cents=_safe_int(row["amount_cents"]),
-            running_balance_cents=(
-                None
-                if row.get("running_balance_cents") in (None, "")
-                else _safe_int(row["running_balance_cents"])
-            ),
-            is_transfer=bool(row.get("is_transfer", False)),
-            is_joint=bool(row.get("is_joint", False)),
-            transfer_group=row.get("transfer_group"),
-            explain_json=row.get("explain_json"),
-        )
-        db.session.add(t)
-        inserted += 1
+    row_count = int(review.get("row_count") or 0)
+
+    inserted, revived, accepted = _promote_staged_rows(imp, decisions)
 
     # Write archive (gzip) and store relative path
     archived_rel_path = _archive_csv(
@@ -170,11 +204,12 @@ def commit_import(
         institution_name=institution_name or "UnknownInstitution",
         account_name=account_name or "UnknownAccount",
         original_filename=imp.original_filename or "upload.csv",
+        sha256=imp.original_sha256,
     )
 
     # Update Import row
     duplicate_count = int(imp.duplicate_count or 0)
-    error_count = 0
+    error_count = int(review.get("parse_error_count", len(review.get("parse_errors") or [])))
 
     imp.archived_path = archived_rel_path
     imp.added_count = inserted + revived
@@ -189,7 +224,9 @@ def commit_import(
         "revived": revived,
         "row_count": row_count,
         "duplicate_count_at_parse": duplicate_count,
-        "accepted_transfers": sorted(list(accepted)),
+        "parse_error_count": error_count,
+        "accepted_transfers": accepted["transfers"],
+        "accepted_secondary_duplicates": accepted["secondary_duplicates"],
     }
     imp.log_json = log
 
@@ -0,0 +1,78 @@
+# app/services/review_queue.py
+"""
+Server-side store for batches awaiting review.
+
+AI suggestions and refund pairs used to ride in the signed-cookie session,
+which caps a batch at whatever fits in ~4 KB. A batch now lives in one
+review_queues row (a JSONB list) and only its id goes in the session or URL.
+Review pages show it PAGE_SIZE items at a time; applying a page removes
+those items, and the row is deleted once it is empty or after
+REVIEW_QUEUE_TTL_SECONDS.
+
+Functions flush but do not commit; the caller commits.
+"""
+import math
+from datetime import datetime, timedelta
+from typing import Callable, Iterable, Optional
+
+from flask import current_app
+
+from ..extensions import db
+from ..models import ReviewQueue
+
+SUGGESTIONS = "suggestions"
+REFUND_PAIRS = "refund_pairs"
+
+# Items per review page.
+PAGE_SIZE = 100
+
+
+def purge_expired() -> int:
+    """Delete queues past their TTL. Returns rows removed."""
+    return ReviewQueue.query.filter(ReviewQueue.expires_at < datetime.utcnow()).delete(synchronize_session=False)
+
+
+def create(kind: str, items: list[dict]) -> ReviewQueue:
+    """Store a new batch (and drop expired ones while we are here)."""
+    purge_expired()
+    now = datetime.utcnow()
+    queue = ReviewQueue(
+        kind=kind,
+        items=list(items),
+        created_at=now,
+        expires_at=now + timedelta(seconds=current_app.config["REVIEW_QUEUE_TTL_SECONDS"]),
+    )
+    db.session.add(queue)
+    db.session.flush()
+    return queue
+
+
+def load(queue_id, kind: str) -> Optional[ReviewQueue]:
+    """The queue with this id and kind, or None when it is missing, expired or of another kind."""
+    try:
+        queue = db.session.get(ReviewQueue, int(queue_id))
+    except (TypeError, ValueError):
+        return None
+    if queue is None or queue.kind != kind or queue.expires_at < datetime.utcnow():
+        return None
+    return queue
+
+
+def page(queue: ReviewQueue, number: int) -> tuple[list[dict], int, int]:
+    """(items on 0-based page `number`, the page actually shown, page count); out-of-range pages are clamped."""
+    page_count = max(1, math.ceil(len(queue.items) / PAGE_SIZE))
+    number = min(max(0, number), page_count - 1)
+    start = number * PAGE_SIZE
+    return queue.items[start:start + PAGE_SIZE], number, page_count
+
+
+def remove(queue: ReviewQueue, keys: Iterable, key: Callable[[dict], object]) -> int:
+    """Drop reviewed items (key(item) in keys); deletes the queue once it is empty. Returns items left."""
+    done = set(keys)
+    remaining = [item for item in queue.items if key(item) not in done]
+    if remaining:
+        queue.items = remaining
+    else:
+        db.session.delete(queue)
+    db.session.flush()
+    return len(remaining)
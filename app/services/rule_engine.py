@@ -0,0 +1,183 @@
+# app/services/rule_engine.py
+"""
+Keyword rules compiled into a single Aho-Corasick automaton.
+
+Matching is case-insensitive (both keywords and descriptions are upper-cased)
+and costs one pass over the description however many rules exist. When
+several keywords occur in a description the longest one wins, then the lowest
+rule id, so the result never depends on table order.
+
+The same matcher also drives the TransferKeyword / RefundKeyword flags, so an
+import can be classified in one pass per row (see Classifier). Compiled
+engines are cached per process and keyed by a version stamp of the three
+keyword tables; the admin rule routes also drop them explicitly via
+invalidate().
+"""
+import threading
+from typing import Iterable, NamedTuple, Optional
+
+from sqlalchemy import func
+
+from ..extensions import db
+from ..models import Rule, TransferKeyword, RefundKeyword
+
+
+class RuleMatch(NamedTuple):
+    rule_id: int
+    keyword: str
+    category_id: int
+
+
+class KeywordAutomaton:
+    """Aho-Corasick automaton that reports the best-ranked keyword found in a text."""
+
+    def __init__(self, keywords: Iterable[str], ranks: Iterable[int]):
+        goto: list[dict[str, int]] = [{}]
+        best: list[Optional[int]] = [None]
+
+        for keyword, rank in zip(keywords, ranks):
+            state = 0
+            for ch in keyword:
+                nxt = goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[state][ch] = nxt
+                    goto.append({})
+                    best.append(None)
+                state = nxt
+            if best[state] is None or rank < best[state]:
+                best[state] = rank
+
+        # Breadth-first pass for failure links; each state inherits the best
+        # rank reachable through its failure chain so matching never walks it.
+        fail = [0] * len(goto)
+        queue = list(goto[0].values())
+        for state in queue:
+            for ch, nxt in goto[state].items():
+                queue.append(nxt)
+                f = fail[state]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                fail[nxt] = goto[f].get(ch, 0)
+                inherited = best[fail[nxt]]
+                if inherited is not None and (best[nxt] is None or inherited < best[nxt]):
+                    best[nxt] = inherited
+
+        self._goto = goto
+        self._fail = fail
+        self._best = best
+
+    def best_rank(self, text: str) -> Optional[int]:
+        goto, fail, best = self._goto, self._fail, self._best
+        state = 0
+        found = None
+        for ch in text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            rank = best[state]
+            if rank is not None and (found is None or rank < found):
+                found = rank
+        return found
+
+
+class RuleEngine:
+    """Compiled view of a set of rules; see the module docstring for precedence."""
+
+    def __init__(self, rules: Iterable[tuple[int, str, int]]):
+        # Rank = position in precedence order, so "lower rank wins" is the whole rule.
+        ordered = sorted(
+            ((rule_id, keyword.upper(), category_id)
+             for rule_id, keyword, category_id in rules if keyword and keyword.strip()),
+            key=lambda r: (-len(r[1]), r[0]),
+        )
+        self._matches = [RuleMatch(rule_id, keyword, category_id) for rule_id, keyword, category_id in ordered]
+        self._automaton = KeywordAutomaton((m.keyword for m in self._matches), range(len(self._matches)))
+
+    def __len__(self):
+        return len(self._matches)
+
+    def match(self, description: Optional[str]) -> Optional[RuleMatch]:
+        if not description or not self._matches:
+            return None
+        rank = self._automaton.best_rank(description.upper())
+        return None if rank is None else self._matches[rank]
+
+    def match_many(self, descriptions: Iterable[Optional[str]]) -> list[Optional[RuleMatch]]:
+        return [self.match(d) for d in descriptions]
+
+
+class Classifier(NamedTuple):
+    """Rules plus the transfer/refund keyword lists, compiled together."""
+    rules: RuleEngine
+    transfers: RuleEngine
+    refunds: RuleEngine
+
+    def classify(self, description: Optional[str]) -> dict:
+        """
+        Category and flags for one description, shaped like the matching
+        Transaction columns; explain_json records which keywords fired and is
+        None when nothing matched.
+        """
+        rule = self.rules.match(description)
+        transfer = self.transfers.match(description)
+        refund = self.refunds.match(description)
+        explain = {}
+        if rule:
+            explain["rule"] = {"id": rule.rule_id, "keyword": rule.keyword, "category_id": rule.category_id}
+        if transfer:
+            explain["transfer_keyword"] = transfer.keyword
+        if refund:
+            explain["refund_keyword"] = refund.keyword
+        return {
+            "category_id": rule.category_id if rule else None,
+            "is_transfer": transfer is not None,
+            "is_refund": refund is not None,
+            "explain_json": explain or None,
+        }
+
+
+_lock = threading.Lock()
+_cached: Optional[tuple[tuple, Classifier]] = None
+
+
+def _version_stamp() -> tuple:
+    row = db.session.query(
+        db.session.query(func.count(Rule.id)).scalar_subquery(),
+        db.session.query(func.max(Rule.id)).scalar_subquery(),
+        db.session.query(func.max(Rule.updated_at)).scalar_subquery(),
+        db.session.query(func.count(TransferKeyword.id)).scalar_subquery(),
+        db.session.query(func.max(TransferKeyword.id)).scalar_subquery(),
+        db.session.query(func.count(RefundKeyword.id)).scalar_subquery(),
+        db.session.query(func.max(RefundKeyword.id)).scalar_subquery(),
+    ).one()
+    return tuple(row)
+
+
+def invalidate() -> None:
+    """Drops this process's compiled engines; the next lookup rebuilds them."""
+    global _cached
+    with _lock:
+        _cached = None
+
+
+def get_classifier() -> Classifier:
+    """Returns the compiled classifier for the current keyword tables, rebuilding it if they changed."""
+    global _cached
+    stamp = _version_stamp()
+    with _lock:
+        if _cached is not None and _cached[0] == stamp:
+            return _cached[1]
+    classifier = Classifier(
+        rules=RuleEngine(db.session.query(Rule.id, Rule.keyword, Rule.category_id).all()),
+        transfers=RuleEngine((k.id, k.keyword, None) for k in db.session.query(TransferKeyword.id, TransferKeyword.keyword)),
+        refunds=RuleEngine((k.id, k.keyword, None) for k in db.session.query(RefundKeyword.id, RefundKeyword.keyword)),
+    )
+    with _lock:
+        _cached = (stamp, classifier)
+    return classifier
+
+
+def get_engine() -> RuleEngine:
+    """Returns the compiled category rules for the current rules table."""
+    return get_classifier().rules
@@ -0,0 +1,172 @@
+# app/services/search.py
+"""
+Transaction search backed by pg_trgm.
+
+`flask setup-search` installs the pg_trgm extension and GIN trigram indexes
+on description_raw and merchant_normalized, which turn substring matches
+(ILIKE '%q%') into index scans. With --tsvector it also adds a generated
+search_tsv column for whole-word queries (mode="words").
+
+Fuzzy mode matches substrings and, with pg_trgm, also near misses: a
+description or merchant similar to the query (%), or containing a word
+similar to it (<%), so "STARBUKS" still finds STARBUCKS. Results are ranked
+by the best similarity / word similarity, then newest first. Until
+setup-search has installed pg_trgm they are plain ILIKE matches, newest
+first.
+"""
+from datetime import date
+from typing import Optional
+
+from sqlalchemy import or_, text
+
+from ..extensions import db
+from ..models import Transaction
+
+MAX_RESULTS = 200
+
+_SETUP_STATEMENTS = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX {concurrently} IF NOT EXISTS ix_transactions_description_trgm "
+    "ON transactions USING gin (description_raw gin_trgm_ops)",
+    "CREATE INDEX {concurrently} IF NOT EXISTS ix_transactions_merchant_trgm "
+    "ON transactions USING gin (merchant_normalized gin_trgm_ops)",
+]
+_TSVECTOR_STATEMENTS = [
+    "ALTER TABLE transactions ADD COLUMN IF NOT EXISTS search_tsv tsvector "
+    "GENERATED ALWAYS AS (to_tsvector('simple', description_raw || ' ' || coalesce(merchant_normalized, ''))) STORED",
+    "CREATE INDEX {concurrently} IF NOT EXISTS ix_transactions_search_tsv ON transactions USING gin (search_tsv)",
+]
+
+
+def setup_search(with_tsvector: bool = False, concurrently: bool = True) -> list[str]:
+    """
+    Create the extension, indexes (and optionally the tsvector column).
+    Idempotent. With concurrently=True the indexes are built without blocking
+    writes, which needs its own autocommit connection; pass False to run
+    inside the current session's transaction instead.
+    """
+    statements = _SETUP_STATEMENTS + (_TSVECTOR_STATEMENTS if with_tsvector else [])
+    statements = [s.format(concurrently="CONCURRENTLY" if concurrently else "") for s in statements]
+    if concurrently:
+        with db.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            for s in statements:
+                conn.execute(text(s))
+    else:
+        for s in statements:
+            db.session.execute(text(s))
+    return statements
+
+
+# Set once pg_trgm has been seen; a missing extension is looked up again so
+# running setup-search takes effect without a restart.
+_trgm_installed = False
+
+
+def has_trgm() -> bool:
+    global _trgm_installed
+    if not _trgm_installed:
+        _trgm_installed = bool(db.session.execute(
+            text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+        ).scalar())
+    return _trgm_installed
+
+
+def has_tsvector() -> bool:
+    return bool(db.session.execute(text("""
+        SELECT 1 FROM information_schema.columns
+        WHERE table_name = 'transactions' AND column_name = 'search_tsv'
+    """)).scalar())
+
+
+def _like_pattern(q: str) -> str:
+    escaped = q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def text_filter(q: str):
+    """SQLAlchemy condition: q occurs in the description or merchant (served by the trigram indexes)."""
+    pattern = _like_pattern(q)
+    return or_(
+        Transaction.description_raw.ilike(pattern, escape="\\"),
+        Transaction.merchant_normalized.ilike(pattern, escape="\\"),
+    )
+
+
+_SUBSTRING_MATCH = "(t.description_raw ILIKE :pattern OR t.merchant_normalized ILIKE :pattern)"
+# Every operator here is served by the gin_trgm_ops indexes.
+_FUZZY_MATCH = (
+    "(t.description_raw ILIKE :pattern OR t.merchant_normalized ILIKE :pattern"
+    " OR t.description_raw % :q OR t.merchant_normalized % :q"
+    " OR :q <% t.description_raw OR :q <% t.merchant_normalized)"
+)
+_FUZZY_SCORE = (
+    "greatest(similarity(t.description_raw, :q), similarity(coalesce(t.merchant_normalized, ''), :q),"
+    " word_similarity(:q, t.description_raw), word_similarity(:q, coalesce(t.merchant_normalized, '')))"
+)
+_UNRANKED_SCORE = "0"
+_WORDS_MATCH = "t.search_tsv @@ plainto_tsquery('simple', :q)"
+_WORDS_SCORE = "ts_rank(t.search_tsv, plainto_tsquery('simple', :q))"
+
+
+def search_transactions(
+    q: str,
+    account_ids: Optional[list[int]] = None,
+    min_cents: Optional[int] = None,
+    max_cents: Optional[int] = None,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    mode: str = "fuzzy",
+    limit: int = 50,
+    offset: int = 0,
+) -> list[dict]:
+    """
+    Live transactions matching q across all accounts (or account_ids),
+    best match first. Amount bounds are in cents and inclusive; mode "words"
+    needs the tsvector column from `flask setup-search --tsvector`. Without
+    pg_trgm, fuzzy mode only finds substrings, which all score 0 and come
+    newest first.
+    """
+    if mode == "words":
+        match, score = _WORDS_MATCH, _WORDS_SCORE
+    elif has_trgm():
+        match, score = _FUZZY_MATCH, _FUZZY_SCORE
+    else:
+        match, score = _SUBSTRING_MATCH, _UNRANKED_SCORE
+    where = ["NOT t.is_deleted", match]
+    params = {
+        "q": q,
+        "pattern": _like_pattern(q),
+        "limit": max(1, min(int(limit), MAX_RESULTS)),
+        "offset": max(0, int(offset)),
+    }
+    if account_ids:
+        where.append("t.account_id = ANY(CAST(:account_ids AS int[]))")
+        params["account_ids"] = list(account_ids)
+    if min_cents is not None:
+        where.append("t.amount_cents >= :min_cents")
+        params["min_cents"] = min_cents
+    if max_cents is not None:
+        where.append("t.amount_cents <= :max_cents")
+        params["max_cents"] = max_cents
+    if start is not None:
+        where.append("t.txn_date >= :start")
+        params["start"] = start
+    if end is not None:
+        where.append("t.txn_date <= :end")
+        params["end"] = end
+
+    sql = text(f"""
+        SELECT t.id, t.account_id, a.name AS account_name, t.txn_date, t.description_raw,
+               t.merchant_normalized, t.amount_cents, t.category_id, c.name AS category_name,
+               {score} AS score
+        FROM transactions t
+        JOIN accounts a ON a.id = t.account_id
+        LEFT JOIN categories c ON c.id = t.category_id
+        WHERE {' AND '.join(where)}
+        ORDER BY score DESC, t.txn_date DESC, t.id DESC
+        LIMIT :limit OFFSET :offset
+    """)
+    return [
+        dict(r, txn_date=r["txn_date"].isoformat(), score=round(float(r["score"] or 0), 4))
+        for r in db.session.execute(sql, params).mappings()
+    ]
@@ -0,0 +1,493 @@
+# app/services/staging.py
+"""
+Staging store for uploaded statements between upload, mapping wizard,
+review and commit.
+
+Uploads are stored once, keyed by their SHA-256, in a backend every worker
+process can see (by default a spool directory on local disk). Each process
+keeps a small in-memory LRU in front of it. Unpinned entries expire after a
+TTL and are trimmed oldest-first once the backend grows past a total byte
+budget; a single upload larger than that budget is refused.
+
+The same file can be uploaded for several imports (or wizard sessions), so
+each user of a blob pins it under a holder name ("import-<id>",
+"token-<uuid>"). Pinned blobs are never evicted, and discard() only
+deletes a blob once its last holder lets go. Wizard sessions are small JSON
+records keyed by a token that point at a staged upload.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import Counter, OrderedDict
+from typing import Any, BinaryIO, Dict, Iterable, Optional, Tuple
+
+_KEY_RE = re.compile(r"^[0-9a-zA-Z-]{1,64}$")
+
+
+def _check_key(key: str) -> str:
+    """Keys end up in file names; only allow hex digests / uuids."""
+    if not isinstance(key, str) or not _KEY_RE.match(key):
+        raise ValueError(f"Invalid staging key: {key!r}")
+    return key
+
+
+class StagingBackend(ABC):
+    """Interface for shared upload storage. Keys are SHA-256 hex digests."""
+
+    @abstractmethod
+    def put(self, key: str, data: bytes) -> None:
+        ...
+
+    @abstractmethod
+    def put_stream(self, fileobj: BinaryIO, chunk_size: int) -> Tuple[str, int]:
+        """Store a stream, hashing it on the way through; returns (key, size)."""
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[bytes]:
+        ...
+
+    @abstractmethod
+    def open(self, key: str) -> Optional[BinaryIO]:
+        """A readable binary file for a stored upload, or None."""
+
+    @abstractmethod
+    def exists(self, key: str) -> bool:
+        ...
+
+    @abstractmethod
+    def delete(self, key: str) -> bool:
+        ...
+
+    @abstractmethod
+    def add_ref(self, key: str, holder: str) -> None:
+        """Record that holder still needs the upload stored under key."""
+
+    @abstractmethod
+    def drop_ref(self, key: str, holder: str) -> int:
+        """Forget holder's claim on key; returns how many holders remain."""
+
+    @abstractmethod
+    def ref_keys(self) -> Iterable[str]:
+        """Keys that have at least one holder (stored or not)."""
+
+    @abstractmethod
+    def drop_refs(self, key: str) -> None:
+        """Forget every holder of key."""
+
+    @abstractmethod
+    def touch(self, key: str) -> None:
+        ...
+
+    @abstractmethod
+    def entries(self) -> Iterable[Tuple[str, int, float]]:
+        """(key, size in bytes, last-used timestamp) for every stored upload."""
+
+    @abstractmethod
+    def put_meta(self, token: str, meta: Dict[str, Any]) -> None:
+        ...
+
+    @abstractmethod
+    def get_meta(self, token: str) -> Optional[Tuple[Dict[str, Any], float]]:
+        """(meta, last-written timestamp) or None."""
+
+    @abstractmethod
+    def delete_meta(self, token: str) -> None:
+        ...
+
+    @abstractmethod
+    def meta_entries(self) -> Iterable[Tuple[str, float]]:
+        ...
+
+
+class SpoolBackend(StagingBackend):
+    """
+    One file per upload under <root>/blobs, one JSON file per wizard token
+    under <root>/tokens and one empty <key>.<holder> file per pin under
+    <root>/refs. Writes go through a temp file + rename so concurrent workers
+    never see partial uploads.
+    """
+
+    def __init__(self, root: str):
+        self.root = os.path.expanduser(root)
+        self.blob_dir = os.path.join(self.root, "blobs")
+        self.meta_dir = os.path.join(self.root, "tokens")
+        self.ref_dir = os.path.join(self.root, "refs")
+        os.makedirs(self.blob_dir, exist_ok=True)
+        os.makedirs(self.meta_dir, exist_ok=True)
+        os.makedirs(self.ref_dir, exist_ok=True)
+
+    def path_for(self, key: str) -> str:
+        return os.path.join(self.blob_dir, _check_key(key))
+
+    def _meta_path(self, token: str) -> str:
+        return os.path.join(self.meta_dir, _check_key(token) + ".json")
+
+    def _atomic_write(self, path: str, data: bytes) -> None:
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+
+    def put(self, key: str, data: bytes) -> None:
+        path = self.path_for(key)
+        if os.path.exists(path):
+            self.touch(key)
+            return
+        self._atomic_write(path, data)
+
+    def put_stream(self, fileobj, chunk_size):
+        h = hashlib.sha256()
+        size = 0
+        fd, tmp = tempfile.mkstemp(dir=self.blob_dir, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                while True:
+                    chunk = fileobj.read(chunk_size)
+                    if not chunk:
+                        break
+                    h.update(chunk)
+                    size += len(chunk)
+                    f.write(chunk)
+            key = h.hexdigest()
+            path = self.path_for(key)
+            if os.path.exists(path):
+                os.unlink(tmp)
+                self.touch(key)
+            else:
+                os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+        return key, size
+
+    def open(self, key):
+        try:
+            return open(self.path_for(key), "rb")
+        except FileNotFoundError:
+            return None
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            with open(self.path_for(key), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self.path_for(key))
+
+    def delete(self, key: str) -> bool:
+        try:
+            os.unlink(self.path_for(key))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def _ref_path(self, key: str, holder: str) -> str:
+        return os.path.join(self.ref_dir, f"{_check_key(key)}.{_check_key(holder)}")
+
+    def _refs(self, key: str) -> list:
+        prefix = _check_key(key) + "."
+        with os.scandir(self.ref_dir) as it:
+            return [e.path for e in it if e.name.startswith(prefix)]
+
+    def add_ref(self, key: str, holder: str) -> None:
+        with open(self._ref_path(key, holder), "ab"):
+            pass
+
+    def drop_ref(self, key: str, holder: str) -> int:
+        try:
+            os.unlink(self._ref_path(key, holder))
+        except FileNotFoundError:
+            pass
+        return len(self._refs(key))
+
+    def ref_keys(self):
+        with os.scandir(self.ref_dir) as it:
+            return {e.name.split(".", 1)[0] for e in it if not e.name.startswith(".")}
+
+    def drop_refs(self, key: str) -> None:
+        for path in self._refs(key):
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+
+    def touch(self, key: str) -> None:
+        try:
+            os.utime(self.path_for(key))
+        except FileNotFoundError:
+            pass
+
+    def entries(self):
+        out = []
+        with os.scandir(self.blob_dir) as it:
+            for e in it:
+                if e.name.startswith(".") or not e.is_file():
+                    continue
+                try:
+                    st = e.stat()
+                except FileNotFoundError:
+                    continue
+                out.append((e.name, st.st_size, st.st_mtime))
+        return out
+
+    def put_meta(self, token: str, meta: Dict[str, Any]) -> None:
+        self._atomic_write(self._meta_path(token), json.dumps(meta).encode("utf-8"))
+
+    def get_meta(self, token: str):
+        path = self._meta_path(token)
+        try:
+            with open(path, "rb") as f:
+                return json.loads(f.read().decode("utf-8")), os.fstat(f.fileno()).st_mtime
+        except FileNotFoundError:
+            return None
+
+    def delete_meta(self, token: str) -> None:
+        try:
+            os.unlink(self._meta_path(token))
+        except FileNotFoundError:
+            pass
+
+    def meta_entries(self):
+        out = []
+        with os.scandir(self.meta_dir) as it:
+            for e in it:
+                if e.name.endswith(".json") and not e.name.startswith("."):
+                    try:
+                        out.append((e.name[:-5], e.stat().st_mtime))
+                    except FileNotFoundError:
+                        continue
+        return out
+
+
+BACKENDS = {
+    "spool": SpoolBackend,
+}
+
+
+class UploadStaging:
+    """
+    Process-local LRU in front of a shared StagingBackend. Bind to the app
+    with init_app(), like the other extensions.
+    """
+
+    def __init__(self):
+        self.backend: Optional[StagingBackend] = None
+        self.ttl_seconds = 0
+        self.max_bytes = 0
+        self.memory_bytes = 0
+        self._lru: "OrderedDict[str, Tuple[bytes, float]]" = OrderedDict()
+        self._lru_size = 0
+        self._lock = threading.Lock()
+        self.stats = Counter()
+
+    def init_app(self, app) -> None:
+        cfg = app.config
+        backend_cls = BACKENDS[cfg.get("IMPORT_STAGING_BACKEND", "spool")]
+        self.backend = backend_cls(cfg["IMPORT_STAGING_DIR"])
+        self.ttl_seconds = int(cfg["IMPORT_STAGING_TTL_SECONDS"])
+        self.max_bytes = int(cfg["IMPORT_STAGING_MAX_BYTES"])
+        self.memory_bytes = int(cfg["IMPORT_STAGING_MEMORY_BYTES"])
+        app.extensions["upload_staging"] = self
+
+    # --- uploads -------------------------------------------------------------
+
+    def put(self, data: bytes, sha: Optional[str] = None) -> str:
+        """
+        Stage raw upload bytes; returns their SHA-256 (pass it if already
+        known). Raises ValueError if the upload alone exceeds max_bytes.
+        """
+        self._check_size(len(data))
+        sha = sha or hashlib.sha256(data).hexdigest()
+        self.backend.put(sha, data)
+        self._remember(sha, data)
+        self._count("puts")
+        self.evict(keep=sha)
+        return sha
+
+    def get(self, sha: str) -> Optional[bytes]:
+        """Raw bytes for a staged upload, or None if it expired or was never staged."""
+        now = time.time()
+        with self._lock:
+            cached = self._lru.get(sha)
+            if cached is not None:
+                data, stamp = cached
+                # Another worker may have committed and discarded it since.
+                if now - stamp <= self.ttl_seconds and self.backend.exists(sha):
+                    self._lru.move_to_end(sha)
+                    self.stats["hits"] += 1
+                    self.stats["memory_hits"] += 1
+                    return data
+                self._forget(sha)
+
+        data = self.backend.get(sha)
+        if data is None:
+            self._count("misses")
+            return None
+        self.backend.touch(sha)
+        self._remember(sha, data)
+        self._count("hits")
+        return data
+
+    def put_stream(self, fileobj: BinaryIO, chunk_size: int = 1024 * 1024) -> Tuple[str, int]:
+        """
+        Stage an upload without holding it in memory: it is copied to the
+        backend in chunks and hashed incrementally. Returns (sha256, size).
+        Raises ValueError if the upload alone exceeds max_bytes.
+        """
+        sha, size = self.backend.put_stream(fileobj, chunk_size)
+        try:
+            self._check_size(size)
+        except ValueError:
+            self.backend.delete(sha)
+            raise
+        self._count("puts")
+        self.evict(keep=sha)
+        return sha, size
+
+    def open(self, sha: str) -> Optional[BinaryIO]:
+        """Open a staged upload for streaming reads; the caller closes it."""
+        f = self.backend.open(sha)
+        if f is None:
+            self._count("misses")
+            return None
+        self.backend.touch(sha)
+        self._count("hits")
+        return f
+
+    def pin(self, sha: str, holder: str) -> None:
+        """Record that holder uses the upload, so other holders' discard() leaves it in place."""
+        self.backend.add_ref(sha, holder)
+
+    def discard(self, sha: str, holder: str) -> bool:
+        """Release holder's pin; the upload is deleted once nobody else holds it. Returns whether it was."""
+        if self.backend.drop_ref(sha, holder):
+            return False
+        with self._lock:
+            self._forget(sha)
+        return self.backend.delete(sha)
+
+    # --- wizard tokens -------------------------------------------------------
+
+    def put_token(self, token: str, meta: Dict[str, Any]) -> None:
+        self.backend.put_meta(token, meta)
+
+    def get_token(self, token: str) -> Optional[Dict[str, Any]]:
+        try:
+            found = self.backend.get_meta(token)
+        except ValueError:
+            found = None
+        if found is None or time.time() - found[1] > self.ttl_seconds:
+            self._count("misses")
+            return None
+        self._count("hits")
+        return found[0]
+
+    def pop_token(self, token: str) -> None:
+        self.backend.delete_meta(token)
+
+    # --- eviction ------------------------------------------------------------
+
+    def evict(self, keep: Optional[str] = None) -> int:
+        """
+        Drop expired tokens (releasing their pins) and expired uploads, then
+        the oldest uploads until under max_bytes. Pinned uploads and the one
+        keyed keep (just stored) are never dropped: they stay until their
+        holders discard() them, even if that leaves the store over budget.
+        Pins on uploads that are gone are forgotten.
+        """
+        now = time.time()
+        for token, stamp in self.backend.meta_entries():
+            if now - stamp > self.ttl_seconds:
+                found = self.backend.get_meta(token)
+                if found is not None and found[0].get("sha256"):
+                    self.backend.drop_ref(found[0]["sha256"], f"token-{token}")
+                self.backend.delete_meta(token)
+
+        pinned = set(self.backend.ref_keys())
+        if keep is not None:
+            pinned.add(keep)
+
+        evicted = 0
+        live = []
+        for key, size, stamp in self.backend.entries():
+            if key not in pinned and now - stamp > self.ttl_seconds:
+                if self.backend.delete(key):
+                    evicted += 1
+            else:
+                live.append((stamp, key, size))
+
+        total = sum(size for _, _, size in live)
+        for stamp, key, size in sorted(live):
+            if total <= self.max_bytes:
+                break
+            if key in pinned:
+                continue
+            if self.backend.delete(key):
+                evicted += 1
+            total -= size
+
+        stored = {key for key, _, _ in self.backend.entries()}
+        for key in self.backend.ref_keys() - stored:
+            self.backend.drop_refs(key)
+
+        if evicted:
+            self._count("evictions", evicted)
+        return evicted
+
+    def usage(self) -> Dict[str, Any]:
+        entries = list(self.backend.entries())
+        with self._lock:
+            stats = dict(self.stats)
+        return {
+            "stats": stats,
+            "staged_uploads": len(entries),
+            "staged_bytes": sum(size for _, size, _ in entries),
+            "memory_entries": len(self._lru),
+            "memory_bytes": self._lru_size,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl_seconds,
+        }
+
+    def _check_size(self, size: int) -> None:
+        if size > self.max_bytes:
+            raise ValueError(
+                f"Upload is {size} bytes, more than the staging limit of {self.max_bytes} bytes "
+                "(IMPORT_STAGING_MAX_BYTES)."
+            )
+
+    def _count(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self.stats[name] += n
+
+    # --- in-process LRU ------------------------------------------------------
+
+    def _remember(self, sha: str, data: bytes) -> None:
+        if len(data) > self.memory_bytes:
+            return
+        with self._lock:
+            self._forget(sha)
+            self._lru[sha] = (data, time.time())
+            self._lru_size += len(data)
+            while self._lru_size > self.memory_bytes and self._lru:
+                _, (old, _) = self._lru.popitem(last=False)
+                self._lru_size -= len(old)
+
+    def _forget(self, sha: str) -> None:
+        cached = self._lru.pop(sha, None)
+        if cached is not None:
+            self._lru_size -= len(cached[0])
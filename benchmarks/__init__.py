@@ -0,0 +1,8 @@
+"""
+Ad-hoc performance benchmarks. Each module is runnable on its own, e.g.
+
+    python -m benchmarks.dedup --rows 1000 10000
+
+They need the usual .env (DATABASE_URL must point at a scratch Postgres) and
+roll back everything they write.
+"""
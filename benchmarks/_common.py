@@ -0,0 +1,97 @@
+# benchmarks/_common.py
+import random
+import time
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+from sqlalchemy import event, insert
+
+from app import create_app
+from app.extensions import db
+from app.models import Institution, Account, Transaction
+
+MERCHANTS = [
+    "AMAZON MKTPLACE PMTS", "SPOTIFY USA", "SHELL OIL 5744", "TRADER JOE S #552",
+    "SQ *BLUE BOTTLE COFFEE", "PAYROLL ACME CORP", "VENMO PAYMENT", "COSTCO WHSE #0001",
+    "NETFLIX.COM", "UBER TRIP HELP.UBER.COM", "CITY OF SPRINGFIELD UTIL", "ONLINE TRANSFER TO SAV",
+]
+
+
+class RoundTrips:
+    """Counts statements sent to the database while active."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+
+    def _on_execute(self, *args, **kwargs):
+        self.count += 1
+
+    def __enter__(self):
+        self.count = 0
+        event.listen(self.engine, "before_cursor_execute", self._on_execute)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, "before_cursor_execute", self._on_execute)
+
+
+def synthetic_rows(n: int, seed: int = 0, start: date = date(2015, 1, 1), days: int = 3650) -> list[dict]:
+    """Normalized rows (the shape normalize_frame returns) spread over `days` days after `start`."""
+    rnd = random.Random(seed)
+    rows = []
+    for i in range(n):
+        rows.append({
+            "txn_date": start + timedelta(days=rnd.randrange(days)),
+            "description_raw": f"{rnd.choice(MERCHANTS)} {rnd.randrange(10000):04d}",
+            "merchant_normalized": None,
+            "amount_cents": rnd.choice([-1, -1, -1, 1]) * rnd.randrange(100, 500000),
+            "running_balance_cents": None,
+        })
+    return rows
+
+
+def seed_transactions(account_id: int, rows: list[dict]) -> None:
+    if rows:
+        db.session.execute(
+            insert(Transaction),
+            [dict(r, account_id=account_id, is_deleted=False, is_joint=False) for r in rows],
+        )
+
+
+@contextmanager
+def app_context():
+    app = create_app()
+    with app.app_context():
+        yield app
+
+
+@contextmanager
+def scratch_account(name: str = "bench"):
+    """A throwaway institution/account; everything done inside is rolled back."""
+    try:
+        inst = Institution(name=f"{name}-institution")
+        db.session.add(inst)
+        db.session.flush()
+        acct = Account(institution_id=inst.id, name=f"{name}-account", type="checking")
+        db.session.add(acct)
+        db.session.flush()
+        yield acct
+    finally:
+        db.session.rollback()
+
+
+def measure(fn, *args, **kwargs):
+    """Run fn once; returns (result, wall seconds, round-trips)."""
+    with RoundTrips(db.engine) as rt:
+        t0 = time.perf_counter()
+        result = fn(*args, **kwargs)
+        elapsed = time.perf_counter() - t0
+    return result, elapsed, rt.count
+
+
+def print_table(headers: list[str], rows: list[list]) -> None:
+    widths = [max(len(str(h)), *(len(str(r[i])) for r in rows)) for i, h in enumerate(headers)]
+    print("  ".join(str(h).rjust(w) for h, w in zip(headers, widths)))
+    for r in rows:
+        print("  ".join(str(v).rjust(w) for v, w in zip(r, widths)))
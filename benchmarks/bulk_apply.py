@@ -0,0 +1,61 @@
+# benchmarks/bulk_apply.py
+"""
+Applying reviewed suggestions: the old per-object ORM loop vs.
+bulk_apply.apply_changes (one UPDATE per category / flag), for growing
+numbers of approvals spread over a dozen categories.
+
+    python -m benchmarks.bulk_apply --approvals 1000 10000 50000
+"""
+import argparse
+import random
+
+from app.extensions import db
+from app.models import Category, Transaction
+from app.services import aggregates, bulk_apply
+
+from ._common import app_context, scratch_account, synthetic_rows, seed_transactions, measure, print_table
+
+
+def legacy_apply(changes):
+    """What apply_suggestions used to do: load every row and set fields one object at a time."""
+    by_id = {c["id"]: c for c in changes}
+    with aggregates.reclassifying(list(by_id)):
+        for t in Transaction.query.filter(Transaction.id.in_(list(by_id))).all():
+            change = by_id[t.id]
+            if change.get("is_transfer") and not t.is_transfer:
+                t.is_transfer = True
+            t.category_id = change["category_id"]
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--approvals", type=int, nargs="+", default=[1000, 10000, 50000])
+    args = ap.parse_args()
+
+    table = []
+    with app_context():
+        for n in args.approvals:
+            with scratch_account() as acct:
+                categories = [Category(name=f"bench-category-{i}", group="bench") for i in range(12)]
+                db.session.add_all(categories)
+                seed_transactions(acct.id, synthetic_rows(n, seed=n))
+                db.session.flush()
+                ids = [i for (i,) in db.session.query(Transaction.id).filter_by(account_id=acct.id)]
+                rnd = random.Random(n)
+
+                def changes():
+                    return [
+                        dict({"id": i, "category_id": rnd.choice(categories).id}, **({"is_transfer": True} if rnd.random() < 0.05 else {}))
+                        for i in ids
+                    ]
+
+                _, legacy_s, legacy_trips = measure(legacy_apply, changes())
+                db.session.expire_all()
+                counts, bulk_s, bulk_trips = measure(bulk_apply.apply_changes, changes())
+                table.append([n, f"{legacy_s * 1000:.0f}", legacy_trips, f"{bulk_s * 1000:.0f}", bulk_trips, counts["statements"]])
+
+    print_table(["approvals", "ORM loop ms", "loop queries", "bulk ms", "bulk queries", "UPDATEs"], table)
+
+
+if __name__ == "__main__":
+    main()
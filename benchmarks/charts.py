@@ -0,0 +1,53 @@
+# benchmarks/charts.py
+"""
+Dashboard chart endpoints as history grows. Every run asks for the same
+trailing 12-month window, so with rollups the time should stay flat.
+
+    python -m benchmarks.charts --years 1 5 10 20 --rows-per-year 5000
+"""
+import argparse
+from datetime import date, timedelta
+
+from app.blueprints import dashboard
+from app.services.aggregates import rebuild_rollups
+
+from ._common import app_context, scratch_account, synthetic_rows, seed_transactions, measure, print_table
+
+ENDPOINTS = [
+    ("chart-data", dashboard.chart_data, {"group_by": "account"}),
+    ("income-vs-spending", dashboard.income_vs_spending, {}),
+    ("spending/day", dashboard.spending_over_time, {"granularity": "day"}),
+    ("spending/month", dashboard.spending_over_time, {"granularity": "month"}),
+]
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--years", type=int, nargs="+", default=[1, 5, 10, 20])
+    ap.add_argument("--rows-per-year", type=int, default=5000)
+    args = ap.parse_args()
+
+    end = date.today()
+    window = {"start_date": (end - timedelta(days=365)).isoformat(), "end_date": end.isoformat()}
+
+    table = []
+    with app_context() as app:
+        for years in args.years:
+            with scratch_account() as acct:
+                start = end - timedelta(days=365 * years)
+                rows = synthetic_rows(args.rows_per_year * years, seed=years, start=start, days=365 * years)
+                seed_transactions(acct.id, rows)
+                rebuild_rollups()
+
+                result = [years, len(rows)]
+                for _, view, params in ENDPOINTS:
+                    with app.test_request_context("/", query_string=dict(window, **params)):
+                        _, seconds, _ = measure(view)
+                    result.append(f"{seconds * 1000:.1f}")
+                table.append(result)
+
+    print_table(["years", "rows"] + [f"{name} ms" for name, _, _ in ENDPOINTS], table)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+# benchmarks/commit.py
+"""
+Import commit: one ORM object per row vs. staging the rows with COPY and
+promoting them with a single INSERT ... SELECT.
+
+    python -m benchmarks.commit --rows 1000 10000 100000
+"""
+import argparse
+from datetime import datetime
+
+from app.extensions import db
+from app.models import Import, Transaction
+from app.services.importer import _staged, STAGED_ROW_COLUMNS
+from app.services.bulk import copy_rows
+from app.services.review import _promote_staged_rows
+from app.services import rule_engine
+
+from ._common import app_context, scratch_account, synthetic_rows, measure, print_table
+
+
+def legacy_insert(imp, rows):
+    """The per-row ORM insert commit_import used before rows were staged, kept for comparison."""
+    now = datetime.utcnow()
+    for row in rows:
+        db.session.add(Transaction(
+            account_id=imp.account_id, import_id=imp.id, created_at=now,
+            is_transfer=False, is_refund=False, is_deleted=False, is_joint=False, **row,
+        ))
+    db.session.flush()
+    return len(rows)
+
+
+def stage_and_promote(imp, rows):
+    classifier = rule_engine.get_classifier()
+    staged = [
+        _staged(imp.id, dict(row, position=i), "insert", classifier)
+        for i, row in enumerate(rows)
+    ]
+    copy_rows("import_staged_rows", STAGED_ROW_COLUMNS, staged)
+    inserted, _, _ = _promote_staged_rows(imp, {})
+    return inserted
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--rows", type=int, nargs="+", default=[1000, 10000, 100000])
+    args = ap.parse_args()
+
+    table = []
+    with app_context():
+        for n in args.rows:
+            rows = synthetic_rows(n, seed=n)
+            result = [n]
+            for fn in (legacy_insert, stage_and_promote):
+                with scratch_account() as acct:
+                    imp = Import(
+                        institution_id=acct.institution_id,
+                        account_id=acct.id,
+                        original_filename="bench.csv",
+                        original_sha256="bench",
+                        status="partial",
+                    )
+                    db.session.add(imp)
+                    db.session.flush()
+                    _, seconds, trips = measure(fn, imp, rows)
+                    result += [trips, f"{seconds:.3f}"]
+            table.append(result)
+
+    print_table(["rows", "orm trips", "orm s", "staged trips", "staged s"], table)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+# benchmarks/dedup.py
+"""
+Duplicate detection: the old two-queries-per-row loop vs. the single
+set-based query in importer.detect_duplicates.
+
+    python -m benchmarks.dedup --rows 1000 5000 20000
+"""
+import argparse
+from datetime import timedelta
+
+from app.extensions import db
+from app.models import Transaction
+from app.services.importer import detect_duplicates, SECONDARY_DUP_WINDOW_DAYS
+
+from ._common import app_context, scratch_account, synthetic_rows, seed_transactions, measure, print_table
+
+
+def legacy_detect_duplicates(account_id, normalized_rows):
+    """The per-row implementation detect_duplicates replaced, kept for comparison."""
+    dup_exact, dup_secondary, to_insert = [], [], []
+    for row in normalized_rows:
+        base = db.session.query(Transaction.id).filter(
+            Transaction.account_id == account_id,
+            Transaction.is_deleted == False,
+            Transaction.amount_cents == row["amount_cents"],
+        )
+        ex = base.filter(
+            Transaction.txn_date == row["txn_date"],
+            Transaction.description_raw == row["description_raw"],
+        ).first()
+        if ex:
+            dup_exact.append((row, ex.id))
+            continue
+        sec = base.filter(
+            Transaction.txn_date >= row["txn_date"] - timedelta(days=SECONDARY_DUP_WINDOW_DAYS),
+            Transaction.txn_date <= row["txn_date"] + timedelta(days=SECONDARY_DUP_WINDOW_DAYS),
+        ).first()
+        if sec:
+            dup_secondary.append((row, sec.id))
+            continue
+        to_insert.append(row)
+    return to_insert, dup_exact, dup_secondary
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--rows", type=int, nargs="+", default=[1000, 5000, 20000])
+    ap.add_argument("--skip-legacy-above", type=int, default=20000,
+                    help="don't run the per-row loop for larger uploads")
+    args = ap.parse_args()
+
+    table = []
+    with app_context():
+        for n in args.rows:
+            with scratch_account() as acct:
+                # Half of the upload is already in the ledger.
+                incoming = synthetic_rows(n, seed=n)
+                seed_transactions(acct.id, incoming[: n // 2] + synthetic_rows(n, seed=n + 1))
+
+                (ins, ex, sec), bulk_s, bulk_rt = measure(detect_duplicates, acct.id, incoming)
+                legacy = ["-", "-"]
+                if n <= args.skip_legacy_above:
+                    _, legacy_s, legacy_rt = measure(legacy_detect_duplicates, acct.id, incoming)
+                    legacy = [legacy_rt, f"{legacy_s:.3f}"]
+                table.append([n, *legacy, bulk_rt, f"{bulk_s:.3f}", len(ins), len(ex), len(sec)])
+
+    print_table(
+        ["rows", "legacy trips", "legacy s", "bulk trips", "bulk s", "insert", "exact", "secondary"],
+        table,
+    )
+
+
+if __name__ == "__main__":
+    main()
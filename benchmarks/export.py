@@ -0,0 +1,91 @@
+# benchmarks/export.py
+"""
+CSV export: the old build-it-all-in-memory export vs. the streamed one from
+app.services.export, as the export grows. Reports time to the first chunk,
+total time and peak Python memory (tracemalloc); the streamed peak should
+stay flat. Parquet and Arrow rows are included when pyarrow is installed.
+
+    python -m benchmarks.export --rows 20000 100000 500000
+"""
+import argparse
+import csv
+import io
+import time
+import tracemalloc
+
+from sqlalchemy.orm import joinedload
+
+from app.models import Account, Transaction
+from app.services import export
+
+from ._common import app_context, scratch_account, synthetic_rows, seed_transactions, print_table
+
+
+def legacy_export(account_id):
+    """What export_transactions used to build before it streamed."""
+    transactions = Transaction.query.options(
+        joinedload(Transaction.account).joinedload(Account.institution),
+        joinedload(Transaction.category),
+    ).filter(
+        Transaction.account_id == account_id,
+        Transaction.is_deleted == False,
+    ).order_by(Transaction.txn_date.asc(), Transaction.id.asc()).all()
+
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(export.CSV_HEADER)
+    for txn in transactions:
+        writer.writerow([
+            txn.txn_date.isoformat(),
+            txn.description_raw,
+            f"{txn.amount_cents / 100:.2f}",
+            txn.category.name if txn.category else "",
+            txn.account.name,
+            txn.account.institution.name if txn.account.institution else "",
+        ])
+    yield output.getvalue()
+
+
+def drain(chunks):
+    """Consume a chunk stream; returns (seconds to first chunk, total seconds, bytes, peak MB)."""
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    first = None
+    size = 0
+    for chunk in chunks:
+        if first is None:
+            first = time.perf_counter() - t0
+        size += len(chunk)
+    total = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return first, total, size, peak / 1e6
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--rows", type=int, nargs="+", default=[20000, 100000, 500000])
+    args = ap.parse_args()
+
+    table = []
+    with app_context():
+        for n in args.rows:
+            with scratch_account() as acct:
+                seed_transactions(acct.id, synthetic_rows(n, seed=n))
+                runs = {
+                    "load-all": legacy_export(acct.id),
+                    "streamed": export.csv_chunks(export.export_batches([acct.id])),
+                    "streamed gz": export.gzip_chunks(export.csv_chunks(export.export_batches([acct.id]))),
+                }
+                if export.arrow_available():
+                    for fmt in ("parquet", "arrow"):
+                        runs[fmt] = export.arrow_chunks(export.export_batches([acct.id]), fmt)
+                for label, chunks in runs.items():
+                    first, total, size, peak = drain(chunks)
+                    table.append([n, label, f"{first * 1000:.1f}", f"{total:.2f}", f"{size / 1e6:.1f}", f"{peak:.1f}"])
+
+    print_table(["rows", "export", "first chunk ms", "total s", "MB out", "peak MB"], table)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+# benchmarks/listing.py
+"""
+Transaction list page: the old load-everything query vs. one keyset page
+from /transactions/account/<id>/data, as the account grows. The keyset
+times should stay flat, including for a page deep into the history.
+
+    python -m benchmarks.listing --years 1 5 10 20 --rows-per-year 5000
+"""
+import argparse
+from datetime import date, timedelta
+
+from app.blueprints import transactions
+from app.models import Transaction
+
+from ._common import app_context, scratch_account, synthetic_rows, seed_transactions, measure, print_table
+
+
+def legacy_list(account_id):
+    """What list_for_account used to load before it paged."""
+    return Transaction.query.filter(
+        Transaction.account_id == account_id,
+        Transaction.is_deleted == False,
+    ).order_by(Transaction.txn_date.desc(), Transaction.id.desc()).all()
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--years", type=int, nargs="+", default=[1, 5, 10, 20])
+    ap.add_argument("--rows-per-year", type=int, default=5000)
+    args = ap.parse_args()
+
+    end = date.today()
+    table = []
+    with app_context() as app:
+        for years in args.years:
+            with scratch_account() as acct:
+                rows = synthetic_rows(args.rows_per_year * years, seed=years,
+                                      start=end - timedelta(days=365 * years), days=365 * years)
+                seed_transactions(acct.id, rows)
+
+                _, legacy_s, _ = measure(legacy_list, acct.id)
+
+                with app.test_request_context("/"):
+                    first, first_s, _ = measure(transactions.list_data, acct.id)
+                # A cursor halfway through the account's history
+                middle = Transaction.query.filter_by(account_id=acct.id).order_by(
+                    Transaction.txn_date.desc(), Transaction.id.desc()
+                ).offset(len(rows) // 2).first()
+                cursor = transactions._encode_cursor(middle.txn_date, middle.id)
+                with app.test_request_context("/", query_string={"after": cursor}):
+                    _, deep_s, _ = measure(transactions.list_data, acct.id)
+
+                table.append([years, len(rows), f"{legacy_s * 1000:.1f}", f"{first_s * 1000:.1f}", f"{deep_s * 1000:.1f}"])
+
+    print_table(["years", "rows", "load-all ms", "first page ms", "middle page ms"], table)
+
+
+if __name__ == "__main__":
+    main()
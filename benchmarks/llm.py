@@ -0,0 +1,55 @@
+# benchmarks/llm.py
+"""
+AI categorization pipeline against the stub server (benchmarks/llm_stub.py):
+throughput and token usage as concurrency grows, compared with the one
+request-at-a-time, 50-transactions-per-click flow of the categorize screen.
+Needs no database or model.
+
+    python -m benchmarks.llm --transactions 5000 --concurrency 1 4 16 --error-rate 0.05
+"""
+import argparse
+import random
+
+from app.services.ai_pipeline import run_pipeline
+
+from ._common import MERCHANTS, print_table
+from .llm_stub import serve
+
+CATEGORIES = ["Groceries", "Dining", "Fuel", "Shopping", "Subscriptions", "Income", "Transfers", "Utilities"]
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--transactions", type=int, default=5000)
+    ap.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    ap.add_argument("--latency", type=float, default=0.3, help="stub seconds per request")
+    ap.add_argument("--per-txn-latency", type=float, default=0.005, help="stub seconds per transaction")
+    ap.add_argument("--error-rate", type=float, default=0.05)
+    ap.add_argument("--token-budget", type=int, default=3000)
+    args = ap.parse_args()
+
+    rnd = random.Random(0)
+    items = [(i + 1, f"{rnd.choice(MERCHANTS)} {rnd.randrange(10000):04d}") for i in range(args.transactions)]
+    server, url = serve(latency=args.latency, per_txn_latency=args.per_txn_latency, error_rate=args.error_rate)
+
+    runs = [("legacy (50/request)", 1, 50, 0)] + [(f"pipeline x{c}", c, 100, 4) for c in args.concurrency]
+    table = []
+    try:
+        for label, concurrency, max_items, retries in runs:
+            result = run_pipeline(
+                items, CATEGORIES, base_url=url, api_key="stub", model="stub",
+                token_budget=args.token_budget, max_items=max_items,
+                concurrency=concurrency, max_retries=retries,
+            )
+            s = result["stats"]
+            table.append([label, s["batches"], s["retries"], s["failed_batches"], s["suggested"],
+                          f"{s['seconds']:.1f}", s["transactions_per_sec"], s["prompt_tokens"], s["completion_tokens"]])
+    finally:
+        server.shutdown()
+
+    print_table(["run", "batches", "retries", "failed", "suggested", "seconds", "txn/s",
+                 "prompt tokens", "completion tokens"], table)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+# benchmarks/llm_stub.py
+"""
+A stand-in OpenAI-compatible chat completions server for exercising the AI
+pipeline without a model. It answers every "ID n: description" line of the
+prompt with a category from the prompt's list, after a configurable delay,
+and fails a configurable share of requests with 429/500 so retries get used.
+
+    python -m benchmarks.llm_stub --port 8765 --latency 0.5 --error-rate 0.05
+
+then point OPENAI_API_BASE at http://127.0.0.1:8765/v1 (any key/model name).
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CATEGORY_RE = re.compile(r'^- "(.*)"$', re.M)
+TXN_RE = re.compile(r"^ID (\d+): (.*)$", re.M)
+
+
+def make_handler(latency: float, per_txn_latency: float, error_rate: float, seed: int):
+    rnd = random.Random(seed)
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status, body):
+            payload = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_POST(self):
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                self._send(404, {"error": {"message": "not found"}})
+                return
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            messages = request.get("messages", [])
+            system = next((m["content"] for m in messages if m["role"] == "system"), "")
+            user = next((m["content"] for m in messages if m["role"] == "user"), "")
+            categories = CATEGORY_RE.findall(system) or ["Uncategorized"]
+            txns = TXN_RE.findall(user)
+
+            with lock:
+                fail = rnd.random() < error_rate
+            time.sleep(latency + per_txn_latency * len(txns))
+            if fail:
+                status = random.choice([429, 500])
+                self._send(status, {"error": {"message": "stub failure", "type": "server_error"}})
+                return
+
+            suggestions = [
+                {
+                    "id": int(txn_id),
+                    "category_name": categories[zlib.crc32(desc.split(" ")[0].encode()) % len(categories)],
+                    "reason": "Stub answer.",
+                }
+                for txn_id, desc in txns
+            ]
+            content = json.dumps({"suggestions": suggestions})
+            self._send(200, {
+                "id": "stub",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": request.get("model", "stub"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                "usage": {
+                    "prompt_tokens": (len(system) + len(user)) // 4,
+                    "completion_tokens": len(content) // 4,
+                    "total_tokens": (len(system) + len(user) + len(content)) // 4,
+                },
+            })
+
+    return Handler
+
+
+def serve(port: int = 0, latency: float = 0.5, per_txn_latency: float = 0.0, error_rate: float = 0.0, seed: int = 0):
+    """Start the stub in a background thread; returns (server, base_url). Call server.shutdown() when done."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(latency, per_txn_latency, error_rate, seed))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--latency", type=float, default=0.5, help="seconds per request")
+    ap.add_argument("--per-txn-latency", type=float, default=0.01, help="extra seconds per transaction in a request")
+    ap.add_argument("--error-rate", type=float, default=0.0)
+    args = ap.parse_args()
+    server, url = serve(args.port, args.latency, args.per_txn_latency, args.error_rate)
+    print(f"Stub OpenAI server on {url} (Ctrl+C to stop)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# benchmarks/refunds.py
+"""
+Refund finder: the old one-query-per-credit loop vs. refunds.find_refund_pairs
+(one query plus an in-memory sweep), as the account grows. About 5% of the
+debits get a matching refund a few days later.
+
+    python -m benchmarks.refunds --rows 10000 100000 1000000
+"""
+import argparse
+import random
+from datetime import timedelta
+
+from app.models import Transaction
+from app.services import refunds
+
+from ._common import app_context, scratch_account, synthetic_rows, seed_transactions, measure, print_table
+
+
+def legacy_find(account_id):
+    """What the refund finder used to do before it was set-based."""
+    positive_txns = Transaction.query.filter(
+        Transaction.account_id == account_id,
+        Transaction.amount_cents > 0,
+        Transaction.is_refund == False,
+        Transaction.is_transfer == False,
+    ).order_by(Transaction.txn_date.desc()).all()
+    pairs = []
+    for pos_t in positive_txns:
+        neg_t = Transaction.query.filter(
+            Transaction.account_id == account_id,
+            Transaction.amount_cents == -pos_t.amount_cents,
+            Transaction.txn_date >= pos_t.txn_date - timedelta(days=60),
+            Transaction.txn_date <= pos_t.txn_date,
+            Transaction.is_refund == False,
+            Transaction.is_transfer == False,
+        ).first()
+        if neg_t:
+            pairs.append({"refund_id": pos_t.id, "original_id": neg_t.id})
+    return pairs
+
+
+def with_refunds(rows, seed):
+    rnd = random.Random(seed)
+    extra = [
+        dict(r, txn_date=r["txn_date"] + timedelta(days=rnd.randrange(1, 30)),
+             description_raw=f"REFUND {r['description_raw']}", amount_cents=-r["amount_cents"])
+        for r in rows if r["amount_cents"] < 0 and rnd.random() < 0.05
+    ]
+    return rows + extra
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--rows", type=int, nargs="+", default=[10000, 100000, 1000000])
+    ap.add_argument("--legacy-max-rows", type=int, default=100000, help="Skip the old loop above this size.")
+    args = ap.parse_args()
+
+    table = []
+    with app_context():
+        for n in args.rows:
+            with scratch_account() as acct:
+                rows = with_refunds(synthetic_rows(n, seed=n), seed=n)
+                seed_transactions(acct.id, rows)
+
+                legacy_ms, legacy_trips, legacy_pairs = "-", "-", "-"
+                if n <= args.legacy_max_rows:
+                    pairs, secs, legacy_trips = measure(legacy_find, acct.id)
+                    legacy_ms, legacy_pairs = f"{secs * 1000:.0f}", len(pairs)
+                pairs, secs, trips = measure(refunds.find_refund_pairs, acct.id)
+                table.append([len(rows), legacy_ms, legacy_trips, legacy_pairs, f"{secs * 1000:.0f}", trips, len(pairs)])
+
+    print_table(["rows", "loop ms", "loop queries", "loop pairs", "set ms", "set queries", "set pairs"], table)
+
+
+if __name__ == "__main__":
+    main()
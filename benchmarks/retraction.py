@@ -0,0 +1,59 @@
+# benchmarks/retraction.py
+"""
+Import retraction: the old per-object ORM loop vs. retraction.retract_import
+(one UPDATE ... RETURNING), plus restore_import, as the import grows.
+
+    python -m benchmarks.retraction --rows 5000 50000 200000
+"""
+import argparse
+from datetime import datetime
+
+from app.extensions import db
+from app.models import Import, Transaction
+from app.services import aggregates, retraction
+
+from ._common import app_context, scratch_account, synthetic_rows, seed_transactions, measure, print_table
+
+
+def legacy_retract(imp):
+    """What delete_import_txns used to do before it was set-based."""
+    now = datetime.utcnow()
+    ids = []
+    for t in Transaction.query.filter_by(import_id=imp.id, is_deleted=False):
+        t.is_deleted = True
+        t.deleted_at = now
+        ids.append(t.id)
+    aggregates.retired(ids)
+    imp.status = "retracted"
+    return len(ids)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--rows", type=int, nargs="+", default=[5000, 50000, 200000])
+    args = ap.parse_args()
+
+    table = []
+    with app_context():
+        for n in args.rows:
+            with scratch_account() as acct:
+                imp = Import(account_id=acct.id, original_filename="bench.csv", original_sha256="bench", status="success")
+                db.session.add(imp)
+                db.session.flush()
+                seed_transactions(acct.id, [dict(r, import_id=imp.id) for r in synthetic_rows(n, seed=n)])
+                aggregates.published([i for (i,) in db.session.query(Transaction.id).filter_by(import_id=imp.id)])
+
+                _, legacy_s, legacy_trips = measure(legacy_retract, imp)
+                db.session.expire_all()
+                retraction.restore_import(imp)
+                db.session.expire_all()
+                _, retract_s, retract_trips = measure(retraction.retract_import, imp)
+                _, restore_s, restore_trips = measure(retraction.restore_import, imp)
+                table.append([n, f"{legacy_s * 1000:.0f}", legacy_trips, f"{retract_s * 1000:.0f}", retract_trips,
+                              f"{restore_s * 1000:.0f}", restore_trips])
+
+    print_table(["rows", "ORM loop ms", "loop queries", "retract ms", "retract queries", "restore ms", "restore queries"], table)
+
+
+if __name__ == "__main__":
+    main()
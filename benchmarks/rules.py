@@ -0,0 +1,77 @@
+# benchmarks/rules.py
+"""
+Rule matching: the compiled Aho-Corasick engine against the old nested loop
+(upper-case every keyword and test `in` for each description). Needs no
+database. The nested loop is timed on a sample and scaled up, since running
+it over every description takes minutes.
+
+    python -m benchmarks.rules --rules 500 5000 --descriptions 100000
+"""
+import argparse
+import random
+import string
+import time
+
+from app.services.rule_engine import RuleEngine
+
+from ._common import MERCHANTS, print_table
+
+
+def synthetic_rules(n: int, seed: int) -> list[tuple[int, str, int]]:
+    rnd = random.Random(seed)
+    keywords = {m.split()[0] for m in MERCHANTS}
+    while len(keywords) < n:
+        keywords.add("".join(rnd.choice(string.ascii_uppercase) for _ in range(rnd.randint(4, 12))))
+    return [(i + 1, kw.lower(), rnd.randrange(1, 40)) for i, kw in enumerate(sorted(keywords))]
+
+
+def synthetic_descriptions(n: int, seed: int) -> list[str]:
+    rnd = random.Random(seed)
+    return [f"POS {rnd.choice(MERCHANTS)} {rnd.randrange(10000):04d} REF{rnd.randrange(10**8):08d}" for _ in range(n)]
+
+
+def naive(rules, descriptions):
+    out = []
+    for d in descriptions:
+        found = None
+        for rule_id, keyword, _ in rules:
+            if keyword.upper() in d.upper():
+                found = rule_id
+                break
+        out.append(found)
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--rules", type=int, nargs="+", default=[500, 5000])
+    ap.add_argument("--descriptions", type=int, default=100000)
+    ap.add_argument("--naive-sample", type=int, default=2000)
+    args = ap.parse_args()
+
+    descriptions = synthetic_descriptions(args.descriptions, seed=1)
+    table = []
+    for n in args.rules:
+        rules = synthetic_rules(n, seed=n)
+
+        t0 = time.perf_counter()
+        engine = RuleEngine(rules)
+        compile_s = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        matched = sum(1 for m in engine.match_many(descriptions) if m)
+        engine_s = time.perf_counter() - t0
+
+        sample = descriptions[:args.naive_sample]
+        t0 = time.perf_counter()
+        naive(rules, sample)
+        naive_s = (time.perf_counter() - t0) * len(descriptions) / len(sample)
+
+        table.append([n, len(descriptions), matched, f"{compile_s * 1000:.0f}",
+                      f"{engine_s:.2f}", f"{naive_s:.1f}", f"{naive_s / engine_s:.0f}x"])
+
+    print_table(["rules", "descriptions", "matched", "compile ms", "engine s", "nested loop s (est)", "speedup"], table)
+
+
+if __name__ == "__main__":
+    main()
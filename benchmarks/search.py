@@ -0,0 +1,100 @@
+# benchmarks/search.py
+"""
+Transaction search latency: the legacy per-account ILIKE scan vs. the
+pg_trgm-indexed ranked search (services/search.py), on a synthetic ledger
+with a few thousand distinct merchants. Rows and indexes are created in one
+transaction and rolled back.
+
+    python -m benchmarks.search --rows 200000 2000000
+"""
+import argparse
+import random
+import statistics
+import string
+import time
+from datetime import date, timedelta
+
+from sqlalchemy import text
+
+from app.extensions import db
+from app.models import Transaction
+from app.services import search
+from app.services.bulk import copy_rows
+from app.services.merchant import normalize_merchant
+
+from ._common import app_context, scratch_account, print_table
+
+COLUMNS = ("account_id", "txn_date", "description_raw", "merchant_normalized", "amount_cents", "is_deleted", "is_joint")
+
+
+def merchant_names(n: int, seed: int = 0) -> list[str]:
+    rnd = random.Random(seed)
+    word = lambda: "".join(rnd.choice(string.ascii_uppercase) for _ in range(rnd.randint(4, 9)))
+    return [f"{word()} {word()}" for _ in range(n)]
+
+
+def ledger_rows(account_id: int, n: int, merchants: list[str], seed: int = 0):
+    rnd = random.Random(seed)
+    start = date(2005, 1, 1)
+    for _ in range(n):
+        desc = f"POS {rnd.choice(merchants)} #{rnd.randrange(1000)} {rnd.randrange(10**6):06d}"
+        yield {
+            "account_id": account_id,
+            "txn_date": start + timedelta(days=rnd.randrange(7300)),
+            "description_raw": desc,
+            "merchant_normalized": normalize_merchant(desc),
+            "amount_cents": -rnd.randrange(100, 50000),
+            "is_deleted": False,
+            "is_joint": False,
+        }
+
+
+def timed(fn, repeats: int) -> tuple[float, float]:
+    samples = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.95) - 1 if len(samples) > 1 else 0]
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--rows", type=int, nargs="+", default=[200000, 2000000])
+    ap.add_argument("--merchants", type=int, default=5000)
+    ap.add_argument("--repeats", type=int, default=20)
+    args = ap.parse_args()
+
+    merchants = merchant_names(args.merchants)
+    queries = [
+        ("merchant", merchants[7].split()[0].lower()),
+        ("partial word", merchants[42].split()[1][:4].lower()),
+        ("no match", "qqqzzz"),
+    ]
+
+    table = []
+    with app_context():
+        for n in args.rows:
+            with scratch_account() as acct:
+                copy_rows(Transaction.__tablename__, COLUMNS, ledger_rows(acct.id, n, merchants, seed=n))
+                search.setup_search(concurrently=False)
+                db.session.execute(text("ANALYZE transactions"))
+
+                for label, q in queries:
+                    legacy = lambda: Transaction.query.filter(
+                        Transaction.account_id == acct.id,
+                        Transaction.is_deleted == False,
+                        Transaction.description_raw.ilike(f"%{q}%"),
+                    ).order_by(Transaction.txn_date.desc()).all()
+                    ranked = lambda: search.search_transactions(q, limit=50)
+                    hits = len(search.search_transactions(q, limit=search.MAX_RESULTS))
+                    legacy_p50, _ = timed(legacy, max(1, args.repeats // 5))
+                    p50, p95 = timed(ranked, args.repeats)
+                    table.append([n, f"{label} ({q})", hits, f"{legacy_p50:.1f}", f"{p50:.1f}", f"{p95:.1f}"])
+
+    print_table(["rows", "query", f"hits (max {search.MAX_RESULTS})", "legacy ILIKE ms", "search p50 ms", "search p95 ms"], table)
+
+
+if __name__ == "__main__":
+    main()
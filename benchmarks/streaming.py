@@ -0,0 +1,110 @@
+# benchmarks/streaming.py
+"""
+Peak Python memory of run_import for large CSVs, whole-file vs. streaming.
+
+    python -m benchmarks.streaming --mb 10 100 1000
+
+Synthetic statements are written to a temp file of roughly the requested
+size. The streaming pipeline commits (rows land in import_staged_rows), so
+every run deletes its institution, account, import and staged upload again.
+"""
+import argparse
+import csv
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+from werkzeug.datastructures import FileStorage
+
+from app.extensions import db, staging
+from app.models import Institution, Account, Mapper, Import, ImportStagedRow
+from app.services.importer import run_import
+
+from ._common import MERCHANTS, app_context, print_table
+
+SCHEMA = {"date_col": "Date", "date_fmt": "%m/%d/%Y", "desc_col": "Description", "amount_col": "Amount"}
+
+
+def _write_csv(path: str, target_bytes: int, seed: int = 0) -> int:
+    rnd = random.Random(seed)
+    rows = 0
+    with open(path, "w", newline="") as fh:
+        w = csv.writer(fh)
+        w.writerow(["Date", "Description", "Amount"])
+        while fh.tell() < target_bytes:
+            for _ in range(10_000):
+                w.writerow([
+                    f"{rnd.randint(1, 12):02d}/{rnd.randint(1, 28):02d}/{rnd.randint(2015, 2024)}",
+                    f"{rnd.choice(MERCHANTS)} {rnd.randrange(10000):04d}",
+                    f"{rnd.choice([-1, -1, -1, 1]) * rnd.randrange(100, 500000) / 100:.2f}",
+                ])
+            rows += 10_000
+    return rows
+
+
+def _run_once(app, path: str, streaming: bool):
+    inst = Institution(name="bench-streaming-institution")
+    db.session.add(inst)
+    db.session.flush()
+    acct = Account(institution_id=inst.id, name="bench-streaming-account", type="checking")
+    db.session.add(acct)
+    db.session.flush()
+    mapper = Mapper(institution_id=inst.id, account_id=acct.id, version=1, schema_json=SCHEMA)
+    db.session.add(mapper)
+    db.session.commit()
+
+    config = dict(app.config, IMPORT_STREAMING_THRESHOLD_BYTES=0 if streaming else None)
+    imp = None
+    try:
+        with open(path, "rb") as fh:
+            upload = FileStorage(stream=fh, filename=os.path.basename(path))
+            tracemalloc.start()
+            t0 = time.perf_counter()
+            imp, _, _ = run_import(None, upload, inst, acct, mapper, config)
+            elapsed = time.perf_counter() - t0
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        return elapsed, peak
+    finally:
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+        db.session.rollback()
+        if imp is not None:
+            ImportStagedRow.query.filter_by(import_id=imp.id).delete(synchronize_session=False)
+            staging.discard(imp.original_sha256, f"import-{imp.id}")
+            Import.query.filter_by(id=imp.id).delete(synchronize_session=False)
+        Mapper.query.filter_by(id=mapper.id).delete(synchronize_session=False)
+        Account.query.filter_by(id=acct.id).delete(synchronize_session=False)
+        Institution.query.filter_by(id=inst.id).delete(synchronize_session=False)
+        db.session.commit()
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--mb", type=int, nargs="+", default=[10, 100, 1000])
+    ap.add_argument("--skip-whole-file-above", type=int, default=100,
+                    help="don't run the whole-file import for files larger than this many MB")
+    args = ap.parse_args()
+
+    table = []
+    with app_context() as app, tempfile.TemporaryDirectory() as tmp:
+        for mb in args.mb:
+            path = os.path.join(tmp, f"statement-{mb}mb.csv")
+            rows = _write_csv(path, mb * 1024 * 1024, seed=mb)
+            result = [mb, rows]
+            for streaming in (False, True):
+                if not streaming and mb > args.skip_whole_file_above:
+                    result += ["-", "-"]
+                    continue
+                seconds, peak = _run_once(app, path, streaming)
+                result += [f"{peak / 2**20:.1f}", f"{seconds:.1f}"]
+            table.append(result)
+            os.unlink(path)
+
+    print_table(["MB", "rows", "whole MiB", "whole s", "stream MiB", "stream s"], table)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+import os
+
+import pytest
+
+# Tests that need Postgres run against this database (migrated with
+# `flask db upgrade`); everything they write is rolled back. Without it
+# they are skipped.
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+
+
+def _create_app(database_url, staging_dir):
+    os.environ["DATABASE_URL"] = database_url
+    os.environ.setdefault("SECRET_KEY", "test")
+    os.environ.setdefault("IMPORT_STAGING_DIR", staging_dir)
+    from app import create_app
+
+    app = create_app()
+    app.config.update(TESTING=True)
+    return app
+
+
+@pytest.fixture(scope="session")
+def app(tmp_path_factory):
+    """
+    An app whose database is never reached: only for requests that are
+    rejected before the first query.
+    """
+    return _create_app("postgresql://unused@127.0.0.1:1/unused", str(tmp_path_factory.mktemp("staging")))
+
+
+@pytest.fixture(scope="session")
+def pg_app(tmp_path_factory):
+    if not TEST_DATABASE_URL:
+        pytest.skip("set TEST_DATABASE_URL to a migrated scratch database to run database tests")
+    return _create_app(TEST_DATABASE_URL, str(tmp_path_factory.mktemp("staging")))
+
+
+@pytest.fixture
+def account(pg_app):
+    """A throwaway institution/account inside an app context; rolled back afterwards."""
+    from app.extensions import db
+    from app.models import Institution, Account
+
+    with pg_app.app_context():
+        try:
+            inst = Institution(name="test-institution")
+            db.session.add(inst)
+            db.session.flush()
+            acct = Account(institution_id=inst.id, name="test-account", type="checking")
+            db.session.add(acct)
+            db.session.flush()
+            yield acct
+        finally:
+            db.session.rollback()
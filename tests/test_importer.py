@@ -0,0 +1,118 @@
+from datetime import date, timedelta
+
+from app.services.importer import (
+    SECONDARY_DUP_WINDOW_DAYS,
+    TRANSFER_WINDOW_DAYS,
+    _pair_transfers,
+    detect_duplicates,
+)
+
+D = date(2024, 3, 10)
+
+
+def _index(*candidates):
+    """{amount: (dates, ids)} in the order _transfer_index returns them."""
+    index = {}
+    for amount, d, cid in sorted(candidates):
+        dates, ids = index.setdefault(amount, ([], []))
+        dates.append(d)
+        ids.append(cid)
+    return index
+
+
+def _days(n):
+    return D + timedelta(days=n)
+
+
+# --- transfer pairing -------------------------------------------------------
+
+def test_closest_date_wins():
+    index = _index((500, _days(-2), 1), (500, _days(1), 2))
+    assert _pair_transfers([(0, D, -500)], index, TRANSFER_WINDOW_DAYS, set()) == [(0, 2)]
+
+
+def test_equal_distance_goes_to_lower_id():
+    index = _index((500, _days(-1), 7), (500, _days(1), 3))
+    assert _pair_transfers([(0, D, -500)], index, TRANSFER_WINDOW_DAYS, set()) == [(0, 3)]
+
+
+def test_tied_debits_go_to_earlier_row():
+    index = _index((500, D, 1))
+    assert _pair_transfers([(4, D, -500), (2, D, -500)], index, TRANSFER_WINDOW_DAYS, set()) == [(2, 1)]
+
+
+def test_counterpart_used_once():
+    # Both debits are closest to id 1; the nearer one gets it, the other falls back to id 2.
+    index = _index((500, D, 1), (500, _days(2), 2))
+    debits = [(0, _days(1), -500), (1, D, -500)]
+    assert _pair_transfers(debits, index, TRANSFER_WINDOW_DAYS, set()) == [(0, 2), (1, 1)]
+
+
+def test_taken_ids_carry_across_chunks():
+    index = _index((500, D, 1), (500, _days(1), 2))
+    taken = set()
+    assert _pair_transfers([(0, D, -500)], index, TRANSFER_WINDOW_DAYS, taken) == [(0, 1)]
+    assert taken == {1}
+    # The next chunk indexes its rows from 0 again but must not reuse id 1.
+    assert _pair_transfers([(0, D, -500)], index, TRANSFER_WINDOW_DAYS, taken) == [(0, 2)]
+    assert _pair_transfers([(0, D, -500)], index, TRANSFER_WINDOW_DAYS, taken) == []
+
+
+def test_window_edges():
+    index = _index(
+        (500, _days(TRANSFER_WINDOW_DAYS), 1),
+        (700, _days(-TRANSFER_WINDOW_DAYS - 1), 2),
+        (700, _days(TRANSFER_WINDOW_DAYS + 1), 3),
+    )
+    debits = [(0, D, -500), (1, D, -700)]
+    assert _pair_transfers(debits, index, TRANSFER_WINDOW_DAYS, set()) == [(0, 1)]
+
+
+def test_only_opposite_amounts_match():
+    index = _index((500, D, 1))
+    assert _pair_transfers([(0, D, -499), (1, D, 500)], index, TRANSFER_WINDOW_DAYS, set()) == []
+
+
+# --- duplicate detection (needs TEST_DATABASE_URL) --------------------------
+
+def _seed(account, rows):
+    from app.extensions import db
+    from app.models import Transaction
+
+    txns = [
+        Transaction(account_id=account.id, txn_date=d, description_raw=desc, amount_cents=amount,
+                    is_deleted=deleted)
+        for d, desc, amount, deleted in rows
+    ]
+    db.session.add_all(txns)
+    db.session.flush()
+    return [t.id for t in txns]
+
+
+def _row(d, desc, amount):
+    return {"txn_date": d, "description_raw": desc, "merchant_normalized": None,
+            "amount_cents": amount, "running_balance_cents": None}
+
+
+def test_detect_duplicates(account):
+    w = SECONDARY_DUP_WINDOW_DAYS
+    first, _second, near, _far, _deleted = _seed(account, [
+        (D, "COFFEE", -500, False),
+        (D, "COFFEE", -500, False),
+        (_days(w), "RENT", -70000, False),
+        (_days(w + 1), "GYM", -9000, False),
+        (D, "BOOKS", -1200, True),
+    ])
+    incoming = [
+        _row(D, "COFFEE", -500),          # exact; lowest of the two ids
+        _row(_days(3), "CAFE", -500),     # secondary; lowest id in the window
+        _row(D, "RENT PMT", -70000),      # secondary at exactly the window edge
+        _row(D, "GYM", -9000),            # one day outside the window
+        _row(D, "BOOKS", -1200),          # only matches a soft-deleted row
+    ]
+
+    to_insert, dup_exact, dup_secondary = detect_duplicates(account.id, incoming)
+
+    assert [(r["description_raw"], e) for r, e in dup_exact] == [("COFFEE", first)]
+    assert [(r["description_raw"], e) for r, e in dup_secondary] == [("CAFE", first), ("RENT PMT", near)]
+    assert [r["description_raw"] for r in to_insert] == ["GYM", "BOOKS"]
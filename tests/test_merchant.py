@@ -0,0 +1,35 @@
+import pandas as pd
+import pytest
+
+from app.services.merchant import normalize_merchant, normalize_series
+
+CASES = [
+    ("SQ *BLUE BOTTLE COFFEE 0412 OAKLAND CA", "BLUE BOTTLE COFFEE"),
+    ("SQ *BLUE BOTTLE COFFEE 0977", "BLUE BOTTLE COFFEE"),
+    ("SQ BLUE BOTTLE", "BLUE BOTTLE"),
+    ("BLUE BOTTLE COFFEE OAKLAND CA", "BLUE BOTTLE COFFEE"),
+    ("TARGET T-1234 MN", "TARGET"),
+    ("UBER TRIP HELP.UBER.COM", "UBER TRIP"),
+    ("PAYPAL *NETFLIX.COM", "NETFLIX"),
+    ("AMZN MKTP US*2K3AB1", "AMZN MKTP"),
+    ("POS PURCHASE STARBUCKS #1234 SAN JOSE CA", "STARBUCKS"),
+    ("TRADER JOE'S #123 SAN FRANCISCO CA US", "TRADER JOE'S"),
+    ("SAFEWAY STORE 1234 OAKLAND", "SAFEWAY"),
+    ("COSTCO WHSE #0123", "COSTCO WHSE"),
+    ("TST* THE PIZZA PLACE", "THE PIZZA PLACE"),
+    ("Spotify USA", "SPOTIFY"),
+    ("ACH PAYMENT 123456 THANK YOU", "ACH PAYMENT THANK YOU"),
+    ("#1234", None),
+    ("", None),
+    (None, None),
+]
+
+
+@pytest.mark.parametrize("description, expected", CASES)
+def test_normalize_merchant(description, expected):
+    assert normalize_merchant(description) == expected
+
+
+def test_series_matches_scalar():
+    descriptions = [d for d, _ in CASES]
+    assert normalize_series(pd.Series(descriptions)).tolist() == [normalize_merchant(d) for d in descriptions]
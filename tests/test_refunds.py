@@ -0,0 +1,72 @@
+from datetime import date, timedelta
+
+from app.services.refunds import REFUND_WINDOW_DAYS, _sweep_refund_pairs, find_refund_pairs
+
+D = date(2024, 1, 1)
+
+
+def _day(n):
+    return D + timedelta(days=n)
+
+
+def _sweep(rows, window_days=REFUND_WINDOW_DAYS):
+    """(id, account_id, day, amount) rows, sorted the way find_refund_pairs' query sorts them."""
+    rows = sorted(
+        ((i, acct, _day(n), amount) for i, acct, n, amount in rows),
+        key=lambda r: (r[1], abs(r[3]), r[2], r[3], r[0]),
+    )
+    return [(p["original_id"], p["refund_id"]) for p in _sweep_refund_pairs(rows, window_days)]
+
+
+def test_newest_debit_in_window_wins():
+    assert _sweep([(1, 1, 0, -500), (2, 1, 10, -500), (3, 1, 20, 500)]) == [(2, 3)]
+
+
+def test_each_debit_used_once():
+    assert _sweep([(1, 1, 0, -500), (2, 1, 5, 500), (3, 1, 6, 500)]) == [(1, 2)]
+    assert _sweep([(1, 1, 0, -500), (2, 1, 1, -500), (3, 1, 5, 500), (4, 1, 6, 500)]) == [(2, 3), (1, 4)]
+
+
+def test_window_edges():
+    assert _sweep([(1, 1, 0, -500), (2, 1, REFUND_WINDOW_DAYS, 500)]) == [(1, 2)]
+    assert _sweep([(1, 1, 0, -500), (2, 1, REFUND_WINDOW_DAYS + 1, 500)]) == []
+    assert _sweep([(1, 1, 0, -500), (2, 1, 8, 500)], window_days=7) == []
+
+
+def test_older_debits_expire_behind_a_newer_one():
+    # The day-5 debit pairs first; by day 66 the day-0 debit is out of the window.
+    rows = [(1, 1, 0, -500), (2, 1, 5, -500), (3, 1, 64, 500), (4, 1, 66, 500)]
+    assert _sweep(rows) == [(2, 3)]
+
+
+def test_same_day_refund_and_order():
+    assert _sweep([(2, 1, 3, 500), (1, 1, 3, -500)]) == [(1, 2)]
+    # A credit before any debit has nothing to refund.
+    assert _sweep([(1, 1, 0, 500), (2, 1, 1, -500)]) == []
+
+
+def test_groups_by_account_and_amount():
+    rows = [(1, 1, 0, -500), (2, 2, 1, 500), (3, 1, 1, 499), (4, 2, 0, -499)]
+    assert _sweep(rows) == []
+
+
+# --- query side (needs TEST_DATABASE_URL) -----------------------------------
+
+def test_soft_deleted_and_flagged_rows_are_skipped(account):
+    from app.extensions import db
+    from app.models import Transaction
+
+    def add(n, amount, **flags):
+        t = Transaction(account_id=account.id, txn_date=_day(n), description_raw="STORE", amount_cents=amount, **flags)
+        db.session.add(t)
+        db.session.flush()
+        return t.id
+
+    live = add(0, -500)
+    add(1, -500, is_deleted=True)
+    add(2, -500, is_refund=True)
+    add(3, -500, is_transfer=True)
+    refund = add(4, 500)
+
+    pairs = find_refund_pairs(account.id)
+    assert [(p["original_id"], p["refund_id"], p["days"]) for p in pairs] == [(live, refund, 4)]
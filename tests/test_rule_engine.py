@@ -0,0 +1,91 @@
+import random
+
+import pytest
+
+from app.services.rule_engine import Classifier, KeywordAutomaton, RuleEngine, RuleMatch
+
+
+def naive_match(rules, description):
+    """The plain loop the automaton replaced, with the documented precedence on top."""
+    if not description:
+        return None
+    desc = description.upper()
+    found = [
+        RuleMatch(rule_id, keyword.upper(), category_id)
+        for rule_id, keyword, category_id in rules
+        if keyword and keyword.strip() and keyword.upper() in desc
+    ]
+    return min(found, key=lambda m: (-len(m.keyword), m.rule_id), default=None)
+
+
+RULES = [
+    (1, "amazon", 10),
+    (2, "AMAZON MKTPLACE", 11),
+    (3, "MKT", 12),
+    (4, "PLACE", 13),
+    (5, "ZON", 14),
+    (6, "SHELL", 15),
+    (7, "HELL", 16),
+    (8, "shell", 17),      # same keyword as rule 6, higher id
+    (9, "   ", 18),        # blank keywords never match
+    (10, "ELL OIL", 19),
+]
+
+
+@pytest.mark.parametrize("description, rule_id", [
+    ("AMAZON MKTPLACE PMTS", 2),     # longest keyword wins over the nested ones
+    ("amazon.com", 1),               # matching is case-insensitive
+    ("AMAZ MKT", 3),                 # the prefix of a longer keyword is not a match
+    ("ZONE PLACE", 4),               # equal length: lower rule id
+    ("SHELL OIL 5744", 10),          # "ELL OIL" overlaps "SHELL" and is longer
+    ("SHELL 5744", 6),               # duplicate keywords: lowest id
+    ("HELLO", 7),
+    ("NOTHING HERE", None),
+    ("", None),
+    (None, None),
+])
+def test_precedence(description, rule_id):
+    match = RuleEngine(RULES).match(description)
+    assert (match.rule_id if match else None) == rule_id
+    assert match == naive_match(RULES, description)
+
+
+def test_rank_inherited_along_failure_links():
+    # "ABCX" walks A-B-C towards "ABCE", fails at X; "BC" only ends inside that branch.
+    automaton = KeywordAutomaton(["ABCE", "BC", "C"], [0, 1, 2])
+    assert automaton.best_rank("ABCX") == 1
+    assert automaton.best_rank("XXCX") == 2
+    assert automaton.best_rank("ABCE") == 0
+    assert automaton.best_rank("AB") is None
+
+
+def test_matches_naive_loop_on_random_input():
+    rnd = random.Random(11)
+    for _ in range(200):
+        ids = rnd.sample(range(1, 60), rnd.randrange(1, 12))
+        rules = [(rule_id, "".join(rnd.choice("AB C") for _ in range(rnd.randrange(1, 5))), i)
+                 for i, rule_id in enumerate(ids)]
+        engine = RuleEngine(rules)
+        for _ in range(20):
+            desc = "".join(rnd.choice("ABCab ") for _ in range(rnd.randrange(0, 16)))
+            assert engine.match(desc) == naive_match(rules, desc), (rules, desc)
+
+
+def test_classify():
+    classifier = Classifier(
+        rules=RuleEngine(RULES),
+        transfers=RuleEngine([(1, "TRANSFER", None)]),
+        refunds=RuleEngine([(1, "REFUND", None)]),
+    )
+    assert classifier.classify("AMAZON MKTPLACE REFUND") == {
+        "category_id": 11,
+        "is_transfer": False,
+        "is_refund": True,
+        "explain_json": {
+            "rule": {"id": 2, "keyword": "AMAZON MKTPLACE", "category_id": 11},
+            "refund_keyword": "REFUND",
+        },
+    }
+    assert classifier.classify("ONLINE PAYMENT") == {
+        "category_id": None, "is_transfer": False, "is_refund": False, "explain_json": None,
+    }
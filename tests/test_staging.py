@@ -0,0 +1,91 @@
+import os
+import time
+
+import pytest
+from flask import Flask
+
+from app.services.staging import StagingBackend, UploadStaging
+
+
+@pytest.fixture
+def store(tmp_path):
+    app = Flask(__name__)
+    app.config.update(
+        IMPORT_STAGING_DIR=str(tmp_path),
+        IMPORT_STAGING_TTL_SECONDS=3600,
+        IMPORT_STAGING_MAX_BYTES=100,
+        IMPORT_STAGING_MEMORY_BYTES=1024,
+    )
+    s = UploadStaging()
+    s.init_app(app)
+    return s
+
+
+def _age(store, sha, seconds):
+    stamp = time.time() - seconds
+    os.utime(store.backend.path_for(sha), (stamp, stamp))
+
+
+def test_backend_is_abstract():
+    with pytest.raises(TypeError):
+        StagingBackend()
+
+
+def test_pinned_upload_survives_overflow(store):
+    pinned = store.put(b"a" * 60)
+    store.pin(pinned, "import-1")
+    _age(store, pinned, 30)
+    unpinned = store.put(b"b" * 30)
+    _age(store, unpinned, 20)
+
+    newest = store.put(b"c" * 60)
+
+    assert store.backend.exists(pinned)
+    assert store.backend.exists(newest)
+    assert not store.backend.exists(unpinned)
+    assert store.usage()["stats"]["evictions"] == 1
+
+
+def test_pinned_upload_survives_ttl(store):
+    pinned = store.put(b"a" * 10)
+    store.pin(pinned, "import-1")
+    unpinned = store.put(b"b" * 10)
+    _age(store, pinned, 7200)
+    _age(store, unpinned, 7200)
+
+    store.evict()
+
+    assert store.backend.exists(pinned)
+    assert not store.backend.exists(unpinned)
+
+
+def test_discard_releases_only_its_own_pin(store):
+    sha = store.put(b"a" * 10)
+    store.pin(sha, "import-1")
+    store.pin(sha, "import-2")
+
+    assert store.discard(sha, "import-1") is False
+    assert store.get(sha) == b"a" * 10
+    assert store.discard(sha, "import-2") is True
+    assert store.get(sha) is None
+
+
+def test_expired_token_releases_its_pin(store):
+    sha = store.put(b"a" * 10)
+    store.pin(sha, "token-abc")
+    store.put_token("abc", {"sha256": sha})
+    stamp = time.time() - 7200
+    os.utime(store.backend._meta_path("abc"), (stamp, stamp))
+    _age(store, sha, 7200)
+
+    store.evict()
+
+    assert store.get_token("abc") is None
+    assert not store.backend.exists(sha)
+    assert sha not in store.backend.ref_keys()
+
+
+def test_upload_over_budget_is_refused(store):
+    with pytest.raises(ValueError):
+        store.put(b"x" * 101)
+    assert store.usage()["staged_uploads"] == 0